@@ -1,13 +1,19 @@
 import os
+import time
+import threading
 from google.adk.agents import Agent
+from google.adk.runners import Runner
 from prompts.system_prompts import ROOT_SYSTEM_PROMPT, TECH_PROMPT, BILLING_PROMPT, ESCALATION_PROMPT
 from tools.billing_tools import check_balance, process_payment
 from tools.network_tools import check_outage, run_diagnostics
-from tools.network_tools import check_outage, run_diagnostics
 from tools.escalation_tools import escalate_to_human
 from services.rl_service import RLService
+from services.metrics import timed_tool
+from utils.context import bind_user_context
+from agents.pooled_gemini import PooledGemini
+from agents.mock_llm import MockLlm
 
-# Initialize RL Service for learning injections
+# Initialize RL Service for learning injections (the server logs calls through this same instance)
 rl_service = RLService()
 from agents.escalation_agent import escalation_agent # We can reuse this one if it has no tools/state, or recreate it.
 # Actually, let's just recreate them all to be safe.
@@ -20,49 +26,162 @@ try:
 except ImportError:
     MODEL_NAME = "gemini-2.0-flash-exp"
 
-def create_agent_graph(user_id: str) -> Agent:
+# "gemini" (default) or "mock" for the offline, deterministic backend
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini").lower()
+
+def build_model():
     """
-    Creates a fresh Agent Graph for a specific request.
-    Injects user_id into system prompts to ensure robust tool calling.
+    LLM shared by the graph.
+    gemini: calls scheduled across the API key pool. mock: scripted, no network.
     """
-    
-    # helper to inject context
-    def inject_id(prompt):
-        return f"CURRENT USER ID: {user_id}\n\n{prompt}"
+    if LLM_BACKEND == "mock":
+        return MockLlm.from_env()
+    return PooledGemini(model=MODEL_NAME)
+
+def _tool(fn):
+    """Agent-facing tool: caller bound from context, each call timed as a span."""
+    return bind_user_context(timed_tool(fn))
+
+def create_agent_graph() -> Agent:
+    """
+    Creates the Agent Graph shared by every caller.
+    Instructions are the constant prompts from prompts/system_prompts.py (plus the learned
+    guidelines), so every request starts with a byte-identical prefix. The caller is
+    supplied per turn through utils.context (set_user_context), and tools read it from there.
+    Tools are async and reach storage through `adb`, so their Redis I/O never blocks the event loop.
+    """
+    model = build_model()
 
     # 1. Billing Agent
     billing = Agent(
         name="BillingAgent",
-        instruction=inject_id(BILLING_PROMPT),
-        model=MODEL_NAME,
-        tools=[check_balance, process_payment]
+        instruction=BILLING_PROMPT,
+        model=model,
+        tools=[_tool(check_balance), _tool(process_payment)]
     )
 
     # 2. Tech Support Agent
     tech = Agent(
         name="TechSupportAgent",
-        instruction=inject_id(TECH_PROMPT),
-        model=MODEL_NAME,
-        tools=[check_outage, run_diagnostics]
+        instruction=TECH_PROMPT,
+        model=model,
+        tools=[_tool(check_outage), _tool(run_diagnostics)]
     )
     
     # 3. Escalation Agent
     escalation = Agent(
         name="EscalationAgent",
-        instruction=inject_id(ESCALATION_PROMPT),
-        model=MODEL_NAME,
-        tools=[escalate_to_human]
+        instruction=ESCALATION_PROMPT,
+        model=model,
+        tools=[_tool(escalate_to_human)]
     )
 
     # 4. Root Dispatcher
-    # Inject Learned Rules
+    # Inject Learned Rules (appended last, so the static prompt prefix stays shared)
     learned_guidelines = rl_service.get_active_rules()
     
     root = Agent(
         name="RootDispatcher",
-        instruction=inject_id(ROOT_SYSTEM_PROMPT + learned_guidelines),
-        model=MODEL_NAME,
+        instruction=ROOT_SYSTEM_PROMPT + learned_guidelines,
+        model=model,
         sub_agents=[tech, billing, escalation]
     )
     
     return root
+
+
+# --- GRAPH CACHE ---
+# Building the graph (4 Agents + a learned_rules read) on every turn is pure overhead.
+# Nothing in it is per caller, so one graph is shared by all calls and only rebuilt
+# when the learned rules change or the entry expires.
+AGENT_CACHE_TTL = float(os.environ.get("AGENT_CACHE_TTL", 1800))
+
+class _CachedGraph:
+    __slots__ = ("agent", "runner", "rules_version", "created_at")
+
+    def __init__(self, agent: Agent, rules_version: int):
+        self.agent = agent
+        self.runner = None
+        self.rules_version = rules_version
+        self.created_at = time.monotonic()
+
+class AgentGraphCache:
+    """
+    TTL cache of the shared agent graph and its Runner.
+    The entry is invalidated when RLService.rules_version moves on: a new rule, or a
+    periodic re-ranking (started from here, run on the RL writer thread) that changed
+    which rules are injected.
+    """
+
+    def __init__(self, ttl_seconds: float = AGENT_CACHE_TTL):
+        self.ttl_seconds = ttl_seconds
+        self._entry = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _is_current(self, entry: _CachedGraph, now: float) -> bool:
+        return entry is not None and entry.rules_version == rl_service.rules_version \
+            and now - entry.created_at < self.ttl_seconds
+
+    def current_runner(self, session_service, app_name: str = "voice-agent"):
+        """
+        The shared Runner if the cached graph is current, else None. Never builds, so it
+        is safe on the event loop; the check and the read happen under one lock, so a
+        rules change cannot slip in between and turn the call into a rebuild.
+        """
+        rl_service.rerank_if_due()
+        with self._lock:
+            entry = self._entry
+            if not self._is_current(entry, time.monotonic()):
+                return None
+            self.hits += 1
+            return self._runner(entry, session_service, app_name)
+
+    def _get_entry(self) -> _CachedGraph:
+        rl_service.rerank_if_due()
+        version = rl_service.rules_version
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entry
+            if self._is_current(entry, now):
+                self.hits += 1
+                return entry
+
+        # Build outside the lock; concurrent misses just build twice
+        entry = _CachedGraph(create_agent_graph(), version)
+
+        with self._lock:
+            self.misses += 1
+            self._entry = entry
+        return entry
+
+    def get_graph(self) -> Agent:
+        """Returns the shared root agent, building it if needed."""
+        return self._get_entry().agent
+
+    def get_runner(self, session_service, app_name: str = "voice-agent") -> Runner:
+        """Returns a Runner bound to the shared graph."""
+        entry = self._get_entry()
+        with self._lock:
+            return self._runner(entry, session_service, app_name)
+
+    @staticmethod
+    def _runner(entry: _CachedGraph, session_service, app_name: str) -> Runner:
+        runner = entry.runner
+        if runner is None or runner.session_service is not session_service or runner.app_name != app_name:
+            runner = Runner(
+                agent=entry.agent,
+                app_name=app_name,
+                session_service=session_service
+            )
+            entry.runner = runner
+        return runner
+
+    def invalidate(self):
+        """Drops the cached graph; the next turn rebuilds it."""
+        with self._lock:
+            self._entry = None
+
+graph_cache = AgentGraphCache()
@@ -10,6 +10,7 @@ except ImportError:
     MODEL_NAME = "gemini-2.0-flash"
 
 from google.adk.agents import Agent
+from utils.context import bind_user_context
 from prompts.system_prompts import BILLING_PROMPT
 from tools.billing_tools import check_balance, process_payment
 
@@ -17,5 +18,5 @@ billing_agent = Agent(
     name="BillingAgent",
     instruction=BILLING_PROMPT,
     model=MODEL_NAME,
-    tools=[check_balance, process_payment]
+    tools=[bind_user_context(check_balance), bind_user_context(process_payment)]
 )
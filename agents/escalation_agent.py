@@ -10,6 +10,7 @@ except ImportError:
     MODEL_NAME = "gemini-2.0-flash"
 
 from google.adk.agents import Agent
+from utils.context import bind_user_context
 from prompts.system_prompts import ESCALATION_PROMPT
 from tools.escalation_tools import escalate_to_human
 
@@ -17,5 +18,5 @@ escalation_agent = Agent(
     name="EscalationAgent",
     instruction=ESCALATION_PROMPT,
     model=MODEL_NAME,
-    tools=[escalate_to_human]
+    tools=[bind_user_context(escalate_to_human)]
 )
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import math
+import os
+import random
+import re
+from typing import AsyncGenerator
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from services.intent_classifier import rule_intent
+from services.metrics import timed_stream
+
+logger = logging.getLogger("MockLlm")
+
+# Which specialist the dispatcher transfers to, per intent
+INTENT_AGENTS = {
+    "billing": "BillingAgent",
+    "tech": "TechSupportAgent",
+    "escalate": "EscalationAgent",
+}
+
+_AMOUNT = re.compile(r"(\d+(?:\.\d+)?)")
+
+class MockLlm(BaseLlm):
+    """
+    Deterministic, offline LLM for benchmarks and CI.
+
+    Plays the dispatcher and specialist roles from the request itself: the root
+    agent (which has transfer_to_agent) transfers by intent, specialists call
+    check_balance / process_payment / check_outage / run_diagnostics /
+    escalate_to_human, and a tool result is turned into a short spoken reply.
+    Latency is drawn from a configurable distribution (seeded RNG) and token
+    counts are reported in usage_metadata.
+
+    Configured with MOCK_LLM_LATENCY ("fixed:300", "normal:800:200" or
+    "lognormal:800:300", in ms), MOCK_LLM_MS_PER_TOKEN, MOCK_LLM_CHARS_PER_TOKEN
+    (default ~4, like the Gemini tokenizer on English text) and MOCK_LLM_SEED.
+    """
+
+    model: str = "mock"
+    latency: str = "fixed:0"
+    ms_per_token: float = 0.0
+    chars_per_token: float = 4.0
+    seed: int = 0
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        return [r"mock.*"]
+
+    @classmethod
+    def from_env(cls, model: str = "mock") -> "MockLlm":
+        return cls(
+            model=model,
+            latency=os.environ.get("MOCK_LLM_LATENCY", "fixed:0"),
+            ms_per_token=float(os.environ.get("MOCK_LLM_MS_PER_TOKEN", 0)),
+            chars_per_token=float(os.environ.get("MOCK_LLM_CHARS_PER_TOKEN", 4)),
+            seed=int(os.environ.get("MOCK_LLM_SEED", 0)),
+        )
+
+    def _estimate_tokens(self, text: str) -> int:
+        return max(1, int(len(text) / self.chars_per_token))
+
+    def model_post_init(self, __context):
+        self._rng = random.Random(self.seed)
+
+    # --- Latency ---
+
+    def _sample_latency(self) -> float:
+        """Seconds until the first token."""
+        kind, *params = self.latency.split(":")
+        values = [float(p) for p in params] or [0.0]
+        mean = values[0]
+        stddev = values[1] if len(values) > 1 else 0.0
+        if kind == "normal":
+            ms = self._rng.gauss(mean, stddev)
+        elif kind == "lognormal" and mean > 0:
+            # Parameterised by the mean/stddev of the resulting distribution
+            sigma2 = math.log(1 + (stddev / mean) ** 2)
+            mu = math.log(mean) - sigma2 / 2
+            ms = self._rng.lognormvariate(mu, math.sqrt(sigma2))
+        else:
+            ms = mean
+        return max(0.0, ms) / 1000.0
+
+    # --- Script ---
+
+    @staticmethod
+    def _request_text(llm_request: LlmRequest) -> str:
+        instruction = llm_request.config.system_instruction if llm_request.config else None
+        texts = [instruction if isinstance(instruction, str) else ""]
+        for content in llm_request.contents:
+            texts += [part.text for part in content.parts or [] if part.text]
+        return "\n".join(t for t in texts if t)
+
+    @staticmethod
+    def _latest_user_text(llm_request: LlmRequest) -> str:
+        for content in reversed(llm_request.contents):
+            if content.role != "user" or not content.parts:
+                continue
+            texts = [part.text for part in content.parts if part.text]
+            if texts and texts[0] != "For context:":
+                return "\n".join(texts)
+        return ""
+
+    @staticmethod
+    def _pending_tool_result(llm_request: LlmRequest):
+        """The function_response this call should answer, if the last turn was a tool call."""
+        if not llm_request.contents:
+            return None
+        for part in llm_request.contents[-1].parts or []:
+            if part.function_response and part.function_response.name != "transfer_to_agent":
+                return part.function_response
+        return None
+
+    def _tool_args(self, llm_request: LlmRequest, tool_name: str, user_text: str) -> dict:
+        tool = llm_request.tools_dict.get(tool_name)
+        declaration = tool._get_declaration() if tool else None
+        params = set()
+        if declaration and declaration.parameters and declaration.parameters.properties:
+            params = set(declaration.parameters.properties)
+
+        args = {}
+        if "amount" in params:
+            amount = _AMOUNT.search(user_text)
+            args["amount"] = float(amount.group(1)) if amount else 100.0
+        if "reason" in params:
+            args["reason"] = user_text.splitlines()[-1][:200]
+        return args
+
+    def _choose_tool(self, tools: set, user_text: str):
+        lowered = user_text.lower()
+        if "process_payment" in tools and re.search(r"\bpay", lowered) and _AMOUNT.search(lowered):
+            return "process_payment"
+        if "check_balance" in tools:
+            return "check_balance"
+        if "check_outage" in tools and re.search(r"(outage|down|area|region)", lowered):
+            return "check_outage"
+        if "run_diagnostics" in tools:
+            return "run_diagnostics"
+        if "check_outage" in tools:
+            return "check_outage"
+        if "escalate_to_human" in tools:
+            return "escalate_to_human"
+        return None
+
+    @staticmethod
+    def _speak_result(name: str, result: dict) -> str:
+        result = result or {}
+        if result.get("status") == "error":
+            return f"Sorry, I could not complete that. {result.get('message', '')}".strip()
+        if name == "check_balance":
+            return (f"Your current balance is {result.get('balance_amount')} {result.get('currency', 'INR')}. "
+                    f"It is due on {result.get('due_date')}. Is there anything else?")
+        if name == "process_payment":
+            return (f"Your payment of {result.get('amount_paid')} was successful. "
+                    f"Your remaining balance is {result.get('remaining_balance')}.")
+        if name == "run_diagnostics":
+            return f"Your router {result.get('device')} is {result.get('status')}. {result.get('recommendation', '')}".strip()
+        if name == "escalate_to_human":
+            return f"{result.get('message', 'I have escalated your request.')} Your ticket is {result.get('ticket_id')}."
+        return result.get("message") or "Done. Is there anything else?"
+
+    def _respond(self, llm_request: LlmRequest) -> types.Content:
+        tools = set(llm_request.tools_dict)
+        tool_result = self._pending_tool_result(llm_request)
+        if tool_result is not None:
+            return types.Content(role="model", parts=[
+                types.Part(text=self._speak_result(tool_result.name, tool_result.response))
+            ])
+
+        user_text = self._latest_user_text(llm_request)
+
+        # Dispatcher: transfer by intent
+        if "transfer_to_agent" in tools and not tools - {"transfer_to_agent"}:
+            agent_name = INTENT_AGENTS.get(rule_intent(user_text))
+            if agent_name:
+                return types.Content(role="model", parts=[types.Part(
+                    function_call=types.FunctionCall(name="transfer_to_agent", args={"agent_name": agent_name})
+                )])
+            return types.Content(role="model", parts=[
+                types.Part(text="I can help with billing, network issues or connect you to a person.")
+            ])
+
+        # Specialist: call its tool
+        tool_name = self._choose_tool(tools, user_text)
+        if tool_name:
+            return types.Content(role="model", parts=[types.Part(
+                function_call=types.FunctionCall(name=tool_name, args=self._tool_args(llm_request, tool_name, user_text))
+            )])
+        return types.Content(role="model", parts=[types.Part(text="How else can I help you today?")])
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        content = self._respond(llm_request)
+        text = "".join(part.text or "" for part in content.parts)
+        output_tokens = self._estimate_tokens(text) if text else 8
+        prompt_tokens = self._estimate_tokens(self._request_text(llm_request))
+        usage = types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens,
+        )
+
+        async for response in timed_stream("llm", self._stream(content, text, output_tokens, usage, stream)):
+            yield response
+
+    async def _stream(self, content, text: str, output_tokens: int, usage, stream: bool):
+        await asyncio.sleep(self._sample_latency())
+
+        if stream and text:
+            # Same shape as Gemini SSE: partial chunks, then the aggregated response
+            words = text.split(" ")
+            for i in range(0, len(words), 4):
+                chunk = " ".join(words[i:i + 4]) + (" " if i + 4 < len(words) else "")
+                await asyncio.sleep(self.ms_per_token * self._estimate_tokens(chunk) / 1000.0)
+                yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=chunk)]), partial=True)
+        elif self.ms_per_token:
+            await asyncio.sleep(self.ms_per_token * output_tokens / 1000.0)
+
+        yield LlmResponse(content=content, usage_metadata=usage, turn_complete=True)
@@ -0,0 +1,84 @@
+import logging
+from functools import cached_property
+from typing import AsyncGenerator
+
+from google.adk.models.google_llm import Gemini
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import Client, types
+
+from services.key_pool import ApiKeyPool, is_resource_exhausted
+from services.metrics import span, timed_stream
+
+logger = logging.getLogger("PooledGemini")
+
+class KeyedGemini(Gemini):
+    """Gemini bound to one API key; its Client is built once and reused."""
+
+    api_key: str = ""
+
+    @cached_property
+    def api_client(self) -> Client:
+        return Client(
+            api_key=self.api_key,
+            http_options=types.HttpOptions(
+                headers=self._tracking_headers,
+                retry_options=self.retry_options,
+            )
+        )
+
+# One KeyedGemini (and so one Client) per configured key
+key_pool = ApiKeyPool.from_env(client_factory=lambda key: KeyedGemini(api_key=key))
+
+class PooledGemini(Gemini):
+    """
+    Gemini model that schedules each LLM call on the shared ApiKeyPool.
+    A RESOURCE_EXHAUSTED before any output is retried on another key; the
+    exhausted key is put in cooldown. Without configured keys it behaves like Gemini.
+    """
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        if not len(key_pool):
+            async for response in timed_stream("llm", super().generate_content_async(llm_request, stream)):
+                yield response
+            return
+
+        attempts = len(key_pool)
+        for attempt in range(attempts):
+            with span("key_acquire"):
+                lease = await key_pool.acquire()
+            yielded = False
+            released = False
+            error = None
+            # The llm span covers only the upstream awaits, not the caller's work between responses
+            upstream = timed_stream("llm", lease.client.generate_content_async(llm_request, stream))
+            try:
+                response = await anext(upstream, None)
+                while response is not None:
+                    if getattr(response, "partial", False):
+                        yielded = True
+                        yield response
+                        response = await anext(upstream, None)
+                        continue
+                    # A final response: look ahead so the key goes back to the pool as soon
+                    # as upstream is exhausted, not when the caller is done with the turn
+                    following = await anext(upstream, None)
+                    if following is None:
+                        key_pool.release(lease)
+                        released = True
+                    yielded = True
+                    yield response
+                    response = following
+            except Exception as e:
+                error = e
+                if is_resource_exhausted(e) and not yielded and attempt + 1 < attempts:
+                    logger.warning(f"Key {lease.label} exhausted, retrying on another key")
+                    continue
+                raise
+            finally:
+                if not released:
+                    key_pool.release(lease, error=error)
+                await upstream.aclose()
+            return
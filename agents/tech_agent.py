@@ -10,6 +10,7 @@ except ImportError:
     MODEL_NAME = "gemini-2.0-flash"
 
 from google.adk.agents import Agent
+from utils.context import bind_user_context
 from prompts.system_prompts import TECH_PROMPT
 from tools.network_tools import run_diagnostics, check_outage
 
@@ -17,5 +18,5 @@ tech_agent = Agent(
     name="TechSupportAgent",
     instruction=TECH_PROMPT,
     model=MODEL_NAME,
-    tools=[run_diagnostics, check_outage]
+    tools=[bind_user_context(run_diagnostics), bind_user_context(check_outage)]
 )
@@ -0,0 +1,39 @@
+import argparse
+import os
+
+import redis
+from dotenv import load_dotenv
+
+from services.escalation_queue import EscalationQueue
+
+load_dotenv()
+
+def work(desk: str, block_ms: int):
+    """
+    Works the escalation stream as one human-agent desk: shows the next escalation
+    (a stalled one from another desk first), then records how it was resolved.
+    Every desk runs its own copy under a distinct name; Ctrl+C stops this one, and
+    an escalation it was holding is reclaimed by another desk after ESCALATION_CLAIM_IDLE_MS.
+    """
+    client = redis.Redis.from_url(os.environ.get("REDIS_URL", "redis://localhost:6379/0"), decode_responses=True)
+    queue = EscalationQueue(client)
+    queue.ensure_group()
+    print(f"Desk {desk} waiting for escalations (Ctrl+C to stop). Queue: {queue.stats()}")
+    try:
+        while True:
+            escalation = queue.next(desk, block_ms=block_ms)
+            if escalation is None:
+                continue
+            print(f"\n{escalation['ticket_id']}  caller {escalation['user_id']}: {escalation['reason']}")
+            status = input("Resolution status [RESOLVED]: ").strip().upper() or "RESOLVED"
+            queue.resolve(escalation, status)
+            print(f"{escalation['ticket_id']} closed as {status}.")
+    except KeyboardInterrupt:
+        print(f"\nDesk {desk} stopped.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consume the escalation stream as a human-agent desk")
+    parser.add_argument("desk", help="This desk's consumer name, unique per desk (e.g. desk-1)")
+    parser.add_argument("--block-ms", type=int, default=5000, help="How long to wait for a new escalation per poll")
+    args = parser.parse_args()
+    work(args.desk, args.block_ms)
@@ -4,11 +4,43 @@ from datetime import datetime
 
 DB_PATH = "call_metrics.db"
 
+def thinking_percentile(cursor, day, pct):
+    """Approximate thinking-time percentile (ms) from the day's histogram buckets."""
+    cursor.execute("SELECT le_ms, count FROM daily_thinking_buckets WHERE day = ? ORDER BY le_ms", (day,))
+    buckets = cursor.fetchall()
+    total = sum(b['count'] for b in buckets)
+    if not total:
+        return None
+    seen = 0
+    for b in buckets:
+        seen += b['count']
+        if seen >= total * pct / 100:
+            return b['le_ms']
+
+def print_daily_stats(cursor, days=7):
+    print(f"\n{'='*20} DAILY STATS {'='*20}")
+    print(f"{'Day':<10} | {'Calls':>5} | {'Done':>5} | {'Think HU':>8} | {'Score':>6} | {'Think avg':>9} | {'p95 <=':>7}")
+    print("-" * 80)
+    try:
+        cursor.execute("SELECT * FROM daily_call_stats ORDER BY day DESC LIMIT ?", (days,))
+    except sqlite3.OperationalError:
+        print("No rollups yet (start the server once to migrate the schema).")
+        return
+    for row in cursor.fetchall():
+        avg = row['thinking_ms_total'] / row['thinking_count'] if row['thinking_count'] else 0
+        p95 = thinking_percentile(cursor, row['day'], 95)
+        p95_str = "-" if p95 is None else ("slower" if p95 >= 10 ** 9 else f"{p95}ms")
+        print(f"{row['day']:<10} | {row['calls']:>5} | {row['completed']:>5} | {row['thinking_hangups']:>8} | "
+              f"{row['score_total']:>6} | {avg:>7.0f}ms | {p95_str:>7}")
+
 def inspect_db():
     try:
         conn = sqlite3.connect(DB_PATH)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
+
+        # Aggregates come from the rollup tables, never from scanning call_events
+        print_daily_stats(cursor)
         
         print(f"\n{'='*20} RECENT CALLS {'='*20}")
         print(f"{'Call SID':<38} | {'Status':<10} | {'Score':<5} | {'Agent Path'}")
@@ -0,0 +1,258 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+# --- Logging Setup ---
+logging.basicConfig(level=logging.WARNING, format="%(asctime)s [LoadTest] %(message)s")
+logger = logging.getLogger("LoadTest")
+
+# Realistic caller utterances, one list per scripted call
+CALL_SCRIPTS = [
+    ["Check my balance", "I want to pay 500 rupees", "Thanks, bye."],
+    ["My internet is really slow", "Is there an outage in my area?", "Thank you, goodbye."],
+    ["I want to talk to a human", "Bye."],
+    ["When is my bill due?", "Is there an outage?", "That's all, thanks. Bye."],
+]
+
+STUB_REPLIES = {
+    "balance": "Your current balance is 1245 rupees. It is due in seven days. Anything else I can help with?",
+    "pay": "I have processed your payment of 500 rupees. Your remaining balance is 745 rupees.",
+    "outage": "There is a known outage in your area. The estimated resolution is 90 minutes.",
+    "slow": "I ran a diagnostic on your router. Everything looks healthy, please restart your router.",
+    "human": "I have escalated your request. Your ticket is T, one, two, three. A human agent will join shortly.",
+}
+
+def percentile(samples: list, pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+class FakeTwilioClient:
+    """Stands in for twilio.rest.Client: records every live-call update."""
+
+    def __init__(self):
+        self.updates = defaultdict(list)
+        self._events = defaultdict(asyncio.Event)
+        self._loop = None
+
+    def calls(self, call_sid):
+        client = self
+
+        class _Call:
+            def update(self, twiml):
+                # Called from the server's executor thread
+                client.updates[call_sid].append((time.perf_counter(), twiml))
+                client._loop.call_soon_threadsafe(client._events[call_sid].set)
+
+        return _Call()
+
+    async def wait_update(self, call_sid: str, timeout: float):
+        event = self._events[call_sid]
+        await asyncio.wait_for(event.wait(), timeout)
+        event.clear()
+        return self.updates[call_sid][-1]
+
+def install_stubs(server, llm_latency: float, llm_jitter: float, llm_backend: str = "stub"):
+    """
+    Stubs Twilio inside the server module, and the LLM:
+    stub replaces the whole agent turn with a scripted reply; mock keeps the ADK
+    runner, agents and tools and only swaps the model for MockLlm.
+    """
+
+    async def fake_stream(user_id, user_text, streaming=False):
+        lowered = user_text.lower()
+        reply = next((r for k, r in STUB_REPLIES.items() if k in lowered),
+                     "I can help with billing, outages and escalations.")
+        # Time to first token, then the rest of the reply
+        await asyncio.sleep(max(0.0, random.gauss(llm_latency, llm_jitter)))
+        words = reply.split(" ")
+        for i in range(0, len(words), 4):
+            await asyncio.sleep(0.005)
+            yield " ".join(words[i:i + 4]) + " "
+
+    if llm_backend == "stub":
+        server.stream_agent_response = fake_stream
+    fake_twilio = FakeTwilioClient()
+    server.twilio_client = fake_twilio
+    return fake_twilio
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.time_to_reply = []
+        self.errors = defaultdict(int)
+        self.requests = 0
+
+    async def post(self, client, endpoint: str, data: dict) -> str:
+        start = time.perf_counter()
+        try:
+            response = await client.post(endpoint, data=data)
+            response.raise_for_status()
+            return response.text
+        except Exception as e:
+            self.errors[endpoint] += 1
+            logger.warning(f"{endpoint} failed: {e}")
+            return ""
+        finally:
+            self.latencies[endpoint].append(time.perf_counter() - start)
+            self.requests += 1
+
+async def simulate_call(client, recorder: Recorder, twilio, index: int, script: list, reply_timeout: float):
+    call_sid = f"CA_load_{index:05d}"
+    caller = f"+1555{index:07d}"
+    form = {"CallSid": call_sid, "From": caller}
+
+    await recorder.post(client, "/voice", form)
+
+    for utterance in script:
+        twiml = await recorder.post(client, "/gather_speech", {**form, "SpeechResult": utterance})
+        if "<Hangup" in twiml or "/process_speech" not in twiml:
+            continue
+
+        turn_start = time.perf_counter()
+        twiml = await recorder.post(client, "/process_speech", form)
+
+        if twilio is not None and "<Pause" in twiml:
+            # Async path: the reply arrives as a live-call update
+            try:
+                updated_at, twiml = await twilio.wait_update(call_sid, reply_timeout)
+            except asyncio.TimeoutError:
+                recorder.errors["time_to_reply"] += 1
+                continue
+            recorder.time_to_reply.append(updated_at - turn_start)
+            # Follow streamed sentences until the agent hands back to <Gather>
+            while "/continue_reply" in twiml and "<Gather" not in twiml:
+                twiml = await recorder.post(client, "/continue_reply", form)
+        else:
+            recorder.time_to_reply.append(time.perf_counter() - turn_start)
+
+    await recorder.post(client, "/status_callback", {**form, "CallStatus": "completed"})
+
+def report(recorder: Recorder, elapsed: float, calls: int) -> dict:
+    rows = {}
+    for endpoint, samples in sorted(recorder.latencies.items()):
+        rows[endpoint] = samples
+    rows["time_to_reply"] = recorder.time_to_reply
+
+    summary = {
+        "calls": calls,
+        "elapsed_s": round(elapsed, 3),
+        "calls_per_s": round(calls / elapsed, 2) if elapsed else 0,
+        "requests_per_s": round(recorder.requests / elapsed, 2) if elapsed else 0,
+        "errors": dict(recorder.errors),
+        "latency_ms": {},
+    }
+
+    print(f"\n{'Endpoint':<18} | {'count':>6} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | {'mean ms':>8}")
+    print("-" * 72)
+    for name, samples in rows.items():
+        if not samples:
+            continue
+        stats = {
+            "count": len(samples),
+            "p50": round(percentile(samples, 50) * 1000, 2),
+            "p95": round(percentile(samples, 95) * 1000, 2),
+            "p99": round(percentile(samples, 99) * 1000, 2),
+            "mean": round(statistics.fmean(samples) * 1000, 2),
+        }
+        summary["latency_ms"][name] = stats
+        print(f"{name:<18} | {stats['count']:>6} | {stats['p50']:>8} | {stats['p95']:>8} | {stats['p99']:>8} | {stats['mean']:>8}")
+
+    print(f"\nThroughput: {summary['calls_per_s']} calls/s, {summary['requests_per_s']} requests/s "
+          f"({calls} calls in {summary['elapsed_s']}s)")
+    if recorder.errors:
+        print(f"Errors: {summary['errors']}")
+    return summary
+
+async def run(args) -> dict:
+    import uvicorn
+    import server
+    from agents import agent_factory
+    from services.rl_service import RLService
+
+    # Keep benchmark telemetry out of the real call_metrics.db (one instance, shared with the graph cache)
+    tmp_dir = tempfile.mkdtemp(prefix="voice-load-")
+    agent_factory.rl_service.close()
+    server.rl_service = agent_factory.rl_service = RLService(db_path=os.path.join(tmp_dir, "call_metrics.db"))
+    agent_factory.graph_cache.invalidate()
+
+    # Server logs go to stdout + server.log; keep them from drowning the report
+    logging.getLogger().setLevel(args.server_log_level)
+
+    if args.llm == "mock":
+        # Full agent graph against MockLlm; tools still hit the configured Redis
+        from agents.mock_llm import MockLlm
+        agent_factory.build_model = lambda: MockLlm(
+            latency=f"lognormal:{args.llm_latency}:{args.llm_jitter}", seed=args.seed
+        )
+        agent_factory.graph_cache.invalidate()
+
+    twilio = install_stubs(server, args.llm_latency / 1000.0, args.llm_jitter / 1000.0, args.llm)
+    twilio._loop = asyncio.get_running_loop()
+    if args.sync:
+        twilio = server.twilio_client = None
+    server.STREAM_REPLIES = not args.no_streaming
+    # No judge calls against the throwaway DB
+    server.REFLECTION_ENABLED = False
+
+    config = uvicorn.Config(server.app, host="127.0.0.1", port=args.port, log_level="warning", lifespan="on")
+    uv_server = uvicorn.Server(config)
+    serve_task = asyncio.create_task(uv_server.serve())
+    while not uv_server.started:
+        await asyncio.sleep(0.01)
+    port = uv_server.servers[0].sockets[0].getsockname()[1]
+
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.calls, max_keepalive_connections=args.calls)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+
+        async def delayed_call(i):
+            if args.ramp:
+                await asyncio.sleep(args.ramp * i / args.calls)
+            await simulate_call(client, recorder, twilio, i, CALL_SCRIPTS[i % len(CALL_SCRIPTS)], args.reply_timeout)
+
+        await asyncio.gather(*(delayed_call(i) for i in range(args.calls)))
+        elapsed = time.perf_counter() - start
+
+    uv_server.should_exit = True
+    await serve_task
+    return report(recorder, elapsed, args.calls)
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-call load test for the Twilio webhook flow.")
+    parser.add_argument("--calls", type=int, default=50, help="Number of concurrent simulated calls")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Seconds over which calls are started")
+    parser.add_argument("--llm", choices=["stub", "mock"], default="stub",
+                        help="stub: scripted agent turn; mock: real ADK graph with MockLlm")
+    parser.add_argument("--seed", type=int, default=0, help="RNG seed for the mock LLM")
+    parser.add_argument("--llm-latency", type=float, default=800, help="Stub LLM time-to-first-token (ms)")
+    parser.add_argument("--llm-jitter", type=float, default=200, help="Stub LLM latency std-dev (ms)")
+    parser.add_argument("--reply-timeout", type=float, default=30, help="Give up waiting for a reply after (s)")
+    parser.add_argument("--no-streaming", action="store_true", help="Disable sentence streaming (STREAM_REPLIES)")
+    parser.add_argument("--sync", action="store_true", help="No Twilio client: agent runs inside /process_speech")
+    parser.add_argument("--port", type=int, default=0, help="Port for the in-process server (0 = any free port)")
+    parser.add_argument("--server-log-level", default="WARNING", help="Log level for the server under test")
+    parser.add_argument("--json", help="Write the summary to this file")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(summary, fh, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import argparse
+from services.database import db, DatabaseUnavailable
+
+def migrate(page_size: int):
+    """
+    Converts user:{id} records from the old JSON-string layout to hashes
+    (one field per attribute) and rebuilds the region -> users index.
+    Safe to run while the server is live and to run more than once:
+    records the server touches first are converted on the spot.
+    """
+    if db.backend != "redis":
+        print(f"DB_BACKEND={db.backend}: no older record layout to migrate.")
+        return
+    print("Migrating user records to hashes...")
+    try:
+        counts = db.migrate_users(page_size=page_size)
+    except DatabaseUnavailable as e:
+        print(f"{e}; migration stopped (safe to re-run).")
+        return
+    print(f"Converted: {counts['converted']}, already hashes: {counts['already_hash']}, "
+          f"unreadable (left as-is): {counts['unreadable']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate user:{id} JSON records to Redis hashes")
+    parser.add_argument("--page-size", type=int, default=500, help="Keys per SCAN page / pipeline")
+    migrate(parser.parse_args().page_size)
@@ -1,9 +1,10 @@
+import asyncio
 import logging
 import sys
+import time
 import uuid
 import os
-import re
-import google.generativeai as genai
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request, Form, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
@@ -16,14 +17,24 @@ from twilio.rest import Client
 try:
     from agents.root_agent import root_agent
     from google.adk.sessions.in_memory_session_service import InMemorySessionService
-    from agents.agent_factory import create_agent_graph
+    from agents.agent_factory import graph_cache, rl_service
+    from agents.pooled_gemini import key_pool
     from google.adk.sessions.in_memory_session_service import InMemorySessionService
     from google.adk.agents.invocation_context import InvocationContext
-    from google.adk.agents.run_config import RunConfig
+    from google.adk.agents.run_config import RunConfig, StreamingMode
     from google.adk.runners import Runner
     
-    # RL Service
-    from services.rl_service import RLService
+    from services.reflection_queue import ReflectionWorker
+    from services.executor import run_blocking
+    from services.single_flight import SingleFlight
+    from services.session_manager import SessionManager
+    from services.database import db, adb
+    from services.outage_notifier import OutageNotifier, twilio_sender
+    from services.network_cache import network_cache
+    from services.metrics import registry as metrics, span, trace_turn, FIRST_AUDIO_SECONDS, HTTP_SECONDS
+    from utils.context import begin_turn, set_user_context, set_turn_id
+    from utils.sentences import SentenceChunker
+    from services.intent_classifier import load_default as load_intent_classifier, rule_intent, has_farewell
 
     # GenAI Types
     from google.genai.types import Content, Part
@@ -52,12 +63,42 @@ logging.basicConfig(
 )
 logger = logging.getLogger("VoiceServer")
 
-app = FastAPI(title="ADK Voice Agent")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global reflection_worker, outage_notifier
+    # Learning loop runs on its own threads, draining the persisted reflection queue
+    if REFLECTION_ENABLED:
+        reflection_worker = ReflectionWorker(rl_service)
+        reflection_worker.start()
+    # Outage -> resolved changes notify the region's users. With Redis they arrive over the
+    # status pub/sub channel from whichever process made them (ops script, another worker);
+    # the embedded SQLite backend only sees changes made through this process.
+    if twilio_client is not None and TWILIO_FROM_NUMBER:
+        outage_notifier = OutageNotifier(db, twilio_sender(twilio_client, TWILIO_FROM_NUMBER))
+        if db.backend == "redis":
+            network_cache.add_listener(outage_notifier.on_status_change)
+        else:
+            db.add_status_listener(outage_notifier.on_status_change)
+    yield
+    if outage_notifier is not None:
+        network_cache.remove_listener(outage_notifier.on_status_change)
+        outage_notifier.stop()
+    # Shutdown: let running reflections finish, then commit queued RL telemetry
+    if reflection_worker is not None:
+        reflection_worker.stop()
+        reflection_worker = None
+    rl_service.close()
+    await adb.close()
+
+app = FastAPI(title="ADK Voice Agent", lifespan=lifespan)
 
 # --- Twilio Client Setup (For Async Updates) ---
 TWILIO_ACCOUNT_SID = os.environ.get("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.environ.get("TWILIO_AUTH_TOKEN")
+# Sender number for proactive outage notifications
+TWILIO_FROM_NUMBER = os.environ.get("TWILIO_FROM_NUMBER")
 twilio_client = None
+outage_notifier = None
 
 if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN:
     try:
@@ -66,42 +107,73 @@ if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN:
     except Exception as e:
         logger.error(f"Failed to init Twilio Client: {e}")
 
-# --- API Key Rotation Setup ---
-# Expects CSV string: "key1,key2,key3"
-API_KEYS_STR = os.environ.get("GOOGLE_API_KEYS", "")
-API_KEYS = [k.strip() for k in API_KEYS_STR.split(",") if k.strip()]
-if not API_KEYS and os.environ.get("GOOGLE_API_KEY"):
-    API_KEYS.append(os.environ["GOOGLE_API_KEY"])
-
-import random
-
-def rotate_api_key():
-    """Selects a random API key from the available pool and sets it in env."""
-    if API_KEYS:
-        selected_key = random.choice(API_KEYS)
-        # Set into environment so Gemini / GoogleGenAI client picks it up
-        os.environ["GOOGLE_API_KEY"] = selected_key
-        # FORCE Re-configuration of the library
-        genai.configure(api_key=selected_key)
-        logger.info(f"Rotated API Key: ...{selected_key[-4:]}")
-    else:
-        logger.warning("No API Keys configured for rotation.")
-
 # Initialize Session Service
 session_service = InMemorySessionService()
 
-# Initialize RL Service
-rl_service = RLService()
+# Reflection on failed calls (started with the app; jobs persist in call_metrics.db)
+REFLECTION_ENABLED = os.environ.get("REFLECTION_ENABLED", "true").lower() in ("1", "true", "yes")
+reflection_worker = None
 
-# Global Session Map for Voice Users (PhoneNumber -> SessionID)
-USER_SESSION_MAP = {}
-# Temporary stash for inputs during redirect loop
-PENDING_INPUTS = {}
+# Voice sessions (PhoneNumber -> SessionID), pending inputs and per-call turns.
+# Bounded by TTL / LRU / byte cap and cleaned up when the call completes.
+session_manager = SessionManager(session_service, app_name="voice-agent")
+# Temporary stash for inputs during redirect loop (PhoneNumber -> (text, turn))
+PENDING_INPUTS = session_manager.pending_inputs
+
+# One agent execution per (call_sid, turn): Twilio retries and duplicates are coalesced
+agent_flight = SingleFlight(result_ttl=float(os.environ.get("AGENT_RESULT_TTL", 120)))
 
 # Run Config
 run_config = RunConfig(
     response_modalities=["text"]
 )
+# SSE streaming: the model's text arrives as partial events we can speak early
+streaming_run_config = RunConfig(
+    streaming_mode=StreamingMode.SSE
+)
+
+# --- Sentence Streaming ---
+# When enabled, the first complete sentence is pushed to the live call immediately
+# and the rest is pulled by Twilio from /continue_reply as each <Say> finishes.
+STREAM_REPLIES = os.environ.get("STREAM_REPLIES", "true").lower() in ("1", "true", "yes")
+# How long /continue_reply waits for the next sentence before padding with a pause
+REPLY_WAIT_TIMEOUT = float(os.environ.get("REPLY_WAIT_TIMEOUT", 5))
+
+class ReplyStream:
+    """Sentences still to be spoken on a live call, produced by the agent task."""
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.finished = False
+
+    def push(self, sentence: str):
+        self.queue.put_nowait(sentence)
+
+    def finish(self):
+        self.finished = True
+        # Wake up a waiting /continue_reply
+        self.queue.put_nowait(None)
+
+    async def next_batch(self, timeout: float) -> list:
+        """Waits for at least one sentence (or the end) and drains what is ready."""
+        batch = []
+        try:
+            item = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return batch
+        while item is not None:
+            batch.append(item)
+            if self.queue.empty():
+                break
+            item = self.queue.get_nowait()
+        return batch
+
+    @property
+    def exhausted(self) -> bool:
+        return self.finished and self.queue.qsize() <= 1
+
+# Live reply streams (CallSid -> ReplyStream)
+REPLY_STREAMS = {}
 
 # --- CORS SETUP (For Web UI) ---
 # Retrieve from env, e.g. "http://localhost:5173,https://myapp.com"
@@ -124,6 +196,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- METRICS ---
+# Gauges (and running totals) read from the live components at scrape time
+metrics.gauge("voice_sessions_live", "ADK sessions held in memory.",
+              callback=lambda: session_manager.stats()["live_sessions"])
+metrics.gauge("voice_session_bytes", "Approximate bytes held by session events.",
+              callback=lambda: session_manager.stats()["bytes_held"])
+metrics.gauge("voice_agent_runs_in_flight", "Agent executions currently running.",
+              callback=lambda: agent_flight.stats()["in_flight"])
+metrics.counter("voice_agent_runs_coalesced_total", "Duplicate webhook executions coalesced.",
+                callback=lambda: agent_flight.stats()["coalesced"])
+metrics.gauge("voice_reply_streams_live", "Calls with sentences still queued for /continue_reply.",
+              callback=lambda: len(REPLY_STREAMS))
+metrics.gauge("rl_db_queue_depth", "Writes waiting for the RL writer thread.",
+              callback=lambda: rl_service.pending_writes)
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route template, not the raw path, so unknown URLs don't create new series
+        route = request.scope.get("route")
+        HTTP_SECONDS.observe(time.perf_counter() - started,
+                             route=getattr(route, "path", "unmatched"), status=status)
+
 # --- HEALTH CHECKS ---
 @app.get("/")
 async def root():
@@ -132,7 +233,23 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    database = db.health()
+    return {
+        # Degraded: the database circuit is open and reads are served from last-known copies
+        "status": "ok" if database["state"] == "closed" else "degraded",
+        "database": database,
+        "single_flight": agent_flight.stats(),
+        "sessions": session_manager.stats(),
+        "api_keys": key_pool.stats(),
+        "network_cache": network_cache.stats(),
+        "reflection": reflection_worker.stats() if reflection_worker else {"running": False},
+        "outage_notifier": outage_notifier.stats() if outage_notifier else None,
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint: per-stage turn latency histograms, counters and gauges."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 
 # --- DATA MODELS ---
@@ -140,38 +257,33 @@ class ChatRequest(BaseModel):
     text: str
     user_id: str = "web_user"
 
+# Local intent model (hashed n-grams + logistic regression), < 1 ms per utterance
+intent_classifier = load_intent_classifier()
+INTENT_CONFIDENCE = float(os.environ.get("INTENT_CONFIDENCE", 0.7))
+# Hanging up on a false positive is costly, so goodbye needs more confidence
+GOODBYE_CONFIDENCE = float(os.environ.get("GOODBYE_CONFIDENCE", 0.9))
+
+FILLER_MESSAGES = {
+    "billing": "I am checking your account details, please wait a moment.",
+    "tech": "I am checking the network status in your area, one moment please.",
+    "escalate": "I am connecting you to a human agent, please hold.",
+}
+
 def get_filler_message(text: str) -> str:
     """Determines a context-aware filler message based on user input."""
-    text = text.lower()
-    
-    if re.search(r"(balance|bill|pay|cost|owing|due)", text):
-        return "I am checking your account details, please wait a moment."
-    
-    if re.search(r"(internet|slow|down|outage|wifi|connect)", text):
-        return "I am checking the network status in your area, one moment please."
-        
-    if re.search(r"(human|agent|operator|person|talk to|speak with|escalate)", text):
-        return "I am connecting you to a human agent, please hold."
-        
-    return "Thank you. Please bear with me for a moment."
+    intent, confidence = intent_classifier.predict(text)
+    if intent not in FILLER_MESSAGES or confidence < INTENT_CONFIDENCE:
+        # Fall back to the keyword rules
+        intent = rule_intent(text)
+    return FILLER_MESSAGES.get(intent, "Thank you. Please bear with me for a moment.")
 
 def is_goodbye(text: str) -> bool:
     """Checks if the user wants to end the call."""
-    # Normalize: lowercase and remove punctuation (keep spaces)
-    text = re.sub(r'[^\w\s]', '', text.lower()).strip()
-    
-    # Simple explicit phrases
-    if text in ["bye", "goodbye", "cancel", "end", "hang up", "exit", "quit", "thanks bye", "thank you bye"]:
-        return True
-        
-    # Regex for phrases
-    if re.search(r"^(goodbye|bye|bye\s+bye|see\s+you|talk\s+to\s+you\s+later)$", text):
+    intent, confidence = intent_classifier.predict(text)
+    # The model alone never hangs up: the utterance must also contain an explicit farewell
+    if intent == "goodbye" and confidence >= GOODBYE_CONFIDENCE and has_farewell(text):
         return True
-        
-    if re.search(r"(thank\s+you|thanks)\s+(bye|goodbye)", text):
-        return True
-        
-    return False
+    return rule_intent(text) == "goodbye"
 
 @app.post("/voice")
 async def voice_start(request: Request):
@@ -183,8 +295,9 @@ async def voice_start(request: Request):
     
     form = await request.form()
     call_sid = form.get("CallSid", "local_tester")
+    session_manager.bind_call(call_sid, form.get("From", "local_tester"))
     
-    # RL: Start Tracking
+    # RL: Start Tracking (write-behind: queued, committed by the RL writer thread)
     rl_service.start_call(call_sid)
     rl_service.update_status(call_sid, "LISTENING")
     
@@ -233,8 +346,10 @@ async def gather_speech(request: Request):
         resp.append(gather)
         return Response(content=str(resp), media_type="application/xml")
 
-    # Store input for the processing step
-    PENDING_INPUTS[user_id] = user_text
+    # Store input for the processing step, tagged with this call's turn number
+    session_manager.bind_call(call_sid, user_id)
+    turn = session_manager.next_turn(call_sid)
+    PENDING_INPUTS[user_id] = (user_text, turn)
 
     # --- INSTANT HANGUP CHECK ---
     # If user says "Goodbye", hang up immediately without invoking LLM
@@ -272,72 +387,82 @@ async def chat_endpoint(request: ChatRequest):
     
     return {"reply": agent_reply}
 
+def _extract_event_text(event) -> str:
+    """Pulls any model text out of a Runner event (function calls are only logged)."""
+    text = ""
+    if hasattr(event, "text") and event.text:
+        text += event.text
+    elif hasattr(event, "delta") and hasattr(event.delta, "text") and event.delta.text:
+        text += event.delta.text
+    elif hasattr(event, "content") and event.content:
+        if hasattr(event.content, "parts") and event.content.parts:
+            for part in event.content.parts:
+                if hasattr(part, "text") and part.text:
+                    text += part.text
+                elif hasattr(part, "function_call") and part.function_call:
+                    logger.info(f"Runner executing FunctionCall: {part.function_call.name}")
+    return text
+
+async def stream_agent_response(user_id: str, user_text: str, streaming: bool = False):
+    """
+    Runs the ADK Agent (Session + Runner) on the runner's async API.
+    Yields reply text as events arrive, so the event loop stays free between LLM/tool steps.
+    With streaming=True the model is run in SSE mode and partial text deltas are yielded.
+    """
+    # Fresh per-turn memo: tools in this turn share one fetch of the user record
+    begin_turn()
+    # Tools read the caller from context; prompts and messages carry no per-user data
+    set_user_context(user_id)
+
+    content_obj = Content(role="user", parts=[Part(text=user_text)])
+
+    # 1. Get or Create Session (and Compact History)
+    with span("session"):
+        session_id = await session_manager.get_or_create(user_id)
+
+        # --- CONTEXT COMPACTION ---
+        # Keeps the history under HISTORY_TOKEN_BUDGET; older turns fold into a running summary
+        try:
+            session_manager.compact(user_id)
+        except Exception as e:
+            logger.warning(f"Failed to compact history: {e}")
+
+    # 2. Get Runner (one graph shared by all callers, rebuilt only when rules change)
+    with span("graph"):
+        runner = graph_cache.current_runner(session_service, app_name="voice-agent")
+        if runner is None:
+            # A rebuild reads the learned rules from SQLite: keep it off the event loop
+            runner = await run_blocking(graph_cache.get_runner, session_service, app_name="voice-agent")
+
+    # 3. Execute Runner Loop (async: tools await `adb`, LLM calls are scheduled on the key pool)
+    logger.info("Starting Agent Execution...")
+    saw_partial = False
+    async for event in runner.run_async(
+        user_id=user_id,
+        session_id=session_id,
+        new_message=content_obj,
+        run_config=streaming_run_config if streaming else None
+    ):
+        text = _extract_event_text(event)
+        if getattr(event, "partial", False):
+            saw_partial = True
+        elif saw_partial:
+            # Final aggregated event repeats the partial deltas we already yielded
+            saw_partial = False
+            continue
+        if text:
+            yield text
+
+    # Update the bytes-held gauge with this turn's events
+    session_manager.account(user_id)
+
 async def get_agent_response(user_id: str, user_text: str) -> str:
-    """Core logic to run the ADK Agent (Session + Runner)."""
+    """Core logic to run the ADK Agent and collect the full reply."""
     try:
-        # Prepend User ID to the text so the System Prompt context is satisfied
-        full_text = f"User ID: {user_id}\n{user_text}"
-        content_obj = Content(role="user", parts=[Part(text=full_text)])
         agent_reply = ""
-        
-        # 1. Get or Create Session (and Truncate History)
-        if user_id in USER_SESSION_MAP:
-            session_id = USER_SESSION_MAP[user_id]
-            logger.info(f"Resuming session: {session_id}")
-            
-            # --- CONTEXT TRUNCATION ---
-            try:
-                current_session = await session_service.get_session(session_id)
-                if current_session and hasattr(current_session, 'events'):
-                    MAX_EVENTS = 15
-                    if len(current_session.events) > MAX_EVENTS:
-                        logger.info(f"Truncating history: {len(current_session.events)} -> {MAX_EVENTS}")
-                        current_session.events = current_session.events[-MAX_EVENTS:]
-            except Exception as e:
-                logger.warning(f"Failed to truncate history: {e}")
-        else:
-            logger.info("Creating new session...")
-            session = await session_service.create_session(
-                app_name="voice-agent",
-                user_id=user_id
-            )
-            session_id = session.id
-            USER_SESSION_MAP[user_id] = session_id
-            logger.info(f"Created new session: {session_id}")
-
-        # 2. Key Rotation
-        rotate_api_key()
-        
-        # 3. Create Agent (Dynamic Graph with User ID injected)
-        agent_instance = create_agent_graph(user_id)
-        
-        # 4. Initialize Runner
-        runner = Runner(
-            agent=agent_instance,
-            app_name="voice-agent",
-            session_service=session_service
-        )
+        async for text in stream_agent_response(user_id, user_text):
+            agent_reply += text
 
-        # 4. Execute Runner Loop
-        logger.info("Starting Agent Execution...")
-        for event in runner.run(
-            user_id=user_id,
-            session_id=session_id,
-            new_message=content_obj
-        ):
-             # Extract text
-             if hasattr(event, "text") and event.text:
-                 agent_reply += event.text
-             elif hasattr(event, "delta") and hasattr(event.delta, "text") and event.delta.text:
-                 agent_reply += event.delta.text
-             elif hasattr(event, "content") and event.content:
-                 if hasattr(event.content, "parts") and event.content.parts:
-                     for part in event.content.parts:
-                         if hasattr(part, "text") and part.text:
-                             agent_reply += part.text
-                         elif hasattr(part, "function_call") and part.function_call:
-                             logger.info(f"Runner executing FunctionCall: {part.function_call.name}")
-        
         if not agent_reply:
              agent_reply = "I'm thinking, but I have no response."
              
@@ -353,14 +478,96 @@ async def get_agent_response(user_id: str, user_text: str) -> str:
         logger.error(f"Error in agent execution: {e}", exc_info=True)
         return "I'm sorry, I encountered an error while processing your request."
 
+def _build_reply_twiml(sentences: list, gather_action_url: str, continue_url: str = None) -> VoiceResponse:
+    """Speaks the sentences, then either pulls more (continue_url) or listens again."""
+    twiml = VoiceResponse()
+    for sentence in sentences:
+        twiml.say(sentence)
+    if continue_url:
+        twiml.redirect(continue_url)
+    else:
+        gather = Gather(input='speech', action=gather_action_url, timeout=3)
+        twiml.append(gather)
+        # Fallback if no speech
+        twiml.redirect(gather_action_url)
+    return twiml
+
+async def stream_reply_to_call(user_id: str, user_text: str, call_sid: str, base_url: str):
+    """
+    Streams the agent reply into the live call sentence by sentence.
+    The first sentence interrupts the hold message right away; later sentences are
+    queued in REPLY_STREAMS and fetched by Twilio via /continue_reply.
+    """
+    if not base_url.endswith("/"):
+        base_url += "/"
+    gather_action_url = f"{base_url}gather_speech"
+    continue_url = f"{base_url}continue_reply"
+
+    started = time.monotonic()
+    stream = ReplyStream()
+    REPLY_STREAMS[call_sid] = stream
+    chunker = SentenceChunker()
+    spoken_first = False
+    full_reply = ""
+
+    async def speak(sentence: str, last: bool = False):
+        nonlocal spoken_first
+        if spoken_first:
+            stream.push(sentence)
+            return
+        if last:
+            # Whole reply fits in one update: no need for the /continue_reply hop
+            REPLY_STREAMS.pop(call_sid, None)
+            twiml = _build_reply_twiml([sentence], gather_action_url)
+        else:
+            twiml = _build_reply_twiml([sentence], gather_action_url, continue_url)
+        with span("twilio_update"):
+            await run_blocking(twilio_client.calls(call_sid).update, twiml=str(twiml))
+        spoken_first = True
+        FIRST_AUDIO_SECONDS.observe(time.monotonic() - started)
+        first_audio_ms = int((time.monotonic() - started) * 1000)
+        logger.info(f"First sentence pushed to Call {call_sid} after {first_audio_ms}ms")
+
+        # RL: Speaking as soon as the first sentence is out
+        rl_service.update_status(call_sid, "SPEAKING")
+        rl_service.log_event(call_sid, "FIRST_AUDIO", str(first_audio_ms))
+
+    try:
+        try:
+            async for text in stream_agent_response(user_id, user_text, streaming=True):
+                full_reply += text
+                for sentence in chunker.feed(text):
+                    await speak(sentence)
+            tail = chunker.flush()
+        except Exception as e:
+            logger.error(f"Error in streamed agent execution: {e}", exc_info=True)
+            tail = "I'm sorry, I encountered an error while processing your request."
+            full_reply += tail
+
+        if not full_reply:
+            tail = full_reply = "I'm thinking, but I have no response."
+        if tail:
+            await speak(tail, last=True)
+        stream.finish()
+
+        logger.info(f"Streamed Agent Response Complete: '{full_reply}'")
+        rl_service.log_chat(call_sid, "assistant", full_reply)
+        rl_service.log_event(call_sid, "THINKING_END")
+
+    except Exception as e:
+        logger.error(f"Failed to stream reply to Twilio Call {call_sid}: {e}")
+        REPLY_STREAMS.pop(call_sid, None)
+
 async def handle_async_agent(user_id: str, user_text: str, call_sid: str, base_url: str):
     """Background Task: Runs agent -> Updates Live Call."""
     logger.info(f"Starting Async Agent logic for CallSid: {call_sid}")
     
     # RL: Still Thinking
     rl_service.update_status(call_sid, "THINKING")
-    
-    agent_response_text = await get_agent_response(user_id, user_text)
+
+    if STREAM_REPLIES:
+        await stream_reply_to_call(user_id, user_text, call_sid, base_url)
+        return
     
     agent_response_text = await get_agent_response(user_id, user_text)
     
@@ -387,8 +594,9 @@ async def handle_async_agent(user_id: str, user_text: str, call_sid: str, base_u
         # Fallback if no speech
         new_twiml.redirect(gather_action_url)
         
-        # Update the live call
-        call = twilio_client.calls(call_sid).update(twiml=str(new_twiml))
+        # Update the live call (blocking REST call -> bounded pool)
+        with span("twilio_update"):
+            call = await run_blocking(twilio_client.calls(call_sid).update, twiml=str(new_twiml))
         logger.info(f"Successfully updated Call {call_sid} with Agent Response.")
         
         # RL: Thinking Done -> Speaking
@@ -399,6 +607,17 @@ async def handle_async_agent(user_id: str, user_text: str, call_sid: str, base_u
         logger.error(f"Failed to update Twilio Call {call_sid}: {e}")
 
 
+async def _traced_turn(call_sid: str, turn: int, path: str, fn, *args):
+    """Runs one agent turn under a trace tagged with its CallSid."""
+    # Idempotency scope for side-effecting tools (payments): a retried turn reuses it
+    set_turn_id(f"{call_sid}:{turn}")
+    with trace_turn(call_sid, turn, path):
+        return await fn(*args)
+
+async def _await_flight(future):
+    """Background Task: keeps the request attached to an in-flight agent execution."""
+    await asyncio.shield(future)
+
 @app.post("/process_speech")
 async def process_speech(request: Request, background_tasks: BackgroundTasks):
     """
@@ -409,17 +628,18 @@ async def process_speech(request: Request, background_tasks: BackgroundTasks):
     call_sid = form.get("CallSid")
     
     # Retrieve stashed input
-    user_text = PENDING_INPUTS.get(user_id)
+    # It stays stashed until the next turn so a retried webhook maps to the same execution
+    pending = PENDING_INPUTS.get(user_id)
     
-    if not user_text:
+    if not pending:
         logging.warning(f"No pending input found for {user_id}")
         resp = VoiceResponse()
         resp.say("I lost your connection. Please say that again.")
         resp.redirect('/voice') # Restart loop
         return Response(content=str(resp), media_type="application/xml")
 
-    # Clear stash
-    del PENDING_INPUTS[user_id]
+    user_text, turn = pending
+    flight_key = (call_sid or user_id, turn)
 
     # --- DECISION: SYNC OR ASYNC? ---
     # use Sync if Local Tester OR Twilio Client not configured OR CallSid missing due to some reason
@@ -428,11 +648,15 @@ async def process_speech(request: Request, background_tasks: BackgroundTasks):
     
     if is_local_test or not can_use_async:
         logger.info(f"Running SYNCHRONOUSLY for {user_id}")
-        # Blocking call
-        agent_reply = await get_agent_response(user_id, user_text)
+        # Blocking call (a duplicate request waits for the same execution)
+        future, coalesced = agent_flight.submit(
+            flight_key, _traced_turn, call_sid, turn, "sync", get_agent_response, user_id, user_text
+        )
+        agent_reply = await asyncio.shield(future)
         
         # RL: Log Agent Reply
-        rl_service.log_chat(call_sid, "assistant", agent_reply)
+        if not coalesced:
+            rl_service.log_chat(call_sid, "assistant", agent_reply)
         
         resp = VoiceResponse()
         resp.say(agent_reply)
@@ -451,11 +675,19 @@ async def process_speech(request: Request, background_tasks: BackgroundTasks):
         # Pass the base_url so we can construct absolute callbacks
         base_url = str(request.base_url)
         
-        # RL: Start Thinking (Async)
-        rl_service.update_status(call_sid, "THINKING")
-        rl_service.log_event(call_sid, "THINKING_START")
-        
-        background_tasks.add_task(handle_async_agent, user_id, user_text, call_sid, base_url)
+        future, coalesced = agent_flight.submit(
+            flight_key, _traced_turn, call_sid, turn, "stream" if STREAM_REPLIES else "async",
+            handle_async_agent, user_id, user_text, call_sid, base_url
+        )
+        if coalesced:
+            logger.info(f"Turn {turn} of {call_sid} already in flight, not starting another agent run")
+        else:
+            # RL: Start Thinking (Async)
+            rl_service.update_status(call_sid, "THINKING")
+            rl_service.log_event(call_sid, "THINKING_START")
+
+            # Keep the request lifecycle attached to the execution
+            background_tasks.add_task(_await_flight, future)
         
         # 2. Return Hold Music TwiML immediately
         resp = VoiceResponse()
@@ -474,8 +706,40 @@ async def process_speech(request: Request, background_tasks: BackgroundTasks):
         
         return Response(content=str(resp), media_type="application/xml")
 
+@app.post("/continue_reply")
+async def continue_reply(request: Request):
+    """
+    Pulled by Twilio after each streamed <Say> finishes.
+    Speaks the next queued sentences, or hands back to <Gather> once the reply is done.
+    """
+    form = await request.form()
+    call_sid = form.get("CallSid")
+    base_url = str(request.base_url)
+    gather_action_url = f"{base_url}gather_speech"
+    continue_url = f"{base_url}continue_reply"
+
+    stream = REPLY_STREAMS.get(call_sid)
+    if stream is None:
+        twiml = _build_reply_twiml([], gather_action_url)
+        return Response(content=str(twiml), media_type="application/xml")
+
+    sentences = await stream.next_batch(timeout=REPLY_WAIT_TIMEOUT)
+
+    if stream.exhausted:
+        REPLY_STREAMS.pop(call_sid, None)
+        twiml = _build_reply_twiml(sentences, gather_action_url)
+    else:
+        twiml = _build_reply_twiml(sentences, gather_action_url, continue_url)
+        if not sentences:
+            # Agent still working on the next sentence
+            twiml = VoiceResponse()
+            twiml.pause(length=1)
+            twiml.redirect(continue_url)
+
+    return Response(content=str(twiml), media_type="application/xml")
+
 @app.post("/status_callback")
-async def status_callback(request: Request, background_tasks: BackgroundTasks):
+async def status_callback(request: Request):
     """
     Receives Call Status updates from Twilio (completed, busy, failed).
     Used for RL Penalty calculation (Thinking Hangup).
@@ -487,11 +751,17 @@ async def status_callback(request: Request, background_tasks: BackgroundTasks):
     logger.info(f"Status Callback: {call_sid} -> {call_status}")
     
     if call_status == "completed":
+        REPLY_STREAMS.pop(call_sid, None)
+        # Drop the session, stashed input and turn counter held for this call
+        await session_manager.end_call(call_sid)
+
         # Check if user hung up during critical phase
         rl_service.process_hangup(call_sid, call_status)
         
-        # RL: Trigger Self-Reflection in Background
-        background_tasks.add_task(rl_service.analyze_and_learn, call_sid)
+        # RL: Queue Self-Reflection (batched and rate-limited off the serving path)
+        rl_service.enqueue_reflection(call_sid)
+        if reflection_worker is not None:
+            reflection_worker.notify()
         
     return Response(status_code=200)
 
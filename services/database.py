@@ -1,83 +1,987 @@
 import os
 import json
+import logging
 import redis
+import redis.asyncio as aioredis
+import threading
 import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
 from dotenv import load_dotenv
+from utils.circuit_breaker import CircuitBreaker
+from utils.context import get_turn_cache
+from services.network_cache import network_cache, NETWORK_UPDATES_CHANNEL
+from services.executor import run_blocking
 
 load_dotenv()
 
-class RedisDatabase:
+logger = logging.getLogger("Database")
+
+# Connection pool size shared by all tool calls in this process
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", 32))
+# Per-operation socket timeout: a dead Redis costs a turn at most this long, then the breaker trips.
+# Several round trips of headroom over a cloud Redis (~500ms RTT), so slow replies are not counted as outages.
+REDIS_SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", 2.5))
+# Connecting (TCP + TLS handshake) to a host that is down or unroutable fails after this long
+REDIS_CONNECT_TIMEOUT = float(os.environ.get("REDIS_CONNECT_TIMEOUT", 2.0))
+# Consecutive connection failures that open the circuit, and the first/longest wait before a probe
+REDIS_BREAKER_FAILURES = int(os.environ.get("REDIS_BREAKER_FAILURES", 3))
+REDIS_BREAKER_RESET = float(os.environ.get("REDIS_BREAKER_RESET", 1.0))
+REDIS_BREAKER_MAX_RESET = float(os.environ.get("REDIS_BREAKER_MAX_RESET", 30.0))
+# Last-known user records kept for reads during an outage, and how old they may get
+STALE_CACHE_SIZE = int(os.environ.get("STALE_CACHE_SIZE", 10000))
+STALE_CACHE_MAX_AGE = float(os.environ.get("STALE_CACHE_MAX_AGE", 3600))
+
+# Ticket ids are TICKET_ID_PREFIX + a zero-padded INCR counter, so they never collide
+TICKET_SEQUENCE_KEY = "tickets:seq"
+TICKET_ID_PREFIX = "TICKET-"
+# Tickets created per script call by create_tickets (bounds how long one call holds Redis)
+TICKET_BATCH_SIZE = int(os.environ.get("TICKET_BATCH_SIZE", 500))
+
+# Stream the human-agent desks consume (see services/escalation_queue.py)
+ESCALATION_STREAM = "escalations"
+# Resolved escalations kept in the stream; tickets themselves stay in TICKETS_KEY.
+# Trimmed by the desks as they resolve (services/escalation_queue.py), never past an
+# escalation a desk has not been given or has not resolved yet.
+ESCALATION_STREAM_MAXLEN = int(os.environ.get("ESCALATION_STREAM_MAXLEN", 100000))
+# Hash user_id -> open ticket id, for O(1) lookups and de-duplication
+OPEN_TICKETS_KEY = "tickets:open_by_user"
+# Hash ticket_id -> ticket JSON. One key, so scripts get it through KEYS like every other key they touch.
+TICKETS_KEY = "tickets"
+# Hash stream entry id -> ticket id, so an escalation trimmed from the stream can still be traced to its ticket
+TICKET_ENTRIES_KEY = "tickets:by_entry"
+TICKET_KEYS = [TICKET_SEQUENCE_KEY, ESCALATION_STREAM, OPEN_TICKETS_KEY, TICKETS_KEY, TICKET_ENTRIES_KEY]
+
+# Creates a batch of tickets in one atomic server-side step.
+# KEYS = TICKET_KEYS; ARGV = prefix, created_at, then user_id/reason pairs.
+# A caller who already has an open ticket gets that id back instead of a second ticket.
+# Returns the ticket ids in input order.
+CREATE_TICKETS_LUA = """
+local prefix = ARGV[1]
+local created_at = tonumber(ARGV[2])
+local ids = {}
+for i = 3, #ARGV, 2 do
+    local user_id = ARGV[i]
+    local reason = ARGV[i + 1]
+    local ticket_id = redis.call('HGET', KEYS[3], user_id)
+    if not ticket_id then
+        ticket_id = string.format('%s%06d', prefix, redis.call('INCR', KEYS[1]))
+        redis.call('HSET', KEYS[4], ticket_id, cjson.encode({
+            ticket_id = ticket_id, user_id = user_id, reason = reason,
+            status = 'OPEN', created_at = created_at
+        }))
+        redis.call('HSET', KEYS[3], user_id, ticket_id)
+        local entry_id = redis.call('XADD', KEYS[2], '*',
+            'ticket_id', ticket_id, 'user_id', user_id, 'reason', reason)
+        redis.call('HSET', KEYS[5], entry_id, ticket_id)
+    end
+    ids[#ids + 1] = ticket_id
+end
+return ids
+"""
+
+# Secondary index: region -> SET of user ids, maintained by upsert_user
+def region_users_key(region: str) -> str:
+    return f"region:{region}:users"
+
+def _region_set(region: str) -> str:
+    """The region's index key for a script's KEYS ('' when there is no region)."""
+    return region_users_key(region) if region else ""
+
+# Error a user script raises when the stored region is not the one the caller read
+# (the record changed in between); the caller reads it again and retries
+REGION_CHANGED = "REGION_CHANGED"
+REGION_RETRIES = 3
+
+# user:{id} is a hash, one field per attribute. Values are strings; these are read back as floats.
+USER_FLOAT_FIELDS = ("balance",)
+# Booleans are stored as "true"/"false", the way MIGRATE_USER_LUA writes them. Records
+# written before that used Python's "True"/"False"; both read back as bool.
+_BOOLEAN_VALUES = {"true": True, "false": False, "True": True, "False": False}
+
+def _encode_user(user: dict) -> list:
+    """Flat field/value list for HSET. Nested values and booleans are stored as JSON."""
+    flat = []
+    for field, value in user.items():
+        if value is None:
+            continue
+        flat.extend((field, json.dumps(value) if isinstance(value, (bool, dict, list)) else str(value)))
+    return flat
+
+def _decode_user(mapping: dict) -> dict:
+    user = {field: _BOOLEAN_VALUES.get(value, value) for field, value in mapping.items()}
+    for field in USER_FLOAT_FIELDS:
+        if field in user:
+            user[field] = float(user[field])
+    return user
+
+def _is_wrong_type(error: Exception) -> bool:
+    # Errors raised from a pipeline are prefixed with the failing command
+    return isinstance(error, redis.ResponseError) and "WRONGTYPE" in str(error)
+
+def _is_region_changed(error: Exception) -> bool:
+    return isinstance(error, redis.ResponseError) and REGION_CHANGED in str(error)
+
+def _json_region(data) -> str:
+    """Region of a user record still in the old JSON layout ('' if none or unreadable)."""
+    try:
+        user = json.loads(data) if data else None
+    except ValueError:
+        return ""
+    region = user.get("region") if isinstance(user, dict) else None
+    return region if isinstance(region, str) else ""
+
+# Replaces user:{id} and moves the user between region sets in one atomic step.
+# The caller reads the stored region first (hash or old JSON layout) so both set keys
+# can be passed in; if the record moved meanwhile the script changes nothing and fails
+# with REGION_CHANGED.
+# KEYS = user key, new region set ('' if none), stored region set ('' if none)
+# ARGV = user_id, new region ('' if none), stored region ('' if none), then field/value pairs
+UPSERT_USER_LUA = """
+local kind = redis.call('TYPE', KEYS[1]).ok
+local old
+if kind == 'hash' then
+    old = redis.call('HGET', KEYS[1], 'region')
+elseif kind == 'string' then
+    local ok, user = pcall(cjson.decode, redis.call('GET', KEYS[1]))
+    if ok and type(user) == 'table' then old = user.region end
+end
+if type(old) ~= 'string' then old = '' end
+if old ~= ARGV[3] then
+    return redis.error_reply('REGION_CHANGED')
+end
+if old ~= '' and old ~= ARGV[2] then
+    redis.call('SREM', KEYS[3], ARGV[1])
+end
+redis.call('DEL', KEYS[1])
+if #ARGV > 3 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 4))
+end
+if ARGV[2] ~= '' then
+    redis.call('SADD', KEYS[2], ARGV[1])
+end
+return 1
+"""
+
+# Converts a JSON user:{id} record to the hash layout in place, and (re)indexes its region.
+# As with UPSERT_USER_LUA the caller reads the stored region first and passes its set key;
+# a record that changed meanwhile fails with REGION_CHANGED, untouched.
+# KEYS = user key, stored region set ('' if none); ARGV = user_id, stored region ('' if none)
+# Returns 1 if converted, 0 if already a hash or missing, -1 if unreadable.
+MIGRATE_USER_LUA = """
+local kind = redis.call('TYPE', KEYS[1]).ok
+local region
+local user
+if kind == 'hash' then
+    region = redis.call('HGET', KEYS[1], 'region')
+elseif kind == 'string' then
+    local ok, decoded = pcall(cjson.decode, redis.call('GET', KEYS[1]))
+    if not ok or type(decoded) ~= 'table' then return -1 end
+    user = decoded
+    region = user.region
+end
+if type(region) ~= 'string' then region = '' end
+if region ~= ARGV[2] then
+    return redis.error_reply('REGION_CHANGED')
+end
+local converted = 0
+if user then
+    redis.call('DEL', KEYS[1])
+    for field, value in pairs(user) do
+        local t = type(value)
+        if t == 'table' then
+            redis.call('HSET', KEYS[1], field, cjson.encode(value))
+        elseif t == 'string' or t == 'number' or t == 'boolean' then
+            redis.call('HSET', KEYS[1], field, tostring(value))
+        end
+    end
+    converted = 1
+end
+if region ~= '' then
+    redis.call('SADD', KEYS[2], ARGV[1])
+end
+return converted
+"""
+
+# Sets network:{region} and publishes "<region>\t<status>\t<previous status>" on the updates
+# channel, so every worker's region cache and status listeners see the change, old -> new.
+# KEYS = network key; ARGV = region, status, channel. Returns the previous status (nil if none).
+SET_NETWORK_STATUS_LUA = """
+local old = redis.call('GET', KEYS[1])
+redis.call('SET', KEYS[1], ARGV[2])
+redis.call('PUBLISH', ARGV[3], ARGV[1] .. '\\t' .. ARGV[2] .. '\\t' .. (old or ''))
+return old
+"""
+
+# How long a payment's idempotency key is remembered (retries arrive within seconds to minutes)
+PAYMENT_IDEMPOTENCY_TTL = int(os.environ.get("PAYMENT_IDEMPOTENCY_TTL", 86400))
+
+# Append-only per-user payment ledger (a stream: entry ids carry the time)
+def ledger_key(user_id: str) -> str:
+    return f"ledger:{user_id}"
+
+# Applies a payment atomically: debits the balance with HINCRBYFLOAT (floored at 0),
+# appends it to the ledger and remembers the idempotency key. A repeated key returns
+# the original result without charging again.
+# KEYS = user key, ledger key, idempotency key ('' for none)
+# ARGV = amount, transaction id, idempotency TTL
+# Returns {transaction_id, balance, replayed}, or nil if the user does not exist.
+APPLY_PAYMENT_LUA = """
+if KEYS[3] ~= '' then
+    local prior = redis.call('GET', KEYS[3])
+    if prior then
+        local sep = string.find(prior, '|', 1, true)
+        return {string.sub(prior, 1, sep - 1), string.sub(prior, sep + 1), 1}
+    end
+end
+if redis.call('EXISTS', KEYS[1]) == 0 then return false end
+local balance = tonumber(redis.call('HINCRBYFLOAT', KEYS[1], 'balance', -tonumber(ARGV[1])))
+if balance < 0 then
+    redis.call('HSET', KEYS[1], 'balance', 0)
+    balance = 0
+end
+balance = tostring(balance)
+redis.call('XADD', KEYS[2], '*', 'type', 'payment', 'transaction_id', ARGV[2],
+    'amount', ARGV[1], 'balance', balance, 'idempotency_key', KEYS[3])
+if KEYS[3] ~= '' then
+    redis.call('SET', KEYS[3], ARGV[2] .. '|' .. balance, 'EX', ARGV[3])
+end
+return {ARGV[2], balance, 0}
+"""
+
+def _payment_keys(user_id: str, idempotency_key: str) -> list:
+    return [f"user:{user_id}", ledger_key(user_id), f"payment:{idempotency_key}" if idempotency_key else ""]
+
+def _payment_result(reply):
+    if reply is None:
+        return None
+    transaction_id, balance, replayed = reply
+    return {"transaction_id": transaction_id, "remaining_balance": float(balance), "replayed": bool(replayed)}
+
+
+def _ticket_batches(tickets: list):
+    """Yields script args for each TICKET_BATCH_SIZE chunk of (user_id, reason) pairs."""
+    created_at = repr(time.time())
+    for start in range(0, len(tickets), TICKET_BATCH_SIZE):
+        args = [TICKET_ID_PREFIX, created_at]
+        for user_id, reason in tickets[start:start + TICKET_BATCH_SIZE]:
+            args.extend((user_id, reason))
+        yield args
+
+# Sentinel so a cached "user not found" is distinguishable from a cache miss
+_MISSING = object()
+
+def _memo_get(key: str):
+    cache = get_turn_cache()
+    if cache is None:
+        return _MISSING
+    return cache.get(key, _MISSING)
+
+def _memo_set(key: str, value):
+    cache = get_turn_cache()
+    if cache is not None:
+        cache[key] = value
+
+def _memo_drop(key: str):
+    cache = get_turn_cache()
+    if cache is not None:
+        cache.pop(key, None)
+
+# Inside a turn the whole user record is fetched once and memoized; every later read in
+# the turn, whatever fields it asks for, is projected from it. Outside a turn nothing is
+# memoized, so a field read fetches just those fields.
+def _memo_get_user(key: str, fields):
+    user = _memo_get(key)
+    if user is _MISSING:
+        return _MISSING
+    return _pick(user, fields)
+
+def _memo_set_user(key: str, user):
+    _memo_set(key, user)
+
+def _fetch_fields(fields):
+    """Fields to read from the backend: the whole record inside a turn (see _memo_get_user)."""
+    return None if get_turn_cache() is not None else fields
+
+def _pick(user: dict, fields):
+    if user is None or fields is None:
+        return user
+    return {field: user[field] for field in fields if field in user}
+
+class Database(ABC):
+    """
+    Storage interface behind `db`: the blocking operations used by the agent tools,
+    seeding and ops scripts. RedisDatabase is the default backend; SQLiteDatabase
+    (services/sqlite_database.py) keeps everything in a local file for single-node
+    deployments and benchmarks. Choose with DB_BACKEND.
+    """
+
+    backend = ""
+
     def __init__(self):
+        # Called as fn(region, old_status, new_status) when set_network_status changes a region
+        self._status_listeners = []
+        # name -> expiry (monotonic), for claim()
+        self._claims = {}
+        self._claims_lock = threading.Lock()
+
+    # --- Users ---
+
+    @abstractmethod
+    def get_user(self, user_id: str, fields: list = None):
+        """The user record (or just `fields` of it), or None if there is no such user."""
+
+    @abstractmethod
+    def upsert_user(self, user_id: str, user: dict):
+        """Writes the whole user record and keeps the region -> users index in step."""
+
+    @abstractmethod
+    def users_in_region(self, region: str, page_size: int = 1000):
+        """Iterates a region's user ids, page_size at a time."""
+
+    @abstractmethod
+    def region_user_count(self, region: str) -> int:
+        """Number of users indexed under the region."""
+
+    def migrate_users(self, page_size: int = 500) -> dict:
+        """Upgrades records written in an older layout. Nothing to do unless the backend has one."""
+        return {}
+
+    # --- Payments ---
+
+    @abstractmethod
+    def apply_payment(self, user_id: str, amount: float, transaction_id: str, idempotency_key: str = None):
+        """Debits `amount` atomically and records it in the ledger; idempotent per key. None if no such user."""
+
+    @abstractmethod
+    def get_ledger(self, user_id: str, count: int = 20) -> list:
+        """The user's most recent ledger entries, newest first."""
+
+    # --- Network status ---
+
+    def add_status_listener(self, listener):
+        self._status_listeners.append(listener)
+
+    def _status_changed(self, region: str, old: str, new: str):
+        if old == new:
+            return
+        for listener in self._status_listeners:
+            try:
+                listener(region, old, new)
+            except Exception as e:
+                logger.warning(f"Network status listener failed: {e}")
+
+    def claim(self, name: str, ttl: float) -> bool:
+        """
+        True for the first caller to claim `name` until the claim expires after ttl
+        seconds, so work every worker hears about runs once. In-process here (one node);
+        RedisDatabase claims across workers.
+        """
+        now = time.monotonic()
+        with self._claims_lock:
+            if self._claims.get(name, 0) > now:
+                return False
+            self._claims[name] = now + ttl
+            return True
+
+    @abstractmethod
+    def set_network_status(self, region: str, status: str):
+        """Sets a region's status and notifies the status listeners if it changed."""
+
+    @abstractmethod
+    def get_network_status(self, region: str):
+        """The region's status, or "Unknown"."""
+
+    # --- Tickets ---
+
+    def create_ticket(self, user_id: str, reason: str):
+        """Creates a support ticket atomically. Returns its id, or None on failure."""
+        ids = self.create_tickets([(user_id, reason)])
+        return ids[0] if ids else None
+
+    @abstractmethod
+    def create_tickets(self, tickets: list) -> list:
+        """(user_id, reason) pairs in, ticket ids out. A caller with an open ticket gets that id back."""
+
+    @abstractmethod
+    def get_open_ticket(self, user_id: str):
+        """The caller's open ticket id, or None."""
+
+    def health(self) -> dict:
+        return {"backend": self.backend, "state": "closed"}
+
+class DatabaseUnavailable(Exception):
+    """The storage backend cannot be reached (or its circuit breaker is open)."""
+
+class StaleCache:
+    """
+    Bounded LRU of last-known values, served only when the backend cannot be
+    reached, so a Redis outage degrades to slightly old data instead of errors.
+    """
+
+    def __init__(self, max_entries: int, max_age: float):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        # key -> (value, stored_at)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.served = 0
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """The last-known value, or _MISSING if there is none or it is older than max_age."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[1] > self.max_age:
+                return _MISSING
+            self.served += 1
+            return entry[0]
+
+    def drop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+class RedisDatabase(Database):
+    """
+    Blocking Redis repository used by the (sync) agent tools.
+    Backed by a shared connection pool; user lookups are memoized per agent turn
+    so several tools in one turn cost a single round trip.
+
+    Every call goes through a circuit breaker: socket timeouts are short, and after
+    a few consecutive connection failures calls fail fast with DatabaseUnavailable
+    instead of each waiting on a dead socket. The pool reconnects on the next call
+    the breaker lets through (probes back off exponentially). While Redis is
+    unreachable, user and network status reads fall back to their last-known values.
+    """
+
+    backend = "redis"
+
+    def __init__(self, client: redis.Redis = None):
+        super().__init__()
+        self.breaker = CircuitBreaker(
+            REDIS_BREAKER_FAILURES, REDIS_BREAKER_RESET, REDIS_BREAKER_MAX_RESET
+        )
+        self.stale_users = StaleCache(STALE_CACHE_SIZE, STALE_CACHE_MAX_AGE)
         redis_url = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+        # An injected client (tests, tools sharing a connection) gets no background listener
+        owns_client = client is None
+        if owns_client:
+            self.pool = redis.ConnectionPool.from_url(
+                redis_url, decode_responses=True, max_connections=REDIS_MAX_CONNECTIONS,
+                socket_timeout=REDIS_SOCKET_TIMEOUT, socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+                health_check_interval=30,
+            )
+            client = redis.Redis(connection_pool=self.pool)
+        self.client = client
+        # Scripts are loaded by SHA on first use, so this works before Redis is up
+        self._create_tickets = self.client.register_script(CREATE_TICKETS_LUA)
+        self._upsert_user = self.client.register_script(UPSERT_USER_LUA)
+        self._migrate_user = self.client.register_script(MIGRATE_USER_LUA)
+        self._apply_payment = self.client.register_script(APPLY_PAYMENT_LUA)
+        self._set_network_status = self.client.register_script(SET_NETWORK_STATUS_LUA)
+        try:
+            self._call(self.client.ping) # Check connection
+            # Host part only: the URL may carry credentials
+            logger.info(f"Connected to Redis at {redis_url.rsplit('@', 1)[-1]}")
+        except DatabaseUnavailable as e:
+            # Not fatal: the breaker keeps probing and calls reconnect once Redis is back
+            logger.warning(f"Failed to connect to Redis: {e}")
+        if owns_client:
+            # Keep the region status cache fresh from network:* change notifications
+            network_cache.start(self.client)
+
+    def _call(self, fn, *args, **kwargs):
+        """Runs one Redis operation through the circuit breaker."""
+        if not self.breaker.allow():
+            raise DatabaseUnavailable(f"Redis unavailable (circuit open, retry in {self.breaker.retry_in():.1f}s)")
+        try:
+            result = fn(*args, **kwargs)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            self.breaker.record_failure(e)
+            raise DatabaseUnavailable(f"Redis unavailable: {e}") from e
+        except redis.RedisError:
+            # The server answered (e.g. WRONGTYPE): the connection itself is fine
+            self.breaker.record_success()
+            raise
+        except BaseException:
+            # Not a Redis outcome (a bug, cancellation): no verdict on the connection either way
+            self.breaker.abandon()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def health(self) -> dict:
+        return dict(self.breaker.stats(), backend=self.backend, stale_users=len(self.stale_users),
+                    stale_reads=self.stale_users.served)
+
+    def get_user(self, user_id: str, fields: list = None):
+        """
+        The user record, or just `fields` of it when the caller needs only those. Outside
+        a turn that is an HMGET of the fields; inside one the whole hash is read once and
+        later reads in the turn are answered from it. Returns None if the user does not
+        exist. If Redis is unreachable the last-known record is returned; without one,
+        DatabaseUnavailable is raised.
+        """
+        key = f"user:{user_id}"
+        cached = _memo_get_user(key, fields)
+        if cached is not _MISSING:
+            return cached
+
+        fetch = _fetch_fields(fields)
         try:
-            self.client = redis.from_url(redis_url, decode_responses=True)
-            self.client.ping() # Check connection
-            print(f"Connected to Redis at {redis_url}")
-        except redis.ConnectionError as e:
-            print(f"Failed to connect to Redis: {e}")
-            self.client = None
-
-    def get_user(self, user_id: str):
-        if not self.client: return None
-        data = self.client.get(f"user:{user_id}")
-        return json.loads(data) if data else None
-
-    def update_balance(self, user_id: str, amount_paid: float):
-        """Atomically updates user balance."""
-        if not self.client: return None
-        
+            user = self._call(self._load_user, user_id, key, fetch)
+        except DatabaseUnavailable:
+            stale = self.stale_users.get(user_id)
+            if stale is _MISSING:
+                raise
+            return _pick(stale, fields)
+        self._remember_user(user_id, fetch, user)
+        if fetch is None:
+            _memo_set_user(key, user)
+        return _pick(user, fields)
+
+    def _load_user(self, user_id: str, key: str, fields):
+        try:
+            return self._read_user(key, fields)
+        except redis.ResponseError as e:
+            if not _is_wrong_type(e):
+                raise
+            # Still in the old JSON layout: convert it and read again
+            self._migrate_one(user_id, key)
+            return self._read_user(key, fields)
+
+    def _read_user(self, key: str, fields):
+        if fields is None:
+            data = self.client.hgetall(key)
+            return _decode_user(data) if data else None
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.exists(key)
+            pipe.hmget(key, fields)
+            exists, values = pipe.execute()
+        if not exists:
+            return None
+        return _decode_user({field: value for field, value in zip(fields, values) if value is not None})
+
+    def _remember_user(self, user_id: str, fields, user):
+        if user is not None and fields is not None:
+            known = self.stale_users.get(user_id)
+            if isinstance(known, dict):
+                user = dict(known, **user)
+        self.stale_users.put(user_id, user)
+
+    def apply_payment(self, user_id: str, amount: float, transaction_id: str, idempotency_key: str = None):
+        """
+        Debits `amount` in one atomic script call and records it in the user's ledger.
+        With an idempotency key, a retry of the same payment returns the first result
+        (replayed=True) instead of charging twice. Returns None if there is no such user.
+        """
+        key = f"user:{user_id}"
+        # The memoized copy is stale once the balance moves
+        _memo_drop(key)
+        keys = _payment_keys(user_id, idempotency_key)
+        args = [amount, transaction_id, PAYMENT_IDEMPOTENCY_TTL]
+
+        def pay():
+            try:
+                return self._apply_payment(keys=keys, args=args)
+            except redis.ResponseError as e:
+                if not _is_wrong_type(e):
+                    raise
+                self._migrate_one(user_id, key)
+                return self._apply_payment(keys=keys, args=args)
+
+        payment = _payment_result(self._call(pay))
+        self._remember_payment(user_id, payment)
+        return payment
+
+    def _remember_payment(self, user_id: str, payment):
+        if payment is not None:
+            known = self.stale_users.get(user_id)
+            if isinstance(known, dict):
+                self.stale_users.put(user_id, dict(known, balance=payment["remaining_balance"]))
+
+    def get_ledger(self, user_id: str, count: int = 20) -> list:
+        """Most recent ledger entries first."""
+        entries = self._call(self.client.xrevrange, ledger_key(user_id), count=count)
+        return [dict(fields, entry_id=entry_id) for entry_id, fields in entries]
+
+    def upsert_user(self, user_id: str, user: dict):
+        """Writes the user record and keeps the region -> users index in step."""
         key = f"user:{user_id}"
-        
-        with self.client.pipeline() as pipe:
-            while True:
-                try:
-                    pipe.watch(key)
-                    data = pipe.get(key)
-                    if not data:
-                        return None
-                    
-                    user = json.loads(data)
-                    current_balance = float(user.get("balance", 0))
-                    new_balance = max(0, current_balance - amount_paid)
-                    user["balance"] = new_balance
-                    
-                    pipe.multi()
-                    pipe.set(key, json.dumps(user))
-                    pipe.execute()
-                    return new_balance
-                except redis.WatchError:
-                    continue # Retry on conflict
+        _memo_drop(key)
+        region = user.get("region") or ""
+        fields = _encode_user(user)
+
+        def write(stored: str):
+            return self._upsert_user(
+                keys=[key, _region_set(region), _region_set(stored)], args=[user_id, region, stored] + fields
+            )
+
+        self._call(self._with_stored_region, key, write)
+        self.stale_users.put(user_id, dict(user))
+        return True
+
+    def _stored_region(self, key: str) -> str:
+        """Region of the record at key, in either layout ('' if none)."""
+        try:
+            return self.client.hget(key, "region") or ""
+        except redis.ResponseError as e:
+            if not _is_wrong_type(e):
+                raise
+            return _json_region(self.client.get(key))
+
+    def _migrate_one(self, user_id: str, key: str):
+        return self._with_stored_region(
+            key, lambda stored: self._migrate_user(keys=[key, _region_set(stored)], args=[user_id, stored])
+        )
+
+    def _with_stored_region(self, key: str, run):
+        """
+        Calls run(stored_region) for a script that needs the record's current region set
+        in its KEYS; reads the region again if the record changed before the script ran.
+        """
+        for attempt in range(REGION_RETRIES):
+            try:
+                return run(self._stored_region(key))
+            except redis.ResponseError as e:
+                if not _is_region_changed(e) or attempt + 1 == REGION_RETRIES:
+                    raise
+
+    def users_in_region(self, region: str, page_size: int = 1000):
+        """Iterates a region's user ids page by page (SSCAN), never loading the whole set."""
+        key = region_users_key(region)
+        cursor = 0
+        while True:
+            cursor, members = self._call(self.client.sscan, key, cursor, count=page_size)
+            yield from members
+            if cursor == 0:
+                return
+
+    def region_user_count(self, region: str) -> int:
+        return self._call(self.client.scard, region_users_key(region))
+
+    def migrate_users(self, page_size: int = 500) -> dict:
+        """
+        Converts every JSON user:{id} record to the hash layout and rebuilds the region
+        index, one pipelined page of script calls per SCAN page. Safe to re-run.
+        Raises DatabaseUnavailable if Redis cannot be reached.
+        """
+        return self._call(self._migrate_all, page_size)
+
+    def _migrate_all(self, page_size: int) -> dict:
+        counts = {"converted": 0, "already_hash": 0, "unreadable": 0}
+        outcome = {1: "converted", 0: "already_hash", -1: "unreadable"}
+        keys = []
+
+        def flush():
+            regions = self._stored_regions(keys)
+            with self.client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    self._migrate_user(
+                        keys=[key, _region_set(regions[key])], args=[key.split(":", 1)[1], regions[key]], client=pipe
+                    )
+                results = pipe.execute(raise_on_error=False)
+            for key, result in zip(keys, results):
+                if _is_region_changed(result):
+                    # Written while this page was in flight: redo it on its own
+                    result = self._migrate_one(key.split(":", 1)[1], key)
+                elif isinstance(result, Exception):
+                    raise result
+                counts[outcome[result]] += 1
+            keys.clear()
+
+        for key in self.client.scan_iter(match="user:*", count=page_size):
+            keys.append(key)
+            if len(keys) >= page_size:
+                flush()
+        if keys:
+            flush()
+        return counts
+
+    def _stored_regions(self, keys: list) -> dict:
+        """_stored_region for a page of keys: one pipelined HGET, plus one GET round for JSON records."""
+        with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.hget(key, "region")
+            replies = pipe.execute(raise_on_error=False)
+        regions = {}
+        legacy = []
+        for key, reply in zip(keys, replies):
+            if _is_wrong_type(reply):
+                legacy.append(key)
+            elif isinstance(reply, Exception):
+                raise reply
+            else:
+                regions[key] = reply or ""
+        if legacy:
+            with self.client.pipeline(transaction=False) as pipe:
+                for key in legacy:
+                    pipe.get(key)
+                for key, data in zip(legacy, pipe.execute()):
+                    regions[key] = _json_region(data)
+        return regions
 
     def set_network_status(self, region: str, status: str):
-        if not self.client: return None
-        self.client.set(f"network:{region}", status)
+        # Write and notify every worker's region cache in one round trip
+        old = self._call(
+            self._set_network_status, keys=[f"network:{region}"], args=[region, status, NETWORK_UPDATES_CHANNEL]
+        )
+        network_cache.put(region, status)
+        self._status_changed(region, old, status)
+
+    def claim(self, name: str, ttl: float) -> bool:
+        return bool(self._call(self.client.set, f"claim:{name}", 1, nx=True, px=int(ttl * 1000)))
 
     def get_network_status(self, region: str):
-        if not self.client: return "Unknown"
-        return self.client.get(f"network:{region}") or "Unknown"
-
-    def create_ticket(self, user_id: str, reason: str, ticket_id: str):
-        """Creates a support ticket in Redis."""
-        if not self.client: return False
-        
-        ticket_data = {
-            "ticket_id": ticket_id,
-            "user_id": user_id,
-            "reason": reason,
-            "status": "OPEN",
-            "created_at": time.time()
-        }
-        
-        # Store ticket details
-        self.client.set(f"ticket:{ticket_id}", json.dumps(ticket_data))
-        
-        # Add to global list of open tickets
-        self.client.rpush("tickets:open", ticket_id)
-        
-        # Add to user's ticket list
-        self.client.rpush(f"tickets:user:{user_id}", ticket_id)
-        
-        return True
+        # Served from the in-process cache; Redis is only read on a miss
+        try:
+            return network_cache.get(region, self._fetch_network_status)
+        except DatabaseUnavailable:
+            return network_cache.last_known(region) or "Unknown"
+
+    def _fetch_network_status(self, region: str):
+        return self._call(self.client.get, f"network:{region}") or "Unknown"
+
+    def create_tickets(self, tickets: list) -> list:
+        """
+        Bulk ticket creation for escalation bursts: (user_id, reason) pairs in,
+        ticket ids out. Each TICKET_BATCH_SIZE chunk is a single script call.
+        New tickets are queued on ESCALATION_STREAM for the human-agent desks.
+        """
+        ids = []
+        for args in _ticket_batches(tickets):
+            ids.extend(self._call(self._create_tickets, keys=TICKET_KEYS, args=args))
+        return ids
+
+    def get_open_ticket(self, user_id: str):
+        """The caller's open ticket id, or None."""
+        return self._call(self.client.hget, OPEN_TICKETS_KEY, user_id)
+
+class AsyncRedisDatabase:
+    """
+    Non-blocking counterpart of RedisDatabase for the agent tools, which run on the
+    event loop: redis.asyncio over one shared connection pool (same size and timeouts).
+    It shares the blocking backend's circuit breaker and last-known user records, so
+    both see a single Redis health state, and reads use the same per-turn user memo
+    and region status cache. Writes outside the tool path stay on `db`.
+    The pool is created on first use, so importing this module never touches the network.
+    """
+
+    backend = "redis"
+
+    def __init__(self, database: RedisDatabase, client: aioredis.Redis = None):
+        self.database = database
+        self.breaker = database.breaker
+        self.stale_users = database.stale_users
+        self.redis_url = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+        self._client = client
+        # Lua scripts, registered on first use
+        self._scripts = {}
+
+    @property
+    def client(self) -> aioredis.Redis:
+        if self._client is None:
+            pool = aioredis.ConnectionPool.from_url(
+                self.redis_url, decode_responses=True, max_connections=REDIS_MAX_CONNECTIONS,
+                socket_timeout=REDIS_SOCKET_TIMEOUT, socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+                health_check_interval=30,
+            )
+            self._client = aioredis.Redis(connection_pool=pool)
+        return self._client
+
+    def _script(self, name: str, source: str):
+        script = self._scripts.get(name)
+        if script is None:
+            script = self._scripts[name] = self.client.register_script(source)
+        return script
+
+    async def _call(self, fn, *args, **kwargs):
+        """Awaits one Redis operation through the shared circuit breaker (see RedisDatabase._call)."""
+        if not self.breaker.allow():
+            raise DatabaseUnavailable(f"Redis unavailable (circuit open, retry in {self.breaker.retry_in():.1f}s)")
+        try:
+            result = await fn(*args, **kwargs)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            self.breaker.record_failure(e)
+            raise DatabaseUnavailable(f"Redis unavailable: {e}") from e
+        except redis.RedisError:
+            self.breaker.record_success()
+            raise
+        except BaseException:
+            self.breaker.abandon()
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def get_user(self, user_id: str, fields: list = None):
+        """See RedisDatabase.get_user."""
+        key = f"user:{user_id}"
+        cached = _memo_get_user(key, fields)
+        if cached is not _MISSING:
+            return cached
+
+        fetch = _fetch_fields(fields)
+        try:
+            user = await self._call(self._load_user, user_id, key, fetch)
+        except DatabaseUnavailable:
+            stale = self.stale_users.get(user_id)
+            if stale is _MISSING:
+                raise
+            return _pick(stale, fields)
+        self.database._remember_user(user_id, fetch, user)
+        if fetch is None:
+            _memo_set_user(key, user)
+        return _pick(user, fields)
+
+    async def _load_user(self, user_id: str, key: str, fields):
+        try:
+            return await self._read_user(key, fields)
+        except redis.ResponseError as e:
+            if not _is_wrong_type(e):
+                raise
+            await self._migrate_one(user_id, key)
+            return await self._read_user(key, fields)
+
+    async def _read_user(self, key: str, fields):
+        if fields is None:
+            data = await self.client.hgetall(key)
+            return _decode_user(data) if data else None
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.exists(key)
+            pipe.hmget(key, fields)
+            exists, values = await pipe.execute()
+        if not exists:
+            return None
+        return _decode_user({field: value for field, value in zip(fields, values) if value is not None})
+
+    async def _stored_region(self, key: str) -> str:
+        try:
+            return await self.client.hget(key, "region") or ""
+        except redis.ResponseError as e:
+            if not _is_wrong_type(e):
+                raise
+            return _json_region(await self.client.get(key))
+
+    async def _migrate_one(self, user_id: str, key: str):
+        migrate = self._script("_migrate_user", MIGRATE_USER_LUA)
+        for attempt in range(REGION_RETRIES):
+            stored = await self._stored_region(key)
+            try:
+                return await migrate(keys=[key, _region_set(stored)], args=[user_id, stored])
+            except redis.ResponseError as e:
+                if not _is_region_changed(e) or attempt + 1 == REGION_RETRIES:
+                    raise
+
+    async def apply_payment(self, user_id: str, amount: float, transaction_id: str, idempotency_key: str = None):
+        """See RedisDatabase.apply_payment."""
+        key = f"user:{user_id}"
+        _memo_drop(key)
+        keys = _payment_keys(user_id, idempotency_key)
+        args = [amount, transaction_id, PAYMENT_IDEMPOTENCY_TTL]
+
+        async def pay():
+            script = self._script("_apply_payment", APPLY_PAYMENT_LUA)
+            try:
+                return await script(keys=keys, args=args)
+            except redis.ResponseError as e:
+                if not _is_wrong_type(e):
+                    raise
+                await self._migrate_one(user_id, key)
+                return await script(keys=keys, args=args)
+
+        payment = _payment_result(await self._call(pay))
+        self.database._remember_payment(user_id, payment)
+        return payment
+
+    async def get_network_status(self, region: str):
+        status = network_cache.peek(region)
+        if status is not None:
+            return status
+        try:
+            status = await self._call(self.client.get, f"network:{region}") or "Unknown"
+        except DatabaseUnavailable:
+            return network_cache.last_known(region) or "Unknown"
+        network_cache.put(region, status)
+        return status
+
+    async def create_ticket(self, user_id: str, reason: str):
+        """Creates a support ticket in one atomic round trip. Returns its id."""
+        ids = await self.create_tickets([(user_id, reason)])
+        return ids[0] if ids else None
+
+    async def create_tickets(self, tickets: list) -> list:
+        create = self._script("_create_tickets", CREATE_TICKETS_LUA)
+        ids = []
+        for args in _ticket_batches(tickets):
+            ids.extend(await self._call(create, keys=TICKET_KEYS, args=args))
+        return ids
+
+    async def get_open_ticket(self, user_id: str):
+        return await self._call(self.client.hget, OPEN_TICKETS_KEY, user_id)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._scripts = {}
+
+class OffloadedDatabase:
+    """
+    The async tool-facing interface over a blocking backend (SQLite): each call
+    runs on the bounded executor, so the event loop never waits on the file.
+    """
+
+    def __init__(self, database: Database):
+        self.database = database
+        self.backend = database.backend
+
+    async def get_user(self, user_id: str, fields: list = None):
+        return await run_blocking(self.database.get_user, user_id, fields)
+
+    async def apply_payment(self, user_id: str, amount: float, transaction_id: str, idempotency_key: str = None):
+        return await run_blocking(self.database.apply_payment, user_id, amount, transaction_id, idempotency_key)
+
+    async def get_network_status(self, region: str):
+        return await run_blocking(self.database.get_network_status, region)
+
+    async def create_ticket(self, user_id: str, reason: str):
+        return await run_blocking(self.database.create_ticket, user_id, reason)
+
+    async def create_tickets(self, tickets: list) -> list:
+        return await run_blocking(self.database.create_tickets, tickets)
+
+    async def get_open_ticket(self, user_id: str):
+        return await run_blocking(self.database.get_open_ticket, user_id)
+
+    async def close(self):
+        pass
+
+# Storage behind `db`: "redis" (default) or "sqlite" (embedded, single node)
+DB_BACKEND = os.environ.get("DB_BACKEND", "redis").lower()
+
+def create_database(backend: str = DB_BACKEND) -> Database:
+    if backend == "sqlite":
+        from services.sqlite_database import SQLiteDatabase
+        return SQLiteDatabase()
+    if backend != "redis":
+        raise ValueError(f"Unknown DB_BACKEND: {backend!r} (expected 'redis' or 'sqlite')")
+    return RedisDatabase()
+
+def create_async_database(database: Database):
+    """The non-blocking interface the agent tools use, over the same backend as `database`."""
+    if isinstance(database, RedisDatabase):
+        return AsyncRedisDatabase(database)
+    return OffloadedDatabase(database)
 
-# Global DB Instance
-db = RedisDatabase()
+# Global DB Instances: `db` for scripts and background work, `adb` for code on the event loop
+db = create_database()
+adb = create_async_database(db)
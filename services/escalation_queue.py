@@ -0,0 +1,192 @@
+import logging
+import os
+import time
+
+import redis
+
+from services.database import (
+    ESCALATION_STREAM, ESCALATION_STREAM_MAXLEN, OPEN_TICKETS_KEY, TICKETS_KEY, TICKET_ENTRIES_KEY,
+)
+
+logger = logging.getLogger("EscalationQueue")
+
+# Consumer group shared by the Tier_2 human-agent desks
+ESCALATION_GROUP = os.environ.get("ESCALATION_GROUP", "tier2")
+# A desk that holds an escalation this long without resolving it loses it to the next desk
+ESCALATION_CLAIM_IDLE_MS = int(os.environ.get("ESCALATION_CLAIM_IDLE_MS", 120000))
+
+# Status given to tickets whose escalation was trimmed from the stream before a desk resolved it
+TRIMMED_STATUS = "EXPIRED"
+
+# Acknowledges the stream entry, closes the ticket and clears the caller's open-ticket slot,
+# then trims resolved history beyond maxlen. The group hands out entries in id order, so
+# every entry up to this one has been delivered; the trim stops there, and at the oldest
+# entry a desk still holds, so an escalation is never dropped before a desk resolves it.
+# KEYS = stream, open-tickets hash, tickets hash, entry -> ticket hash
+# ARGV = group, entry_id, ticket_id, user_id, status, resolved_at, maxlen
+RESOLVE_TICKET_LUA = """
+local function before(a, b)
+    local a_ms, a_seq = string.match(a, '(%d+)-(%d+)')
+    local b_ms, b_seq = string.match(b, '(%d+)-(%d+)')
+    a_ms, a_seq, b_ms, b_seq = tonumber(a_ms), tonumber(a_seq), tonumber(b_ms), tonumber(b_seq)
+    return a_ms < b_ms or (a_ms == b_ms and a_seq < b_seq)
+end
+
+redis.call('XACK', KEYS[1], ARGV[1], ARGV[2])
+redis.call('HDEL', KEYS[4], ARGV[2])
+if redis.call('HGET', KEYS[2], ARGV[4]) == ARGV[3] then
+    redis.call('HDEL', KEYS[2], ARGV[4])
+end
+local data = redis.call('HGET', KEYS[3], ARGV[3])
+if data then
+    local ticket = cjson.decode(data)
+    ticket.status = ARGV[5]
+    ticket.resolved_at = tonumber(ARGV[6])
+    redis.call('HSET', KEYS[3], ARGV[3], cjson.encode(ticket))
+end
+
+local excess = redis.call('XLEN', KEYS[1]) - tonumber(ARGV[7])
+if excess > 0 then
+    local head = redis.call('XRANGE', KEYS[1], '-', '+', 'COUNT', excess + 1)
+    local keep_from = head[#head][1]
+    if before(ARGV[2], keep_from) then keep_from = ARGV[2] end
+    local pending = redis.call('XPENDING', KEYS[1], ARGV[1])
+    if pending[1] > 0 and before(pending[2], keep_from) then keep_from = pending[2] end
+    redis.call('XTRIM', KEYS[1], 'MINID', keep_from)
+end
+return 1
+"""
+
+# Closes the tickets of pending escalations that were deleted from the stream anyway (an
+# XTRIM/XDEL by hand, or a length cap from before trimming moved to resolve; XAUTOCLAIM
+# reports them as deleted), so their callers' open-ticket slots do not point at tickets
+# no desk will ever see. The caller's slot is cleared only if it still holds that ticket.
+# KEYS = stream, open-tickets hash, tickets hash, entry -> ticket hash
+# ARGV = group, status, resolved_at, then the deleted entry ids. Returns the number of tickets closed.
+DROP_TRIMMED_LUA = """
+local closed = 0
+for i = 4, #ARGV do
+    redis.call('XACK', KEYS[1], ARGV[1], ARGV[i])
+    local ticket_id = redis.call('HGET', KEYS[4], ARGV[i])
+    if ticket_id then
+        redis.call('HDEL', KEYS[4], ARGV[i])
+        local data = redis.call('HGET', KEYS[3], ticket_id)
+        if data then
+            local ticket = cjson.decode(data)
+            if ticket.user_id and redis.call('HGET', KEYS[2], ticket.user_id) == ticket_id then
+                redis.call('HDEL', KEYS[2], ticket.user_id)
+            end
+            if ticket.status == 'OPEN' then
+                ticket.status = ARGV[2]
+                ticket.resolved_at = tonumber(ARGV[3])
+                redis.call('HSET', KEYS[3], ticket_id, cjson.encode(ticket))
+                closed = closed + 1
+            end
+        end
+    end
+end
+return closed
+"""
+
+def _entries(messages) -> list:
+    """Stream messages -> escalation dicts, skipping entries already trimmed from the stream."""
+    escalations = []
+    for entry_id, fields in messages or []:
+        if not fields:
+            continue
+        escalations.append({
+            "entry_id": entry_id,
+            "ticket_id": fields.get("ticket_id"),
+            "user_id": fields.get("user_id"),
+            "reason": fields.get("reason"),
+        })
+    return escalations
+
+class EscalationQueue:
+    """
+    Desk side of the escalation stream written by RedisDatabase.create_tickets.
+
+    Each human-agent desk is a consumer in one consumer group, so every escalation
+    is delivered to exactly one desk. An escalation stays pending until the desk
+    resolves it; one left idle past claim_idle_ms (desk crashed or walked away) is
+    reclaimed by the next desk asking for work. Resolving trims the stream's resolved
+    history to maxlen.
+
+    Desks run `python escalation_desk.py <desk-name>` (see that script).
+    """
+
+    def __init__(self, client, group: str = ESCALATION_GROUP, stream: str = ESCALATION_STREAM,
+                 claim_idle_ms: int = ESCALATION_CLAIM_IDLE_MS, maxlen: int = ESCALATION_STREAM_MAXLEN):
+        self.client = client
+        self.group = group
+        self.stream = stream
+        self.claim_idle_ms = claim_idle_ms
+        self.maxlen = maxlen
+        self._resolve = client.register_script(RESOLVE_TICKET_LUA)
+        self._drop_trimmed = client.register_script(DROP_TRIMMED_LUA)
+        # XAUTOCLAIM cursor, so repeated reclaims walk the whole pending list
+        self._reclaim_cursor = "0-0"
+
+    def ensure_group(self):
+        """Creates the consumer group (and the stream) if missing."""
+        try:
+            self.client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def read(self, consumer: str, count: int = 1, block_ms: int = None) -> list:
+        """New escalations for this desk (up to count), waiting up to block_ms for one."""
+        response = self.client.xreadgroup(self.group, consumer, {self.stream: ">"}, count=count, block=block_ms)
+        escalations = []
+        for _stream, messages in response or []:
+            escalations.extend(_entries(messages))
+        return escalations
+
+    def _ticket_keys(self) -> list:
+        return [self.stream, OPEN_TICKETS_KEY, TICKETS_KEY, TICKET_ENTRIES_KEY]
+
+    def reclaim(self, consumer: str, count: int = 10) -> list:
+        """
+        Takes over escalations other desks have held longer than claim_idle_ms.
+        Pending entries already trimmed from the stream have their tickets closed.
+        """
+        cursor, messages, *rest = self.client.xautoclaim(
+            self.stream, self.group, consumer, self.claim_idle_ms, start_id=self._reclaim_cursor, count=count
+        )
+        self._reclaim_cursor = cursor
+        deleted = rest[0] if rest else []
+        if deleted:
+            closed = self._drop_trimmed(
+                keys=self._ticket_keys(), args=[self.group, TRIMMED_STATUS, repr(time.time())] + list(deleted)
+            )
+            logger.warning(f"{len(deleted)} pending escalations were trimmed from the stream; closed {closed} tickets")
+        escalations = _entries(messages)
+        if escalations:
+            logger.info(f"{consumer} reclaimed {len(escalations)} stalled escalations")
+        return escalations
+
+    def next(self, consumer: str, block_ms: int = None):
+        """The next escalation for this desk: a stalled one first, else a new one. None if idle."""
+        escalations = self.reclaim(consumer, count=1) or self.read(consumer, count=1, block_ms=block_ms)
+        return escalations[0] if escalations else None
+
+    def resolve(self, escalation: dict, status: str = "RESOLVED"):
+        """Acknowledges the escalation, closes its ticket and trims resolved history."""
+        self._resolve(
+            keys=self._ticket_keys(),
+            args=[self.group, escalation["entry_id"], escalation["ticket_id"], escalation["user_id"],
+                  status, repr(time.time()), self.maxlen],
+        )
+
+    def stats(self) -> dict:
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.xlen(self.stream)
+            pipe.xpending(self.stream, self.group)
+            pipe.hlen(OPEN_TICKETS_KEY)
+            length, pending, open_tickets = pipe.execute()
+        return {
+            "length": length,
+            "pending": pending.get("pending", 0) if pending else 0,
+            "open_tickets": open_tickets,
+        }
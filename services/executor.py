@@ -0,0 +1,42 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from services.metrics import span
+
+logger = logging.getLogger("Executor")
+
+# Bounded pool for blocking work (SQLite, Redis, Twilio REST) that must not run on the event loop.
+BLOCKING_POOL_SIZE = int(os.environ.get("BLOCKING_POOL_SIZE", 16))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking")
+
+async def run_blocking(fn, *args, **kwargs):
+    """
+    Runs a sync callable on the bounded pool and awaits the result.
+    The caller's contextvars are carried over so per-request context still works.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(ctx.run, fn, *args, **kwargs))
+
+def offload(fn):
+    """
+    Wraps a sync tool function as a coroutine that runs on the bounded pool.
+    functools.wraps keeps the name, docstring and signature ADK uses for the declaration.
+    Each call is timed as a "tool.<name>" span (pool wait included).
+    """
+    stage = f"tool.{fn.__name__}"
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with span(stage):
+            return await run_blocking(fn, *args, **kwargs)
+    return wrapper
+
+def shutdown():
+    """Waits for in-flight blocking work to finish."""
+    _executor.shutdown(wait=True)
@@ -0,0 +1,159 @@
+import json
+import logging
+import os
+from collections import deque
+
+from google.adk.events.event import Event
+from google.genai.types import Content, Part
+
+logger = logging.getLogger("HistoryCompactor")
+
+# Token budget for the stored history sent with every LLM call of a turn
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", 2000))
+# Once over budget, compact down to this fraction of it so the next turns don't compact again
+HISTORY_TARGET_RATIO = float(os.environ.get("HISTORY_TARGET_RATIO", 0.6))
+# Upper bound for the running summary of folded turns
+HISTORY_SUMMARY_TOKENS = int(os.environ.get("HISTORY_SUMMARY_TOKENS", 300))
+
+SUMMARY_HEADER = "Summary of earlier in this call:"
+# Characters kept per summarized message or tool result
+_SNIPPET_CHARS = 160
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token on English text and JSON
+    return max(1, len(text) // 4)
+
+def estimate_event_tokens(event: Event) -> int:
+    if event.content is None:
+        return 1
+    return estimate_tokens(event.content.model_dump_json(exclude_none=True))
+
+def _snippet(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= _SNIPPET_CHARS else text[:_SNIPPET_CHARS - 3] + "..."
+
+def is_summary_event(event: Event) -> bool:
+    return bool(event.custom_metadata and event.custom_metadata.get("history_summary"))
+
+def _is_user_message(event: Event) -> bool:
+    """A caller utterance (turn boundary), as opposed to a tool response or the summary."""
+    if event.author != "user" or event.content is None or is_summary_event(event):
+        return False
+    parts = event.content.parts or []
+    return any(part.text for part in parts) and not any(part.function_response for part in parts)
+
+class HistoryState:
+    """Per-session bookkeeping: cached token counts and the running summary."""
+
+    __slots__ = ("tokens", "total", "counted", "summary_lines", "summary_tokens", "compactions")
+
+    def __init__(self):
+        # event id -> estimated tokens, so each event is measured once
+        self.tokens = {}
+        self.total = 0
+        # events[:counted] are already in `tokens`/`total`
+        self.counted = 0
+        self.summary_lines = deque()
+        self.summary_tokens = 0
+        self.compactions = 0
+
+class HistoryCompactor:
+    """
+    Keeps a session's event history under a token budget.
+
+    Token counts are cached per event id and new events are counted incrementally,
+    so the budget check is O(new events) per turn. Over budget, the oldest whole
+    turns are cut (always at a caller utterance, so a function call is never
+    separated from its response) and folded into a running extractive summary,
+    carried as a single user event at the head of the history.
+    """
+
+    def __init__(self, budget: int = HISTORY_TOKEN_BUDGET, target_ratio: float = HISTORY_TARGET_RATIO,
+                 summary_tokens: int = HISTORY_SUMMARY_TOKENS):
+        self.budget = budget
+        self.target = int(budget * target_ratio)
+        self.summary_budget = summary_tokens
+
+    def _count(self, events: list, state: HistoryState):
+        if len(events) < state.counted:
+            # Edited outside the compactor: recount
+            state.tokens.clear()
+            state.total = 0
+            state.counted = 0
+        for event in events[state.counted:]:
+            tokens = estimate_event_tokens(event)
+            state.tokens[event.id] = tokens
+            state.total += tokens
+        state.counted = len(events)
+
+    def compact(self, session, state: HistoryState) -> bool:
+        """Compacts session.events in place if over budget. Returns True if it did."""
+        events = session.events
+        self._count(events, state)
+        if state.total <= self.budget:
+            return False
+
+        # Cut at the earliest turn boundary that brings the history under the target,
+        # but always keep the most recent turn intact.
+        boundaries = [i for i, event in enumerate(events) if _is_user_message(event)]
+        if len(boundaries) < 2:
+            return False
+        boundary_set = set(boundaries)
+        remaining = state.total
+        cut = None
+        for i, event in enumerate(events[:boundaries[-1]]):
+            remaining -= state.tokens[event.id]
+            if i + 1 in boundary_set:
+                cut = i + 1
+                if remaining + self.summary_budget <= self.target:
+                    break
+        if cut is None:
+            return False
+
+        dropped = events[:cut]
+        self._fold(dropped, state)
+        summary = self._summary_event(state, events[cut])
+
+        for event in dropped:
+            state.total -= state.tokens.pop(event.id, 0)
+        summary_tokens = estimate_event_tokens(summary)
+        state.tokens[summary.id] = summary_tokens
+        state.total += summary_tokens
+
+        session.events = [summary] + events[cut:]
+        state.counted = len(session.events)
+        state.compactions += 1
+        logger.info(f"Compacted history: dropped {len(dropped)} events, ~{state.total} tokens kept")
+        return True
+
+    def _fold(self, dropped: list, state: HistoryState):
+        """Appends one line per dropped message/tool result to the running summary."""
+        for event in dropped:
+            if is_summary_event(event) or event.content is None:
+                continue
+            for part in event.content.parts or []:
+                line = None
+                if part.function_response:
+                    response = json.dumps(part.function_response.response, default=str, separators=(",", ":"))
+                    line = f"{part.function_response.name} returned {_snippet(response)}"
+                elif part.text and part.text.strip() and not event.partial:
+                    speaker = "Caller" if event.author == "user" else event.author
+                    line = f"{speaker}: {_snippet(part.text)}"
+                if line:
+                    state.summary_lines.append(line)
+                    state.summary_tokens += estimate_tokens(line)
+        # Oldest facts go first when the summary itself outgrows its budget
+        while state.summary_tokens > self.summary_budget and len(state.summary_lines) > 1:
+            state.summary_tokens -= estimate_tokens(state.summary_lines.popleft())
+
+    @staticmethod
+    def _summary_event(state: HistoryState, next_event: Event) -> Event:
+        text = SUMMARY_HEADER + "\n" + "\n".join(f"- {line}" for line in state.summary_lines)
+        return Event(
+            author="user",
+            invocation_id="history-summary",
+            content=Content(role="user", parts=[Part(text=text)]),
+            custom_metadata={"history_summary": True},
+            # Sorts before the first kept event
+            timestamp=next_event.timestamp - 0.001,
+        )
@@ -0,0 +1,227 @@
+import json
+import logging
+import math
+import os
+import random
+import re
+import sqlite3
+import zlib
+
+logger = logging.getLogger("IntentClassifier")
+
+INTENTS = ["goodbye", "billing", "tech", "escalate", "other"]
+
+# Size of the hashed feature space (2^16 buckets)
+NUM_BUCKETS = 1 << 16
+
+INTENT_MODEL_PATH = os.environ.get("INTENT_MODEL_PATH", "intent_model.json")
+
+_NON_WORD = re.compile(r"[^\w\s]")
+
+# --- Keyword rules (also used to weakly label transcripts) ---
+_RULES = [
+    ("billing", re.compile(r"(balance|bill|pay|cost|owing|due)")),
+    ("tech", re.compile(r"(internet|slow|down|outage|wifi|connect)")),
+    ("escalate", re.compile(r"(human|agent|operator|person|talk to|speak with|escalate)")),
+]
+_GOODBYE_EXACT = {"bye", "goodbye", "cancel", "end", "hang up", "exit", "quit", "thanks bye", "thank you bye"}
+_GOODBYE_PHRASE = re.compile(r"^(goodbye|bye|bye\s+bye|see\s+you|talk\s+to\s+you\s+later)$")
+_GOODBYE_THANKS = re.compile(r"(thank\s+you|thanks)\s+(bye|goodbye)")
+# An explicit closing (on normalized text). "thanks" alone is not one: callers say it mid-call.
+# Neither is "hang up"/"end the call", which also show up in complaints ("the call keeps hanging up").
+_FAREWELL = re.compile(
+    r"\b(bye|goodbye|thats (all|it|everything)|that is (all|it|everything)|see you|talk to you later"
+    r"|have a (nice|good|great) day|(i|ive) (have|got) to go|gotta go)\b"
+)
+
+# Assistant replies reveal which specialist handled the turn
+_REPLY_RULES = [
+    ("escalate", re.compile(r"(ticket|human agent|escalat)")),
+    ("billing", re.compile(r"(balance|payment|rupees|₹|inr|due date)")),
+    ("tech", re.compile(r"(outage|router|network|diagnostic|packet loss)")),
+]
+
+def normalize(text: str) -> str:
+    """Lowercase and remove punctuation (keep spaces)."""
+    return " ".join(_NON_WORD.sub("", (text or "").lower()).split())
+
+def rule_intent(text: str):
+    """Hand-written keyword rules. Returns an intent or None."""
+    norm = normalize(text)
+    if norm in _GOODBYE_EXACT or _GOODBYE_PHRASE.search(norm) or _GOODBYE_THANKS.search(norm):
+        return "goodbye"
+    lowered = (text or "").lower()
+    for intent, pattern in _RULES:
+        if pattern.search(lowered):
+            return intent
+    return None
+
+def has_farewell(text: str) -> bool:
+    """True if the utterance contains an explicit farewell, not just a thank-you."""
+    return bool(_FAREWELL.search(normalize(text)))
+
+def _features(text: str) -> list:
+    """Hashed word unigrams/bigrams and character trigrams."""
+    norm = normalize(text)
+    words = norm.split()
+    grams = [f"w:{w}" for w in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    padded = f" {norm} "
+    grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    if words:
+        # Whole-utterance length bucket: goodbyes are short
+        grams.append(f"len:{min(len(words), 8)}")
+    return [zlib.crc32(g.encode("utf-8")) % NUM_BUCKETS for g in grams]
+
+# --- Seed data (always part of training) ---
+SEED_EXAMPLES = {
+    "goodbye": [
+        "bye", "goodbye", "bye bye", "thanks bye", "thank you bye", "thank you goodbye",
+        "ok thanks that's all", "that's all for today", "that is all thank you", "see you",
+        "talk to you later", "nothing else bye", "no that's it thank you",
+        "hang up", "end the call", "you can hang up now", "have a nice day", "cheers bye",
+        "alright thank you so much bye", "that's everything thanks", "that's all bye",
+        "okay that's everything thank you", "great that's all thank you", "that's it thanks bye",
+        "ok bye", "exit", "quit", "cancel", "thanks for your help goodbye", "i have to go now",
+    ],
+    "billing": [
+        "check my balance", "what is my balance", "how much do i owe", "when is my bill due",
+        "i want to pay my bill", "make a payment", "pay 500 rupees", "why is my bill so high",
+        "what's the amount due", "i was charged twice", "billing question", "how much is my bill",
+        "i need to pay", "can i pay now", "what do i owe this month", "my account balance please",
+        "refund my money", "charges on my account", "due date for payment", "how much does my plan cost",
+    ],
+    "tech": [
+        "my internet is not working", "internet is slow", "is there an outage", "wifi keeps dropping",
+        "no connection", "the network is down", "my router is blinking red", "can't connect to wifi",
+        "internet keeps disconnecting", "run a diagnostic", "check my router", "is the network down in my area",
+        "my broadband stopped working", "speed is very slow", "no internet since morning",
+        "pages won't load", "my connection is unstable", "the signal is weak", "restart my router",
+        "is there any outage near me",
+    ],
+    "escalate": [
+        "let me talk to a human", "i want to speak with a person", "connect me to an agent",
+        "get me a real person", "operator please", "i want to escalate this", "this is useless",
+        "i'm very angry", "transfer me to a manager", "i need a supervisor", "speak to customer care",
+        "you are not helping", "human please", "representative", "i want to complain",
+        "this is ridiculous get me someone", "put me through to support staff", "talk to a real agent",
+    ],
+    "other": [
+        "hello", "hi there", "yes", "no", "okay", "what can you do", "i have a question",
+        "can you help me", "my name is onkar", "sorry what", "repeat that please", "hmm",
+        "wait a second", "don't hang up", "please don't end the call", "i'm calling about my account",
+        "good morning", "who am i talking to", "one more thing", "hold on",
+        # Mid-call thank-yous: polite, not a request to hang up
+        "thanks", "thank you", "okay thank you", "ok thanks", "no thanks", "thanks a lot",
+        "thank you so much", "great thanks", "yes thank you",
+    ],
+}
+
+def load_transcript_examples(db_path: str) -> list:
+    """
+    Weakly labels user turns from the transcripts table.
+    A turn is labeled by the keyword rules, or else by the assistant reply that
+    followed it (which shows which specialist handled it). Unlabeled turns are skipped.
+    """
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT call_sid, role, content FROM transcripts ORDER BY call_sid, timestamp ASC"
+    ).fetchall()
+    conn.close()
+
+    examples = []
+    for i, (call_sid, role, content) in enumerate(rows):
+        if role != "user" or not content:
+            continue
+        label = rule_intent(content)
+        if label is None and i + 1 < len(rows):
+            next_sid, next_role, reply = rows[i + 1]
+            if next_sid == call_sid and next_role == "assistant" and reply:
+                lowered = reply.lower()
+                label = next((intent for intent, pattern in _REPLY_RULES if pattern.search(lowered)), None)
+        if label is not None:
+            examples.append((content, label))
+    return examples
+
+class IntentClassifier:
+    """
+    Multinomial logistic regression over hashed n-gram features.
+    Weights are sparse (only buckets seen in training), so prediction is a few
+    dict lookups per feature and stays well under a millisecond.
+    """
+
+    def __init__(self, weights: dict = None, bias: dict = None):
+        self.weights = weights or {intent: {} for intent in INTENTS}
+        self.bias = bias or {intent: 0.0 for intent in INTENTS}
+
+    def _scores(self, features: list) -> dict:
+        scores = {}
+        for intent in INTENTS:
+            w = self.weights[intent]
+            scores[intent] = self.bias[intent] + sum(w.get(f, 0.0) for f in features)
+        return scores
+
+    @staticmethod
+    def _softmax(scores: dict) -> dict:
+        top = max(scores.values())
+        exps = {k: math.exp(v - top) for k, v in scores.items()}
+        total = sum(exps.values())
+        return {k: v / total for k, v in exps.items()}
+
+    def predict(self, text: str):
+        """Returns (intent, confidence)."""
+        probs = self._softmax(self._scores(_features(text)))
+        intent = max(probs, key=probs.get)
+        return intent, probs[intent]
+
+    def train(self, examples: list, epochs: int = 30, lr: float = 0.3, l2: float = 1e-4, seed: int = 7):
+        """SGD on (text, intent) pairs."""
+        data = [(_features(text), label) for text, label in examples if label in INTENTS]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            step = lr / (1 + epoch * 0.1)
+            for features, label in data:
+                probs = self._softmax(self._scores(features))
+                for intent in INTENTS:
+                    grad = probs[intent] - (1.0 if intent == label else 0.0)
+                    if abs(grad) < 1e-6:
+                        continue
+                    w = self.weights[intent]
+                    for f in features:
+                        w[f] = w.get(f, 0.0) * (1 - step * l2) - step * grad
+                    self.bias[intent] -= step * grad
+        return self
+
+    def save(self, path: str):
+        with open(path, "w") as fh:
+            json.dump({
+                "intents": INTENTS,
+                "buckets": NUM_BUCKETS,
+                "bias": self.bias,
+                "weights": {k: {str(f): round(v, 5) for f, v in w.items() if abs(v) > 1e-5}
+                            for k, w in self.weights.items()},
+            }, fh)
+
+    @classmethod
+    def load(cls, path: str) -> "IntentClassifier":
+        with open(path) as fh:
+            data = json.load(fh)
+        weights = {k: {int(f): v for f, v in w.items()} for k, w in data["weights"].items()}
+        return cls(weights=weights, bias=data["bias"])
+
+    @classmethod
+    def from_seed(cls) -> "IntentClassifier":
+        examples = [(text, intent) for intent, texts in SEED_EXAMPLES.items() for text in texts]
+        return cls().train(examples)
+
+def load_default() -> IntentClassifier:
+    """Loads the offline-trained model if present, else trains on the seed set."""
+    if os.path.exists(INTENT_MODEL_PATH):
+        try:
+            model = IntentClassifier.load(INTENT_MODEL_PATH)
+            logger.info(f"Loaded intent model from {INTENT_MODEL_PATH}")
+            return model
+        except Exception as e:
+            logger.warning(f"Failed to load intent model {INTENT_MODEL_PATH}: {e}")
+    return IntentClassifier.from_seed()
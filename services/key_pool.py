@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+import time
+
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger("KeyPool")
+
+# Per-key request budget (requests per minute) and burst size. When GOOGLE_API_KEY_RPM is unset,
+# pooled keys (GOOGLE_API_KEYS) default to POOLED_KEY_RPM and a lone GOOGLE_API_KEY is not limited
+# client-side, so a single-key deployment never waits on the pool.
+KEY_RPM = float(os.environ["GOOGLE_API_KEY_RPM"]) if os.environ.get("GOOGLE_API_KEY_RPM") else None
+POOLED_KEY_RPM = 15
+KEY_BURST = float(os.environ.get("GOOGLE_API_KEY_BURST", 3))
+# Base cooldown after RESOURCE_EXHAUSTED; doubles on consecutive 429s for the same key
+KEY_COOLDOWN = float(os.environ.get("GOOGLE_API_KEY_COOLDOWN", 30))
+# Never wait longer than this for a key; fall back to the least loaded one
+KEY_MAX_WAIT = float(os.environ.get("GOOGLE_API_KEY_MAX_WAIT", 10))
+
+def is_resource_exhausted(error: Exception) -> bool:
+    """True for quota / rate-limit errors (HTTP 429, RESOURCE_EXHAUSTED)."""
+    if getattr(error, "code", None) == 429:
+        return True
+    text = str(error)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text or "quota" in text.lower()
+
+class KeyLease:
+    """One API key with its client object, token bucket, cooldown and usage counters."""
+
+    def __init__(self, key: str, client, rpm: float, burst: float):
+        self.key = key
+        self.client = client
+        # No bucket: unlimited (only 429 cooldowns apply)
+        self.bucket = TokenBucket(rate=rpm / 60.0, capacity=burst) if rpm else None
+        self.cooldown_until = 0.0
+        self.consecutive_exhausted = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.exhausted = 0
+        self.errors = 0
+
+    @property
+    def label(self) -> str:
+        return f"...{self.key[-4:]}"
+
+    @property
+    def tokens(self) -> float:
+        return self.bucket.tokens if self.bucket is not None else float("inf")
+
+    def try_take(self) -> bool:
+        return self.bucket is None or self.bucket.try_take()
+
+    def wait_time(self, now: float) -> float:
+        throttle = self.bucket.time_until_available() if self.bucket is not None else 0.0
+        return max(self.cooldown_until - now, throttle)
+
+class ApiKeyPool:
+    """
+    Schedules LLM calls across several API keys.
+
+    Each key has its own client (built once by client_factory), a token bucket
+    sized to its per-minute quota, and a cooldown that starts when the key
+    returns RESOURCE_EXHAUSTED. acquire() returns the key with the most
+    headroom, waiting only when every key is out of budget.
+    """
+
+    def __init__(self, keys: list, client_factory, rpm: float = None, burst: float = KEY_BURST,
+                 cooldown_seconds: float = KEY_COOLDOWN, max_wait: float = KEY_MAX_WAIT):
+        self.cooldown_seconds = cooldown_seconds
+        self.max_wait = max_wait
+        self.leases = [KeyLease(key, client_factory(key), rpm, burst) for key in keys]
+
+    @classmethod
+    def from_env(cls, client_factory):
+        """Reads GOOGLE_API_KEYS (CSV), falling back to GOOGLE_API_KEY."""
+        keys = [k.strip() for k in os.environ.get("GOOGLE_API_KEYS", "").split(",") if k.strip()]
+        rpm = KEY_RPM if KEY_RPM is not None else (POOLED_KEY_RPM if keys else None)
+        if not keys and os.environ.get("GOOGLE_API_KEY"):
+            keys.append(os.environ["GOOGLE_API_KEY"])
+        if not keys:
+            logger.warning("No API Keys configured for the key pool.")
+        return cls(keys, client_factory, rpm=rpm)
+
+    def __len__(self):
+        return len(self.leases)
+
+    def _pick(self, now: float):
+        ready = [lease for lease in self.leases if lease.cooldown_until <= now and lease.tokens >= 1]
+        if not ready:
+            return None
+        return max(ready, key=lambda lease: (lease.tokens, -lease.in_flight))
+
+    async def acquire(self) -> KeyLease:
+        """Waits for a key with budget and reserves one request on it."""
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            now = time.monotonic()
+            lease = self._pick(now)
+            if lease is not None and lease.try_take():
+                break
+            if now >= deadline:
+                # Everything is throttled: take the key that recovers first rather than stall the turn
+                lease = min(self.leases, key=lambda l: (l.wait_time(now), l.in_flight))
+                logger.warning(f"All API keys throttled, using {lease.label} anyway")
+                break
+            wait = min(min(l.wait_time(now) for l in self.leases), deadline - now)
+            await asyncio.sleep(max(wait, 0.01))
+
+        lease.in_flight += 1
+        lease.requests += 1
+        return lease
+
+    def release(self, lease: KeyLease, error: Exception = None):
+        """Returns a key after a call; a quota error puts it into cooldown."""
+        lease.in_flight -= 1
+        if error is None:
+            lease.consecutive_exhausted = 0
+            return
+        if is_resource_exhausted(error):
+            lease.exhausted += 1
+            lease.consecutive_exhausted += 1
+            cooldown = self.cooldown_seconds * (2 ** (lease.consecutive_exhausted - 1))
+            lease.cooldown_until = time.monotonic() + cooldown
+            logger.warning(f"API key {lease.label} exhausted, cooling down for {cooldown:.0f}s")
+        else:
+            lease.errors += 1
+
+    def stats(self) -> list:
+        now = time.monotonic()
+        return [
+            {
+                "key": lease.label,
+                "requests": lease.requests,
+                "in_flight": lease.in_flight,
+                "exhausted": lease.exhausted,
+                "errors": lease.errors,
+                "tokens": round(lease.bucket.tokens, 2) if lease.bucket is not None else None,
+                "cooldown_remaining": round(max(0.0, lease.cooldown_until - now), 1),
+            }
+            for lease in self.leases
+        ]
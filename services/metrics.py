@@ -0,0 +1,305 @@
+import functools
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger("Metrics")
+
+# Latency buckets (seconds) covering Redis round trips up to slow LLM turns
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+class Counter(_Metric):
+    """An incremented counter, or one read from a callback at scrape time (a running total that only grows)."""
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=(), callback=None):
+        super().__init__(name, help_text, labels)
+        self._values = {}
+        self._callback = callback
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        if self._callback is not None:
+            try:
+                return [f"{self.name} {_format_value(self._callback())}"]
+            except Exception as e:
+                logger.warning(f"Counter {self.name} callback failed: {e}")
+                return []
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(v)}" for key, v in items]
+
+class Gauge(_Metric):
+    """A settable gauge, or one read from a callback at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=(), callback=None):
+        super().__init__(name, help_text, labels)
+        self._values = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self):
+        if self._callback is not None:
+            try:
+                return [f"{self.name} {_format_value(self._callback())}"]
+            except Exception as e:
+                logger.warning(f"Gauge {self.name} callback failed: {e}")
+                return []
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(v)}" for key, v in items]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [bucket counts..., sum, count]
+        self._series = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[-1] if series else 0
+
+    def _samples(self):
+        lines = []
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                le = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Minimal Prometheus registry: counters, gauges and histograms rendered in the
+    text exposition format served by /metrics.
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: tuple = (), callback=None) -> Counter:
+        return self._register(Counter(name, help_text, labels, callback))
+
+    def gauge(self, name: str, help_text: str, labels: tuple = (), callback=None) -> Gauge:
+        return self._register(Gauge(name, help_text, labels, callback))
+
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "voice_turn_stage_seconds", "Time spent per stage of an agent turn.", ("stage",)
+)
+STAGE_ERRORS = registry.counter(
+    "voice_turn_stage_errors_total", "Stages that raised, by stage.", ("stage",)
+)
+TURN_SECONDS = registry.histogram(
+    "voice_turn_seconds", "End-to-end agent turn time, by path (sync/async/stream).", ("path",)
+)
+FIRST_AUDIO_SECONDS = registry.histogram(
+    "voice_first_audio_seconds", "Time from agent start to the first sentence pushed to the call."
+)
+HTTP_SECONDS = registry.histogram(
+    "voice_http_request_seconds", "Webhook handler latency.", ("route", "status")
+)
+
+# --- Per-turn tracing ---
+
+class TurnTrace:
+    """Spans recorded during one agent turn of one call."""
+
+    def __init__(self, call_sid: str, turn=None, path: str = ""):
+        self.call_sid = call_sid
+        self.turn = turn
+        self.path = path
+        self.started = time.perf_counter()
+        # (stage, seconds, error) in completion order; appended from worker threads too
+        self.spans = []
+
+    def duration(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> str:
+        parts = [f"{stage}={seconds * 1000:.1f}ms{'!' if error else ''}" for stage, seconds, error in self.spans]
+        return " ".join(parts)
+
+_current_trace: ContextVar[TurnTrace] = ContextVar("current_trace", default=None)
+
+# Last traces, for debugging from a shell or tests
+recent_traces = deque(maxlen=256)
+
+@contextmanager
+def trace_turn(call_sid: str, turn=None, path: str = ""):
+    """
+    Starts a trace for one agent turn. Spans opened in this context (including tools
+    offloaded with run_blocking, which copies the context) are attached to it.
+    On exit the turn total is observed and one log line tagged with the CallSid is written.
+    """
+    trace = TurnTrace(call_sid, turn, path)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        total = trace.duration()
+        TURN_SECONDS.observe(total, path=path)
+        recent_traces.append(trace)
+        logger.info(f"Trace CallSid={call_sid} turn={turn} path={path} total={total * 1000:.1f}ms {trace.summary()}")
+
+def current_trace() -> TurnTrace:
+    return _current_trace.get()
+
+def record_span(stage: str, seconds: float, error: bool = False):
+    """Records an already measured stage: histogram, error counter and the current trace."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if error:
+        STAGE_ERRORS.inc(stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.spans.append((stage, seconds, error))
+
+@contextmanager
+def span(stage: str):
+    """
+    Times a stage. Always feeds the stage histogram; inside a trace_turn the span is
+    also recorded on the trace. CallSid goes to logs, not labels, to keep series bounded.
+    """
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except GeneratorExit:
+        # Consumer closed a streaming generator early: not a failure
+        raise
+    except BaseException:
+        error = True
+        raise
+    finally:
+        record_span(stage, time.perf_counter() - started, error)
+
+def timed_tool(fn):
+    """
+    Wraps an async tool function so each call is timed as a "tool.<name>" span.
+    functools.wraps keeps the name, docstring and signature ADK uses for the declaration.
+    """
+    stage = f"tool.{fn.__name__}"
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with span(stage):
+            return await fn(*args, **kwargs)
+    return wrapper
+
+async def timed_stream(stage: str, stream):
+    """
+    Re-yields an async generator as one span that covers only the awaits on it.
+    Time the consumer spends between items (TTS, Twilio updates, tools) is not counted.
+    """
+    elapsed = 0.0
+    error = False
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = await anext(stream)
+            except StopAsyncIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - started
+            yield item
+    except GeneratorExit:
+        raise
+    except BaseException:
+        error = True
+        raise
+    finally:
+        await stream.aclose()
+        record_span(stage, elapsed, error)
@@ -0,0 +1,171 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("NetworkCache")
+
+# Channel RedisDatabase.set_network_status publishes "<region>\t<status>\t<previous status>" on
+NETWORK_UPDATES_CHANNEL = "network:updates"
+# Keyspace notifications for writes made outside this code (needs notify-keyspace-events "K$")
+NETWORK_KEYSPACE_PATTERN = "__keyspace@*__:network:*"
+
+# TTL while the change listener is connected vs. when it is down (pure TTL fallback)
+NETWORK_CACHE_TTL = float(os.environ.get("NETWORK_CACHE_TTL", 60))
+NETWORK_CACHE_FALLBACK_TTL = float(os.environ.get("NETWORK_CACHE_FALLBACK_TTL", 5))
+
+class RegionStatusCache:
+    """
+    In-process cache of network:{region} status.
+
+    Kept fresh by a background pub/sub listener: updates published by
+    set_network_status are applied directly, keyspace events invalidate the
+    region. While the listener is down entries expire after the short fallback TTL.
+    Concurrent misses for one region share a single Redis read. Published changes are
+    also passed to change listeners (add_listener), whichever process made them.
+    """
+
+    def __init__(self, ttl: float = NETWORK_CACHE_TTL, fallback_ttl: float = NETWORK_CACHE_FALLBACK_TTL):
+        self.ttl = ttl
+        self.fallback_ttl = fallback_ttl
+        # region -> (status, fetched_at)
+        self._entries = {}
+        self._region_locks = {}
+        self._lock = threading.Lock()
+        self._listener = None
+        self._listening = threading.Event()
+        # Called as fn(region, old_status, new_status) for each published change
+        self._change_listeners = []
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def listening(self) -> bool:
+        return self._listening.is_set()
+
+    def _fresh(self, entry) -> bool:
+        ttl = self.ttl if self.listening else self.fallback_ttl
+        return entry is not None and time.monotonic() - entry[1] < ttl
+
+    def peek(self, region: str):
+        """Returns the cached status if still fresh, else None (counted as a miss)."""
+        entry = self._entries.get(region)
+        if self._fresh(entry):
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        return None
+
+    def get(self, region: str, loader):
+        """Returns the cached status, calling loader(region) on a miss."""
+        status = self.peek(region)
+        if status is not None:
+            return status
+
+        with self._lock:
+            region_lock = self._region_locks.setdefault(region, threading.Lock())
+        with region_lock:
+            # Another thread may have loaded it while we waited
+            entry = self._entries.get(region)
+            if self._fresh(entry):
+                return entry[0]
+            status = loader(region)
+            self.put(region, status)
+            return status
+
+    def last_known(self, region: str):
+        """The cached status regardless of age (for when Redis cannot be reached), or None."""
+        entry = self._entries.get(region)
+        return entry[0] if entry is not None else None
+
+    def put(self, region: str, status: str):
+        self._entries[region] = (status, time.monotonic())
+
+    def invalidate(self, region: str = None):
+        # Entries are expired rather than dropped so last_known() can still serve them
+        regions = list(self._entries) if region is None else [region]
+        for name in regions:
+            entry = self._entries.get(name)
+            if entry is not None:
+                self._entries[name] = (entry[0], float("-inf"))
+
+    # --- Change listener ---
+
+    def add_listener(self, listener):
+        self._change_listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._change_listeners:
+            self._change_listeners.remove(listener)
+
+    def _changed(self, region: str, old, new: str):
+        if old == new:
+            return
+        for listener in list(self._change_listeners):
+            try:
+                listener(region, old, new)
+            except Exception as e:
+                logger.warning(f"Network status change listener failed: {e}")
+
+    def _handle_message(self, message: dict):
+        channel = message.get("channel") or ""
+        data = message.get("data")
+        if message.get("type") not in ("message", "pmessage") or not isinstance(data, str):
+            return
+        if channel == NETWORK_UPDATES_CHANNEL:
+            region, _, rest = data.partition("\t")
+            status, has_old, old = rest.partition("\t")
+            if region:
+                if not has_old:
+                    # Published without the previous status: the best we know is our own copy
+                    old = self.last_known(region)
+                self.put(region, status)
+                self._changed(region, old or None, status)
+        elif ":network:" in channel:
+            # Keyspace event for a write we didn't publish: re-read on next use
+            self.invalidate(channel.split(":network:", 1)[1])
+
+    def _listen_loop(self, client):
+        backoff = 1.0
+        while True:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(NETWORK_UPDATES_CHANNEL)
+                pubsub.psubscribe(NETWORK_KEYSPACE_PATTERN)
+                # Anything cached while we were disconnected may be stale
+                self.invalidate()
+                self._listening.set()
+                backoff = 1.0
+                logger.info("Network status listener subscribed.")
+                for message in pubsub.listen():
+                    self._handle_message(message)
+            except Exception as e:
+                logger.warning(f"Network status listener disconnected: {e}")
+            finally:
+                self._listening.clear()
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def start(self, client):
+        """Starts the background listener (once) on a sync redis client."""
+        if self._listener is not None:
+            return
+        self._listener = threading.Thread(
+            target=self._listen_loop, args=(client,), name="network-cache", daemon=True
+        )
+        self._listener.start()
+
+    def stats(self) -> dict:
+        return {
+            "regions": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "listening": self.listening,
+        }
+
+# Shared by the sync and async repositories
+network_cache = RegionStatusCache()
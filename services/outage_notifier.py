@@ -0,0 +1,179 @@
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from services.metrics import registry
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger("OutageNotifier")
+
+OUTAGE_STATUS = "Outage Detected"
+OUTAGE_RESOLVED_MESSAGE = (
+    "Good news from your network provider: the outage in your area ({region}) has been resolved. "
+    "If your connection is still down, please restart your router."
+)
+
+# Notifications in flight at once, and sent per second (shared by all regions: the provider limit is per account)
+OUTAGE_NOTIFY_CONCURRENCY = int(os.environ.get("OUTAGE_NOTIFY_CONCURRENCY", 8))
+OUTAGE_NOTIFY_RATE = float(os.environ.get("OUTAGE_NOTIFY_RATE", 5))
+# User ids fetched per SSCAN page of the region index
+OUTAGE_NOTIFY_PAGE = int(os.environ.get("OUTAGE_NOTIFY_PAGE", 500))
+# "sms" or "call"
+OUTAGE_NOTIFY_CHANNEL = os.environ.get("OUTAGE_NOTIFY_CHANNEL", "sms")
+# Every worker hears about a resolution; the one that claims it first runs the fan-out.
+# A region resolved again within this many seconds is not notified twice.
+OUTAGE_FANOUT_CLAIM_TTL = float(os.environ.get("OUTAGE_FANOUT_CLAIM_TTL", 300))
+
+NOTIFICATIONS = registry.counter(
+    "voice_outage_notifications_total", "Outage-resolved notifications, by result.", ("result",)
+)
+
+def twilio_sender(client, from_number: str, channel: str = OUTAGE_NOTIFY_CHANNEL):
+    """send(user_id, message) over Twilio SMS or an outbound call. Non-phone ids are skipped."""
+    def send(user_id: str, message: str):
+        if not user_id.startswith("+"):
+            return False
+        if channel == "call":
+            from twilio.twiml.voice_response import VoiceResponse
+            twiml = VoiceResponse()
+            twiml.say(message)
+            client.calls.create(to=user_id, from_=from_number, twiml=str(twiml))
+        else:
+            client.messages.create(to=user_id, from_=from_number, body=message)
+        return True
+    return send
+
+class OutageNotifier:
+    """
+    Tells every user in a region that its outage is over.
+
+    Triggered by status changes: register on_status_change with network_cache.add_listener
+    to hear changes published by any process (Redis), or with db.add_status_listener for
+    changes made through this process. Each worker that hears a resolution tries to claim
+    it (db.claim), so only one of them notifies. Each fan-out runs on its own thread, walking the region -> users
+    index one SSCAN page at a time, so 100k users never sit in memory or on the
+    serving event loop. Sends go through a small pool (at most `concurrency` at once)
+    behind a shared token bucket (`rate` per second). If the region goes back into
+    outage mid-way, the fan-out stops.
+    """
+
+    def __init__(self, database, send, concurrency: int = OUTAGE_NOTIFY_CONCURRENCY,
+                 rate: float = OUTAGE_NOTIFY_RATE, page_size: int = OUTAGE_NOTIFY_PAGE,
+                 message: str = OUTAGE_RESOLVED_MESSAGE):
+        self.db = database
+        self.send = send
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.message = message
+        self.bucket = TokenBucket(rate=rate, capacity=max(1.0, rate))
+        # region -> (thread, cancel event)
+        self._runs = {}
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def on_status_change(self, region: str, old: str, new: str):
+        if old == OUTAGE_STATUS and new != OUTAGE_STATUS:
+            if self._claim(region):
+                self.start_fanout(region)
+        elif new == OUTAGE_STATUS:
+            self.cancel(region)
+
+    def _claim(self, region: str) -> bool:
+        try:
+            return self.db.claim(f"outage-fanout:{region}", OUTAGE_FANOUT_CLAIM_TTL)
+        except Exception as e:
+            logger.warning(f"Could not claim the {region} fan-out, skipping it here: {e}")
+            return False
+
+    def start_fanout(self, region: str):
+        """Starts notifying the region's users in the background (once per region at a time)."""
+        with self._lock:
+            run = self._runs.get(region)
+            if run is not None and run[0].is_alive():
+                return run[0]
+            cancel = threading.Event()
+            thread = threading.Thread(
+                target=self._fanout, args=(region, cancel), name=f"outage-fanout-{region}", daemon=True
+            )
+            self._runs[region] = (thread, cancel)
+        logger.info(f"Outage resolved in {region}: notifying ~{self.db.region_user_count(region)} users")
+        thread.start()
+        return thread
+
+    def cancel(self, region: str = None):
+        with self._lock:
+            runs = list(self._runs.values()) if region is None else [self._runs.get(region)]
+        for run in runs:
+            if run is not None:
+                run[1].set()
+
+    def wait(self, timeout: float = None):
+        with self._lock:
+            threads = [thread for thread, _ in self._runs.values()]
+        for thread in threads:
+            thread.join(timeout)
+
+    def stop(self):
+        self.cancel()
+        self.wait(timeout=5)
+
+    def _fanout(self, region: str, cancel: threading.Event):
+        message = self.message.format(region=region)
+        slots = threading.BoundedSemaphore(self.concurrency)
+        queued = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f"notify-{region}") as pool:
+            for user_id in self.db.users_in_region(region, self.page_size):
+                while not self.bucket.try_take():
+                    if cancel.wait(self.bucket.time_until_available()):
+                        break
+                if cancel.is_set():
+                    logger.info(f"Fan-out for {region} cancelled after {queued} users")
+                    break
+                # Blocks while `concurrency` sends are in flight, so the pool queue stays short
+                slots.acquire()
+                pool.submit(self._notify_one, user_id, message, slots)
+                queued += 1
+        logger.info(f"Fan-out for {region} finished: {queued} users")
+
+    def _notify_one(self, user_id: str, message: str, slots: threading.BoundedSemaphore):
+        try:
+            if self.send(user_id, message) is False:
+                self.skipped += 1
+                NOTIFICATIONS.inc(result="skipped")
+            else:
+                self.sent += 1
+                NOTIFICATIONS.inc(result="sent")
+        except Exception as e:
+            self.failed += 1
+            NOTIFICATIONS.inc(result="failed")
+            logger.warning(f"Outage notification to {user_id} failed: {e}")
+        finally:
+            slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            active = [region for region, (thread, _) in self._runs.items() if thread.is_alive()]
+        return {"active": active, "sent": self.sent, "skipped": self.skipped, "failed": self.failed}
+
+if __name__ == "__main__":
+    # Ops entry point: python -m services.outage_notifier <region> [status]
+    # Sets the status and, on an outage -> resolved change, runs the fan-out from this process
+    # unless a server worker (listening on the status channel) claimed it first.
+    from dotenv import load_dotenv
+    from twilio.rest import Client
+    from services.database import db
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    if len(sys.argv) < 2:
+        sys.exit("usage: python -m services.outage_notifier <region> [status]")
+    client = Client(os.environ["TWILIO_ACCOUNT_SID"], os.environ["TWILIO_AUTH_TOKEN"])
+    notifier = OutageNotifier(db, twilio_sender(client, os.environ["TWILIO_FROM_NUMBER"]))
+    db.add_status_listener(notifier.on_status_change)
+    db.set_network_status(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else "Operational")
+    notifier.wait()
+    print(notifier.stats())
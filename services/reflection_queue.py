@@ -0,0 +1,163 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services.rl_service import is_quota_error
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger("ReflectionQueue")
+
+# Failed calls folded into one judge prompt
+REFLECTION_BATCH_SIZE = int(os.environ.get("REFLECTION_BATCH_SIZE", 5))
+# Judge calls in flight at once (each on its own thread, never on the serving event loop)
+REFLECTION_CONCURRENCY = int(os.environ.get("REFLECTION_CONCURRENCY", 1))
+# Judge requests per minute, independent of the live-call key pool
+REFLECTION_RPM = float(os.environ.get("REFLECTION_RPM", 4))
+# How often due jobs are polled for when nobody calls notify()
+REFLECTION_POLL_INTERVAL = float(os.environ.get("REFLECTION_POLL_INTERVAL", 30))
+REFLECTION_MAX_ATTEMPTS = int(os.environ.get("REFLECTION_MAX_ATTEMPTS", 5))
+REFLECTION_BACKOFF = float(os.environ.get("REFLECTION_BACKOFF", 30))
+REFLECTION_MAX_BACKOFF = float(os.environ.get("REFLECTION_MAX_BACKOFF", 3600))
+# Whole queue pauses this long after the judge reports quota exhaustion
+REFLECTION_QUOTA_PAUSE = float(os.environ.get("REFLECTION_QUOTA_PAUSE", 300))
+
+class ReflectionWorker:
+    """
+    Drains the persisted reflection_jobs queue in the background.
+
+    A scheduler thread claims due jobs (failed calls only) in batches of batch_size
+    and hands each batch to a small dedicated pool, so at most `concurrency` judge
+    prompts run at once and at most `rpm` are sent per minute. Failed batches are
+    retried with exponential backoff; a quota error pauses the queue. Job state lives
+    in SQLite, so jobs left behind by a restart are picked up again on start().
+    """
+
+    def __init__(self, rl_service, judge=None, batch_size: int = REFLECTION_BATCH_SIZE,
+                 concurrency: int = REFLECTION_CONCURRENCY, rpm: float = REFLECTION_RPM,
+                 poll_interval: float = REFLECTION_POLL_INTERVAL, max_attempts: int = REFLECTION_MAX_ATTEMPTS,
+                 backoff: float = REFLECTION_BACKOFF, max_backoff: float = REFLECTION_MAX_BACKOFF,
+                 quota_pause: float = REFLECTION_QUOTA_PAUSE):
+        self.rl = rl_service
+        self.judge = judge
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.quota_pause = quota_pause
+        self.bucket = TokenBucket(rate=rpm / 60.0, capacity=1)
+
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._paused_until = 0.0
+        self._pool = None
+        self._thread = None
+
+        self.batches = 0
+        self.rules_learned = 0
+        self.failures = 0
+
+    # --- Lifecycle ---
+
+    def start(self):
+        if self._thread is not None:
+            return
+        requeued = self.rl.requeue_running_reflections()
+        if requeued:
+            logger.info(f"Re-queued {requeued} reflection jobs interrupted by a restart")
+        self._stopping.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="reflection")
+        self._thread = threading.Thread(target=self._schedule_loop, name="reflection-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        """Stops claiming new work; with wait=True lets running batches finish."""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+    def notify(self):
+        """A job was enqueued: check for work now instead of at the next poll."""
+        self._wake.set()
+
+    # --- Scheduling ---
+
+    def _schedule_loop(self):
+        while not self._stopping.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Reflection scheduling failed: {e}")
+            self._wake.wait(timeout=self.poll_interval)
+            self._wake.clear()
+
+    def run_once(self) -> int:
+        """Claims and dispatches as many batches as there are free slots. Returns batches started."""
+        started = 0
+        while not self._stopping.is_set() and time.monotonic() >= self._paused_until:
+            if not self._slots.acquire(blocking=False):
+                break
+            call_sids = self.rl.claim_reflection_jobs(self.batch_size)
+            if not call_sids:
+                self._slots.release()
+                break
+            if self._pool is None:
+                # Not started (tests, one-off drains): run inline
+                self._run_batch(call_sids)
+            else:
+                self._pool.submit(self._run_batch, call_sids)
+            started += 1
+        return started
+
+    def _run_batch(self, call_sids: list):
+        try:
+            while not self.bucket.try_take():
+                if self._stopping.wait(self.bucket.time_until_available()):
+                    # Shutting down before the judge was called: the jobs stay RUNNING
+                    # and are re-queued by the next start()
+                    return
+
+            logger.info(f"Reflecting on {len(call_sids)} failed calls: {call_sids}")
+            try:
+                rules = self.rl.reflect(call_sids, judge=self.judge)
+            except Exception as e:
+                self._on_failure(call_sids, e)
+                return
+
+            self.batches += 1
+            self.rules_learned += len(rules)
+            self.rl.complete_reflection_jobs(call_sids)
+        finally:
+            self._slots.release()
+            # A slot is free again: pick up anything that queued up meanwhile
+            self._wake.set()
+
+    def _on_failure(self, call_sids: list, error: Exception):
+        self.failures += 1
+        logger.error(f"Reflection batch failed: {error}")
+        if is_quota_error(error):
+            self._paused_until = time.monotonic() + self.quota_pause
+            self.rl.save_fallback_rule(call_sids[0])
+        exhausted = self.rl.retry_reflection_jobs(
+            call_sids, str(error)[:500], self.backoff, self.max_backoff, self.max_attempts
+        )
+        if exhausted:
+            logger.warning(f"Giving up on reflection for {exhausted} after {self.max_attempts} attempts")
+
+    def stats(self) -> dict:
+        return {
+            "running": self._thread is not None,
+            "paused_s": max(0.0, round(self._paused_until - time.monotonic(), 1)),
+            "batches": self.batches,
+            "rules_learned": self.rules_learned,
+            "failures": self.failures,
+        }
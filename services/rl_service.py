@@ -1,19 +1,118 @@
 import sqlite3
 import logging
 import json
+import math
+import re
 import time
+import queue
+import atexit
+import threading
+from concurrent.futures import Future
 from datetime import datetime
 from typing import List, Optional
 
 import google.generativeai as genai
 import os
 
+from services.metrics import registry
+from services.rule_similarity import minhash, most_similar, compatible
+
 logger = logging.getLogger("RLService")
 
+DB_BATCH_SECONDS = registry.histogram(
+    "rl_db_batch_seconds", "Time to apply and commit one write-behind batch."
+)
+DB_BATCH_ITEMS = registry.counter(
+    "rl_db_queue_items_total", "Statements, jobs and flushes processed by the RL writer."
+)
+
+# Process-wide version of the learned_rules table.
+# Bumped on every rule write so cached agent graphs know their guidelines are stale.
+_rules_version = 0
+_rules_version_lock = threading.Lock()
+
+# SQLite file for calls, transcripts and learned rules
+RL_DB_PATH = os.environ.get("RL_DB_PATH", "call_metrics.db")
+
+# Rules at least this similar (MinHash Jaccard estimate over content-word shingles) are merged
+# into one cluster, unless they differ in polarity, tool/agent names or numbers (see compatible)
+RULE_SIMILARITY_THRESHOLD = float(os.environ.get("RULE_SIMILARITY_THRESHOLD", 0.8))
+# Token budget for the guidelines block injected into every root prompt
+RULES_TOKEN_BUDGET = int(os.environ.get("RULES_TOKEN_BUDGET", 200))
+# Calls on each side of a rule's introduction used to measure its effect
+RULE_EFFECT_WINDOW = int(os.environ.get("RULE_EFFECT_WINDOW", 50))
+# Pseudo-count shrinking the effect of rules seen on only a few calls towards 0
+RULE_EFFECT_PRIOR = float(os.environ.get("RULE_EFFECT_PRIOR", 5))
+# Score points credited per doubling of how often a failure produced the same rule
+RULE_SUPPORT_BONUS = float(os.environ.get("RULE_SUPPORT_BONUS", 5))
+# Effects drift as calls come in, so the ranking is recomputed (in the background) this often
+RULES_RERANK_INTERVAL = float(os.environ.get("RULES_RERANK_INTERVAL", 300))
+
+FALLBACK_RULE = "IF call processing takes longer than 15 seconds, optimize response time and reduce complexity."
+
+# "CALL 2: NEVER ..." lines in a batched judge response
+_JUDGE_LINE = re.compile(r"^\W*CALL\s*(\d+)\s*[:.)-]\s*(.+)$", re.IGNORECASE | re.MULTILINE)
+
+def _estimate_tokens(text: str) -> int:
+    # ~4 characters per token on English text
+    return max(1, len(text) // 4)
+
+def is_quota_error(error) -> bool:
+    text = str(error)
+    return "429" in text or "quota" in text.lower() or "RESOURCE_EXHAUSTED" in text
+
+def _bump_rules_version():
+    global _rules_version
+    with _rules_version_lock:
+        _rules_version += 1
+
 class RLService:
-    def __init__(self, db_path="call_metrics.db"):
+    """
+    Call scoring, transcripts and learned rules, backed by SQLite.
+
+    All database work runs on one writer thread that owns a single long-lived
+    WAL-mode connection. Writes are fire-and-forget: they are queued and committed
+    in batches, so telemetry on the request path costs a queue put instead of an fsync.
+    Reads go through the same queue, so they always see earlier writes.
+    """
+
+    # Upper bound on statements committed in a single transaction
+    BATCH_SIZE = 256
+
+    # Schema migrations (version, step), applied in order and tracked in PRAGMA user_version
+    MIGRATIONS = (
+        (1, "_create_schema"),
+        (2, "_create_indexes"),
+        (3, "_create_rollups"),
+        (4, "_create_reflection_jobs"),
+        (5, "_cluster_rules"),
+        # Re-cluster with word shingles and the contradiction guard (5 merged opposite rules)
+        (6, "_cluster_rules"),
+    )
+
+    # Score reasons that mark the end of a call
+    HANGUP_REASONS = ("CALL_COMPLETION_BONUS", "PENALTY_LATENCY_HANGUP")
+    # Thinking-time histogram bounds (ms); the last bucket catches everything slower
+    THINKING_BUCKETS_MS = (500, 1000, 2000, 5000, 10000, 15000, 30000, 10 ** 9)
+
+    def __init__(self, db_path: str = None):
+        db_path = db_path or RL_DB_PATH
         self.db_path = db_path
+        # (rules_version, rendered guidelines, ranked_at) so repeated reads skip SQLite
+        self._rules_cache = None
+        self._rerank_pending = False
+
+        self._queue = queue.Queue()
+        self._closed = False
+        ready = threading.Event()
+        self._writer = threading.Thread(
+            target=self._writer_loop, args=(ready,), name="rl-writer", daemon=True
+        )
+        self._writer.start()
+        ready.wait()
         self._init_db()
+        # Flush pending telemetry when the interpreter exits
+        atexit.register(self.close)
         
         # Configure GenAI for the Learning Loop with separate API key
         # Use RL_GOOGLE_API_KEY if available, otherwise fallback to GOOGLE_API_KEY
@@ -22,9 +121,123 @@ class RLService:
             genai.configure(api_key=rl_api_key)
             logger.info(f"RL: Configured with {'dedicated' if os.environ.get('RL_GOOGLE_API_KEY') else 'shared'} API key")
 
+    # --- WRITE-BEHIND PIPELINE ---
+
+    def _writer_loop(self, ready: threading.Event):
+        """Owns the connection: drains the queue and commits each drained batch once."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        ready.set()
+
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            batch_started = time.perf_counter()
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            flushed = []
+            for kind, payload, future in batch:
+                try:
+                    if kind == "sql":
+                        conn.execute(*payload)
+                    elif kind == "job":
+                        result = payload(conn)
+                        if future is not None:
+                            future.set_result(result)
+                    elif kind == "flush":
+                        flushed.append(future)
+                    elif kind == "stop":
+                        flushed.append(future)
+                        running = False
+                except Exception as e:
+                    logger.error(f"RL: Write-behind {kind} failed: {e}")
+                    if future is not None and not future.done():
+                        future.set_exception(e)
+
+            try:
+                conn.commit()
+            except Exception as e:
+                logger.error(f"RL: Batch commit failed: {e}")
+            DB_BATCH_SECONDS.observe(time.perf_counter() - batch_started)
+            DB_BATCH_ITEMS.inc(len(batch))
+            for future in flushed:
+                future.set_result(None)
+
+        conn.close()
+
+    @property
+    def pending_writes(self) -> int:
+        """Items queued for the writer thread."""
+        return self._queue.qsize()
+
+    def _execute(self, sql: str, params: tuple = ()):
+        """Queues a write statement. Returns immediately."""
+        if self._closed:
+            logger.warning("RL: Write after close dropped.")
+            return
+        self._queue.put(("sql", (sql, params), None))
+
+    def _submit(self, job):
+        """Queues job(conn) to run on the writer thread without waiting for it."""
+        if self._closed:
+            logger.warning("RL: Write after close dropped.")
+            return
+        self._queue.put(("job", job, None))
+
+    def _call(self, job):
+        """Runs job(conn) on the writer thread and returns its result."""
+        if self._closed:
+            raise RuntimeError("RLService is closed")
+        future = Future()
+        self._queue.put(("job", job, future))
+        return future.result()
+
+    def flush(self):
+        """Blocks until everything queued so far is committed."""
+        if self._closed:
+            return
+        future = Future()
+        self._queue.put(("flush", None, future))
+        future.result()
+
+    def close(self):
+        """Flushes pending writes and stops the writer thread (shutdown hook)."""
+        if self._closed:
+            return
+        future = Future()
+        self._queue.put(("stop", None, future))
+        future.result()
+        self._closed = True
+        self._writer.join(timeout=5)
+
     def _init_db(self):
-        """Initializes the SQLite database with necessary tables."""
-        conn = sqlite3.connect(self.db_path)
+        """Initializes the SQLite database and brings its schema up to SCHEMA_VERSION."""
+        self._call(self._migrate)
+        self.flush()
+
+    @classmethod
+    def _migrate(cls, conn):
+        """
+        Applies pending migrations in order, tracked in PRAGMA user_version.
+        Steps are idempotent, so one interrupted midway is simply rerun on the next start.
+        """
+        conn.commit()
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version, step in cls.MIGRATIONS:
+            if version <= current:
+                continue
+            getattr(cls, step)(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+            logger.info(f"RL: Migrated call_metrics schema to v{version}")
+
+    @staticmethod
+    def _create_schema(conn):
         cursor = conn.cursor()
         
         # Table: calls
@@ -40,8 +253,6 @@ class RLService:
             )
         ''')
 
-        # Table: call_events
-        # Granular event log for detailed analysis
         # Table: call_events
         # Granular event log for detailed analysis
         cursor.execute('''
@@ -75,44 +286,206 @@ class RLService:
                 created_at TIMESTAMP
             )
         ''')
-        
-        conn.commit()
-        conn.close()
+
+    @staticmethod
+    def _create_indexes(conn):
+        # Every per-call read filters on call_sid and orders by time
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_call_events_call_ts ON call_events (call_sid, timestamp)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_call_events_ts ON call_events (timestamp)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_transcripts_call_ts ON transcripts (call_sid, timestamp)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_calls_start_time ON calls (start_time)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_learned_rules_created ON learned_rules (created_at)')
+
+    @classmethod
+    def _create_rollups(cls, conn):
+        # Daily aggregates maintained alongside the raw writes, so dashboards never scan events
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS daily_call_stats (
+                day TEXT PRIMARY KEY, -- YYYY-MM-DD, local time
+                calls INTEGER DEFAULT 0,
+                completed INTEGER DEFAULT 0,
+                thinking_hangups INTEGER DEFAULT 0,
+                score_total INTEGER DEFAULT 0,
+                score_changes INTEGER DEFAULT 0,
+                thinking_count INTEGER DEFAULT 0,
+                thinking_ms_total REAL DEFAULT 0,
+                thinking_ms_max REAL DEFAULT 0
+            )
+        ''')
+        # Thinking-time histogram per day (le_ms = bucket upper bound) for percentiles
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS daily_thinking_buckets (
+                day TEXT,
+                le_ms INTEGER,
+                count INTEGER DEFAULT 0,
+                PRIMARY KEY (day, le_ms)
+            )
+        ''')
+        cls._backfill_rollups(conn)
+
+    @staticmethod
+    def _create_reflection_jobs(conn):
+        # Durable queue for the learning loop (one job per finished call)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS reflection_jobs (
+                call_sid TEXT PRIMARY KEY,
+                status TEXT, -- PENDING, RUNNING, DONE, SKIPPED, FAILED
+                attempts INTEGER DEFAULT 0,
+                next_attempt_at REAL,
+                last_error TEXT,
+                created_at REAL,
+                updated_at REAL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_reflection_jobs_due ON reflection_jobs (status, next_attempt_at)')
+
+    @staticmethod
+    def _cluster_rules(conn):
+        # cluster_id: id of the canonical rule this one was merged into (NULL = canonical)
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(learned_rules)')}
+        if "signature" not in columns:
+            conn.execute('ALTER TABLE learned_rules ADD COLUMN signature TEXT')
+        if "cluster_id" not in columns:
+            conn.execute('ALTER TABLE learned_rules ADD COLUMN cluster_id INTEGER')
+        if "merged_count" not in columns:
+            conn.execute('ALTER TABLE learned_rules ADD COLUMN merged_count INTEGER DEFAULT 1')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_learned_rules_cluster ON learned_rules (cluster_id)')
+
+        # Cluster the existing rules oldest first, so the first phrasing stays canonical
+        conn.execute('UPDATE learned_rules SET cluster_id = NULL, merged_count = 1')
+        canonical = []
+        for rule_id, rule_text in conn.execute('SELECT id, rule_text FROM learned_rules ORDER BY id').fetchall():
+            signature = minhash(rule_text)
+            conn.execute('UPDATE learned_rules SET signature = ? WHERE id = ?', (json.dumps(signature), rule_id))
+            match_id, score = most_similar(
+                signature, [(cid, sig) for cid, text, sig in canonical if compatible(text, rule_text)]
+            )
+            if match_id is not None and score >= RULE_SIMILARITY_THRESHOLD:
+                conn.execute('UPDATE learned_rules SET cluster_id = ? WHERE id = ?', (match_id, rule_id))
+                conn.execute('UPDATE learned_rules SET merged_count = merged_count + 1 WHERE id = ?', (match_id,))
+            else:
+                canonical.append((rule_id, rule_text, signature))
+
+    @classmethod
+    def _backfill_rollups(cls, conn):
+        """Builds the rollups from the raw tables of a database created before they existed."""
+        conn.execute('DELETE FROM daily_call_stats')
+        conn.execute('DELETE FROM daily_thinking_buckets')
+        for day, calls in conn.execute(
+            'SELECT date(start_time), COUNT(*) FROM calls WHERE start_time IS NOT NULL GROUP BY 1'
+        ).fetchall():
+            cls._bump_daily(conn, day, calls=calls)
+
+        for ts, value in conn.execute(
+            "SELECT timestamp, value FROM call_events WHERE event_type = 'SCORE_CHANGE'"
+        ).fetchall():
+            points, reason = cls._parse_score_value(value)
+            cls._record_score(conn, ts, points, reason)
+
+        started = {}
+        for call_sid, ts, event_type in conn.execute(
+            "SELECT call_sid, timestamp, event_type FROM call_events "
+            "WHERE event_type IN ('THINKING_START', 'THINKING_END') ORDER BY timestamp"
+        ).fetchall():
+            if event_type == "THINKING_START":
+                started[call_sid] = ts
+            elif call_sid in started:
+                cls._record_thinking(conn, ts, (ts - started.pop(call_sid)) * 1000)
+
+    @staticmethod
+    def _parse_score_value(value: str):
+        """'-50 (PENALTY_LATENCY_HANGUP)' -> (-50, 'PENALTY_LATENCY_HANGUP')"""
+        points, _, reason = (value or "").partition(" ")
+        try:
+            return int(points), reason.strip("()")
+        except ValueError:
+            return 0, reason.strip("()")
+
+    @staticmethod
+    def _day(ts: float) -> str:
+        return datetime.fromtimestamp(ts).date().isoformat()
+
+    @staticmethod
+    def _bump_daily(conn, day: str, **deltas):
+        columns = ", ".join(deltas)
+        placeholders = ", ".join("?" for _ in deltas)
+        updates = ", ".join(f"{col} = {col} + excluded.{col}" for col in deltas)
+        conn.execute(
+            f'INSERT INTO daily_call_stats (day, {columns}) VALUES (?, {placeholders}) '
+            f'ON CONFLICT(day) DO UPDATE SET {updates}',
+            (day, *deltas.values())
+        )
+
+    @classmethod
+    def _record_score(cls, conn, ts: float, points: int, reason: str):
+        day = cls._day(ts)
+        deltas = {"score_total": points, "score_changes": 1}
+        if reason in cls.HANGUP_REASONS:
+            deltas["completed"] = 1
+        if reason == "PENALTY_LATENCY_HANGUP":
+            deltas["thinking_hangups"] = 1
+        cls._bump_daily(conn, day, **deltas)
+
+    @classmethod
+    def _record_thinking(cls, conn, ts: float, thinking_ms: float):
+        day = cls._day(ts)
+        cls._bump_daily(conn, day, thinking_count=1, thinking_ms_total=thinking_ms)
+        conn.execute('UPDATE daily_call_stats SET thinking_ms_max = MAX(thinking_ms_max, ?) WHERE day = ?',
+                     (thinking_ms, day))
+        le_ms = next(bound for bound in cls.THINKING_BUCKETS_MS if thinking_ms <= bound)
+        conn.execute(
+            'INSERT INTO daily_thinking_buckets (day, le_ms, count) VALUES (?, ?, 1) '
+            'ON CONFLICT(day, le_ms) DO UPDATE SET count = count + 1',
+            (day, le_ms)
+        )
 
     def start_call(self, call_sid: str):
         """Records a new call."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
+        self._submit(lambda conn: self._insert_call(conn, call_sid))
+        logger.info(f"RL: Started tracking call {call_sid}")
+
+    @classmethod
+    def _insert_call(cls, conn, call_sid: str):
+        now = datetime.now()
+        cursor = conn.execute('''
             INSERT OR IGNORE INTO calls (call_sid, status, start_time, agent_path, total_score)
             VALUES (?, ?, ?, ?, ?)
-        ''', (call_sid, "INIT", datetime.now(), "[]", 0))
-        conn.commit()
-        conn.close()
-        logger.info(f"RL: Started tracking call {call_sid}")
+        ''', (call_sid, "INIT", now, "[]", 0))
+        if cursor.rowcount:
+            cls._bump_daily(conn, now.date().isoformat(), calls=1)
 
     def update_status(self, call_sid: str, status: str):
         """Updates the high-level status of the call."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('UPDATE calls SET status = ? WHERE call_sid = ?', (status, call_sid))
-        conn.commit()
-        conn.close()
+        self._execute('UPDATE calls SET status = ? WHERE call_sid = ?', (status, call_sid))
 
     def log_event(self, call_sid: str, event_type: str, value: str = ""):
         """Logs a specific event (e.g., THINKING_START)."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
+        ts = time.time()
+        if event_type == "THINKING_END":
+            # Closes a thinking interval: also feeds the thinking-time rollup
+            self._submit(lambda conn: self._end_thinking(conn, call_sid, ts, value))
+            return
+        self._execute('''
             INSERT INTO call_events (call_sid, timestamp, event_type, value)
             VALUES (?, ?, ?, ?)
-        ''', (call_sid, time.time(), event_type, value))
-        conn.commit()
-        conn.close()
+        ''', (call_sid, ts, event_type, value))
+
+    def _end_thinking(self, conn, call_sid: str, ts: float, value: str):
+        started = conn.execute(
+            "SELECT timestamp FROM call_events WHERE call_sid = ? AND event_type = 'THINKING_START' "
+            "ORDER BY timestamp DESC LIMIT 1", (call_sid,)
+        ).fetchone()
+        conn.execute('INSERT INTO call_events (call_sid, timestamp, event_type, value) VALUES (?, ?, ?, ?)',
+                     (call_sid, ts, "THINKING_END", value))
+        if started:
+            self._record_thinking(conn, ts, (ts - started[0]) * 1000)
 
     def log_agent_routing(self, call_sid: str, agent_name: str):
         """Tracks which agent is handling the request (for routing penalty)."""
-        conn = sqlite3.connect(self.db_path)
+        self._submit(lambda conn: self._append_agent_path(conn, call_sid, agent_name))
+
+    @staticmethod
+    def _append_agent_path(conn, call_sid: str, agent_name: str):
         cursor = conn.cursor()
         
         # Get current path
@@ -131,9 +504,6 @@ class RLService:
             # If we see SpecificAgent -> Root -> AnotherStrictAgent, that might be bad.
             # Simple Heuristic: If path length > 3 in a single turn, penalize (ping pong).
             # For now, just logging.
-            
-        conn.commit()
-        conn.close()
 
     def process_turn_success(self, call_sid: str):
         """
@@ -147,8 +517,11 @@ class RLService:
         """
         Called when Twilio sends a 'completed' status callback.
         Check internal status to determine if it was a 'Thinking Hangup'.
+        Queued like any other write; the status read happens on the writer thread.
         """
-        conn = sqlite3.connect(self.db_path)
+        self._submit(lambda conn: self._score_hangup(conn, call_sid))
+
+    def _score_hangup(self, conn, call_sid: str):
         cursor = conn.cursor()
         
         cursor.execute('SELECT status FROM calls WHERE call_sid = ?', (call_sid,))
@@ -160,144 +533,375 @@ class RLService:
             
             if internal_status == "THINKING":
                 # User hung up while we were thinking (latency violation)
-                self._add_score(call_sid, -50, "PENALTY_LATENCY_HANGUP")
+                self._add_score(call_sid, -50, "PENALTY_LATENCY_HANGUP", conn=conn)
                 logger.warning(f"RL: PENALTY APPLIED to {call_sid} for Thinking Hangup.")
             else:
                 # Normal hangup (maybe successful?)
                 # We give a small completion bonus, unless it was a very short call?
                 # Let's just give +50 for a "completed" interaction for now.
-                self._add_score(call_sid, 50, "CALL_COMPLETION_BONUS")
-        
-        conn.commit()
-        conn.close()
+                self._add_score(call_sid, 50, "CALL_COMPLETION_BONUS", conn=conn)
 
-    def _add_score(self, call_sid: str, points: int, reason: str):
-        """Atomic update of score."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('UPDATE calls SET total_score = total_score + ? WHERE call_sid = ?', (points, call_sid))
-        conn.commit()
-        conn.close()
-        self.log_event(call_sid, "SCORE_CHANGE", f"{points} ({reason})")
+    def _add_score(self, call_sid: str, points: int, reason: str, conn=None):
+        """Atomic update of score. Pass conn when already running on the writer thread."""
+        if conn is None:
+            self._submit(lambda conn: self._add_score(call_sid, points, reason, conn=conn))
+            return
+        ts = time.time()
+        conn.execute('UPDATE calls SET total_score = total_score + ? WHERE call_sid = ?', (points, call_sid))
+        conn.execute('INSERT INTO call_events (call_sid, timestamp, event_type, value) VALUES (?, ?, ?, ?)',
+                     (call_sid, ts, "SCORE_CHANGE", f"{points} ({reason})"))
+        self._record_score(conn, ts, points, reason)
+
+    def get_daily_stats(self, days: int = 7) -> list:
+        """Most recent daily rollups, newest first, with average thinking time."""
+        def job(conn):
+            conn.row_factory = sqlite3.Row
+            try:
+                rows = conn.execute(
+                    'SELECT * FROM daily_call_stats ORDER BY day DESC LIMIT ?', (days,)
+                ).fetchall()
+            finally:
+                conn.row_factory = None
+            return [dict(row) for row in rows]
+
+        stats = self._call(job)
+        for row in stats:
+            row["thinking_ms_avg"] = row["thinking_ms_total"] / row["thinking_count"] if row["thinking_count"] else 0.0
+        return stats
 
     # --- LEARNING LOOP ---
     
     def log_chat(self, call_sid: str, role: str, content: str):
         """Logs a chat turn."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('INSERT INTO transcripts (call_sid, role, content, timestamp) VALUES (?, ?, ?, ?)',
-                       (call_sid, role, content, time.time()))
-        conn.commit()
-        conn.close()
+        self._execute('INSERT INTO transcripts (call_sid, role, content, timestamp) VALUES (?, ?, ?, ?)',
+                      (call_sid, role, content, time.time()))
 
     def get_transcript(self, call_sid: str) -> str:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT role, content FROM transcripts WHERE call_sid = ? ORDER BY timestamp ASC', (call_sid,))
-        rows = cursor.fetchall()
-        conn.close()
+        rows = self._call(lambda conn: conn.execute(
+            'SELECT role, content FROM transcripts WHERE call_sid = ? ORDER BY timestamp ASC', (call_sid,)
+        ).fetchall())
         
         transcript = ""
         for role, content in rows:
             transcript += f"{role.upper()}: {content}\n"
         return transcript
 
+    @property
+    def rules_version(self) -> int:
+        """Monotonic counter incremented whenever the injected guidelines change."""
+        return _rules_version
+
     def get_active_rules(self) -> str:
-        """Returns a string list of all learned rules."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT rule_text FROM learned_rules ORDER BY created_at DESC LIMIT 5') # Last 5 rules
-        rows = cursor.fetchall()
-        conn.close()
-        
-        if not rows:
+        """
+        Returns the guidelines block for the root prompt: the best-ranked rules
+        (see rank_rules) that fit in RULES_TOKEN_BUDGET. Blocks on SQLite only when
+        the rules changed since the last ranking.
+        """
+        cached = self._rules_cache
+        if cached and cached[0] == _rules_version:
+            return cached[1]
+
+        version = _rules_version
+        guidelines = self._call(self._render_rules)
+        self._rules_cache = (version, guidelines, time.monotonic())
+        return guidelines
+
+    def rerank_if_due(self):
+        """
+        Re-ranks the rules on the writer thread once RULES_RERANK_INTERVAL has passed.
+        Returns immediately. If the selected guidelines changed, rules_version is bumped
+        so cached agent graphs are rebuilt with them.
+        """
+        cached = self._rules_cache
+        if cached is None or self._rerank_pending or time.monotonic() - cached[2] < RULES_RERANK_INTERVAL:
+            return
+        self._rerank_pending = True
+        self._submit(self._rerank)
+
+    def _rerank(self, conn):
+        try:
+            guidelines = self._render_rules(conn)
+            cached = self._rules_cache
+            if cached is not None and guidelines != cached[1]:
+                _bump_rules_version()
+                logger.info("RL: Rule ranking changed the active guidelines")
+            self._rules_cache = (_rules_version, guidelines, time.monotonic())
+        finally:
+            self._rerank_pending = False
+
+    @classmethod
+    def _render_rules(cls, conn) -> str:
+        selected, used = [], 0
+        for rule in cls._rank(conn):
+            cost = _estimate_tokens(rule["rule_text"]) + 1
+            if used + cost > RULES_TOKEN_BUDGET:
+                continue
+            selected.append(rule["rule_text"])
+            used += cost
+
+        if not selected:
             return ""
-            
-        rules_str = "\n".join([f"- {r[0]}" for r in rows])
+        rules_str = "\n".join([f"- {r}" for r in selected])
         return f"\n\n### LEARNED GUIDELINES (Critically Important):\n{rules_str}\n"
 
+    def rank_rules(self) -> list:
+        """
+        Canonical rules, best first. Each rule is weighed by how the average call score
+        moved after it was introduced (RULE_EFFECT_WINDOW calls either side), shrunk
+        towards 0 while few calls have seen it, plus a bonus for rules many failures
+        converged on. Untested rules therefore rank above rules that made things worse.
+        """
+        return self._call(self._rank)
+
+    @staticmethod
+    def _rank(conn) -> list:
+        # One grouped query: every canonical rule joined to the RULE_EFFECT_WINDOW calls
+        # just before (side 0) and just after (side 1) its introduction
+        rows = conn.execute('''
+            WITH windowed AS (
+                SELECT r.id AS rule_id, c.total_score AS score, c.start_time >= r.created_at AS side,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY r.id, c.start_time >= r.created_at
+                           ORDER BY CASE WHEN c.start_time < r.created_at THEN c.start_time END DESC,
+                                    c.start_time ASC
+                       ) AS n
+                FROM learned_rules r JOIN calls c ON c.start_time IS NOT NULL
+                WHERE r.cluster_id IS NULL
+            )
+            SELECT r.id, r.rule_text, r.created_at, r.merged_count,
+                   AVG(CASE WHEN w.side = 0 THEN w.score END), COUNT(CASE WHEN w.side = 0 THEN 1 END),
+                   AVG(CASE WHEN w.side = 1 THEN w.score END), COUNT(CASE WHEN w.side = 1 THEN 1 END)
+            FROM learned_rules r
+            LEFT JOIN windowed w ON w.rule_id = r.id AND w.n <= ?
+            WHERE r.cluster_id IS NULL
+            GROUP BY r.id
+            ORDER BY r.created_at DESC
+        ''', (RULE_EFFECT_WINDOW,)).fetchall()
+        ranked = []
+        for rule_id, rule_text, created_at, merged_count, before_avg, before_n, after_avg, after_n in rows:
+            effect = 0.0
+            if before_n and after_n:
+                effect = (after_avg - before_avg) * after_n / (after_n + RULE_EFFECT_PRIOR)
+            weight = effect + RULE_SUPPORT_BONUS * math.log2(merged_count or 1)
+            ranked.append({
+                "id": rule_id, "rule_text": rule_text, "created_at": created_at,
+                "merged_count": merged_count or 1, "effect": effect, "calls_after": after_n,
+                "weight": weight,
+            })
+        # Stable sort: newest first among equal weights
+        ranked.sort(key=lambda rule: rule["weight"], reverse=True)
+        return ranked
+
     def analyze_and_learn(self, call_sid: str):
         """
         Reflects on a specific call using an LLM to generate granular rules.
         Falls back to generic rule if API quota is exceeded.
+        Live calls go through the ReflectionWorker queue instead; this is the one-off path.
         """
         # 1. Check Score
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT total_score FROM calls WHERE call_sid = ?', (call_sid,))
-        row = cursor.fetchone()
-        conn.close()
+        row = self._call(lambda conn: conn.execute(
+            'SELECT total_score FROM calls WHERE call_sid = ?', (call_sid,)
+        ).fetchone())
         
         if not row or row[0] >= 0:
             logger.info(f"RL: Call {call_sid} score {row[0] if row else 'NA'} is positive. No learning needed.")
             return
 
         logger.info(f"RL: Analyzing failed call {call_sid} (Score: {row[0]})...")
-        
-        # 2. Get Transcript
-        transcript = self.get_transcript(call_sid)
-        if not transcript:
-            logger.warning("RL: No transcript found for analysis.")
-            return
-            
-        # 3. Prompt Judge
         try:
-            # Use configured model or fallback to environment
-            model_name = os.environ.get("RL_GEMINI_MODEL") or os.environ.get("GOOGLE_GENAI_MODEL", "gemini-2.0-flash")
-            model = genai.GenerativeModel(model_name)
-            
-            prompt = f"""
-            You are a Senior Supervisor for a Customer Support AI.
-            The following call ended in failure (User Hangup or Frustration).
-            
-            TRANSCRIPT:
-            {transcript}
-            
-            Valid Tools available to the agent: [check_balance, process_payment, check_outage, run_diagnostics, escalate_to_human].
-            
-            TASK:
-            Identify the ONE critical mistake the agent made (e.g., bad routing, hallucinations, verbosity).
-            Write a SINGLE, concise system prompt instruction to prevent this in the future.
-            Start the rule with "IF" or "ALWAYS" or "NEVER".
-            Do not provide explanations, JUST the rule.
-            
-            Example: "IF user mentions 'bill', ALWAYS route to BillingAgent."
-            """
-            
-            response = model.generate_content(prompt)
-            rule = response.text.strip()
-            
-            logger.info(f"RL: Learned New Rule: {rule}")
-            self._save_rule(rule, call_sid)
-            
+            self.reflect([call_sid])
         except Exception as e:
-            error_str = str(e)
-            print(f"CRITICAL RL FAILURE: {e}")
             logger.error(f"RL: Learning failed: {e}")
-            
-            # Fallback: Insert generic rule if quota exceeded
-            if "429" in error_str or "quota" in error_str.lower() or "RESOURCE_EXHAUSTED" in error_str:
-                logger.warning("RL: API quota exceeded, using fallback rule.")
-                fallback_rule = "IF call processing takes longer than 15 seconds, optimize response time and reduce complexity."
-                self._save_rule(fallback_rule, call_sid, is_fallback=True)
-            
+            if is_quota_error(e):
+                self.save_fallback_rule(call_sid)
+
+    def reflect(self, call_sids: List[str], judge=None) -> list:
+        """
+        Asks the judge for one rule per failed call, with all transcripts in a single prompt.
+        Returns the [(call_sid, rule)] pairs saved. Judge errors propagate to the caller.
+        """
+        transcripts = [(sid, self.get_transcript(sid)) for sid in call_sids]
+        transcripts = [(sid, text) for sid, text in transcripts if text]
+        if not transcripts:
+            logger.warning(f"RL: No transcript found for analysis of {call_sids}.")
+            return []
+
+        response = (judge or self._judge)(self._judge_prompt([text for _, text in transcripts]))
+        rules = self._parse_rules(response, [sid for sid, _ in transcripts])
+        for sid, rule in rules:
+            logger.info(f"RL: Learned New Rule from {sid}: {rule}")
+            self._save_rule(rule, sid)
+        return rules
+
+    @staticmethod
+    def _judge(prompt: str) -> str:
+        # Use configured model or fallback to environment
+        model_name = os.environ.get("RL_GEMINI_MODEL") or os.environ.get("GOOGLE_GENAI_MODEL", "gemini-2.0-flash")
+        model = genai.GenerativeModel(model_name)
+        return model.generate_content(prompt).text
+
+    @staticmethod
+    def _judge_prompt(transcripts: List[str]) -> str:
+        calls = "\n".join(
+            f"--- CALL {i} ---\n{transcript}" for i, transcript in enumerate(transcripts, start=1)
+        )
+        return f"""
+        You are a Senior Supervisor for a Customer Support AI.
+        The following {len(transcripts)} call(s) ended in failure (User Hangup or Frustration).
+
+        {calls}
+
+        Valid Tools available to the agent: [check_balance, process_payment, check_outage, run_diagnostics, escalate_to_human].
+
+        TASK:
+        For EACH call, identify the ONE critical mistake the agent made (e.g., bad routing, hallucinations, verbosity).
+        Write a SINGLE, concise system prompt instruction to prevent it in the future.
+        Start each rule with "IF" or "ALWAYS" or "NEVER".
+        Answer with exactly one line per call in the form "CALL <number>: <rule>".
+        Do not provide explanations, JUST the rules.
+
+        Example: "CALL 1: IF user mentions 'bill', ALWAYS route to BillingAgent."
+        """
+
+    @staticmethod
+    def _parse_rules(response: str, call_sids: List[str]) -> list:
+        """'CALL n: rule' lines -> [(call_sid, rule)]. A bare answer counts for a single call."""
+        rules = []
+        for match in _JUDGE_LINE.finditer(response or ""):
+            index = int(match.group(1)) - 1
+            rule = match.group(2).strip().strip('"').strip()
+            if 0 <= index < len(call_sids) and rule:
+                rules.append((call_sids[index], rule))
+        if not rules and len(call_sids) == 1 and (response or "").strip():
+            rules.append((call_sids[0], response.strip().strip('"').strip()))
+        return rules
+
+    def save_fallback_rule(self, call_sid: str):
+        """Generic latency rule used when the judge is out of quota."""
+        logger.warning("RL: API quota exceeded, using fallback rule.")
+        self._save_rule(FALLBACK_RULE, call_sid, is_fallback=True)
+
+    # --- REFLECTION JOB QUEUE (persisted in reflection_jobs) ---
+
+    def enqueue_reflection(self, call_sid: str):
+        """Queues a finished call for reflection. Calls that end up scoring >= 0 are skipped at claim time."""
+        now = time.time()
+        self._execute(
+            'INSERT OR IGNORE INTO reflection_jobs (call_sid, status, attempts, next_attempt_at, created_at, updated_at) '
+            'VALUES (?, ?, 0, ?, ?, ?)', (call_sid, "PENDING", now, now, now)
+        )
+
+    def claim_reflection_jobs(self, limit: int) -> List[str]:
+        """
+        Marks up to `limit` due jobs of failed calls RUNNING and returns their call_sids.
+        Due jobs whose call scored >= 0 are marked SKIPPED on the way.
+        """
+        def job(conn):
+            now = time.time()
+            claimed = []
+            rows = conn.execute(
+                'SELECT j.call_sid, c.total_score FROM reflection_jobs j LEFT JOIN calls c ON c.call_sid = j.call_sid '
+                "WHERE j.status = 'PENDING' AND j.next_attempt_at <= ? ORDER BY j.next_attempt_at",
+                (now,)
+            ).fetchall()
+            for call_sid, score in rows:
+                if len(claimed) >= limit:
+                    break
+                if score is None or score >= 0:
+                    conn.execute("UPDATE reflection_jobs SET status = 'SKIPPED', updated_at = ? WHERE call_sid = ?",
+                                 (now, call_sid))
+                    continue
+                conn.execute(
+                    "UPDATE reflection_jobs SET status = 'RUNNING', attempts = attempts + 1, updated_at = ? "
+                    "WHERE call_sid = ?", (now, call_sid)
+                )
+                claimed.append(call_sid)
+            return claimed
+        return self._call(job)
+
+    def complete_reflection_jobs(self, call_sids: List[str], status: str = "DONE", error: str = None):
+        now = time.time()
+        for call_sid in call_sids:
+            self._execute('UPDATE reflection_jobs SET status = ?, last_error = ?, updated_at = ? WHERE call_sid = ?',
+                          (status, error, now, call_sid))
+
+    def retry_reflection_jobs(self, call_sids: List[str], error: str, base_delay: float,
+                              max_delay: float, max_attempts: int) -> List[str]:
+        """Puts failed jobs back with exponential backoff; returns those that ran out of attempts."""
+        def job(conn):
+            now = time.time()
+            exhausted = []
+            for call_sid in call_sids:
+                row = conn.execute('SELECT attempts FROM reflection_jobs WHERE call_sid = ?', (call_sid,)).fetchone()
+                attempts = row[0] if row else max_attempts
+                if attempts >= max_attempts:
+                    conn.execute("UPDATE reflection_jobs SET status = 'FAILED', last_error = ?, updated_at = ? "
+                                 "WHERE call_sid = ?", (error, now, call_sid))
+                    exhausted.append(call_sid)
+                    continue
+                delay = min(max_delay, base_delay * 2 ** (attempts - 1))
+                conn.execute(
+                    "UPDATE reflection_jobs SET status = 'PENDING', next_attempt_at = ?, last_error = ?, updated_at = ? "
+                    "WHERE call_sid = ?", (now + delay, error, now, call_sid)
+                )
+            return exhausted
+        return self._call(job)
+
+    def requeue_running_reflections(self) -> int:
+        """Jobs left RUNNING by a previous process (crash/restart) become PENDING again."""
+        return self._call(lambda conn: conn.execute(
+            "UPDATE reflection_jobs SET status = 'PENDING', updated_at = ? WHERE status = 'RUNNING'", (time.time(),)
+        ).rowcount)
+
+    def reflection_counts(self) -> dict:
+        rows = self._call(lambda conn: conn.execute(
+            'SELECT status, COUNT(*) FROM reflection_jobs GROUP BY status'
+        ).fetchall())
+        return dict(rows)
+
     def _save_rule(self, rule_text: str, call_sid: str, is_fallback: bool = False):
-        """Save a rule to the database, avoiding duplicates."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Check if this exact rule already exists
-        cursor.execute('SELECT id FROM learned_rules WHERE rule_text = ?', (rule_text,))
-        if cursor.fetchone():
+        """
+        Save a rule to the database, avoiding duplicates.
+        A near-duplicate of an existing rule is stored as a member of that rule's cluster
+        (kept for provenance, never injected) and strengthens the canonical rule instead.
+        """
+        signature = minhash(rule_text)
+
+        def insert_rule(conn):
+            cursor = conn.cursor()
+
+            # Check if this exact rule already exists
+            cursor.execute('SELECT id FROM learned_rules WHERE rule_text = ?', (rule_text,))
+            if cursor.fetchone():
+                return "duplicate"
+
+            # Only rules saying the same kind of thing about the same tools/agents can absorb this one
+            canonical = [(rule_id, json.loads(sig)) for rule_id, text, sig in cursor.execute(
+                'SELECT id, rule_text, signature FROM learned_rules WHERE cluster_id IS NULL AND signature IS NOT NULL'
+            ).fetchall() if compatible(text, rule_text)]
+            match_id, score = most_similar(signature, canonical)
+            cluster_id = match_id if score >= RULE_SIMILARITY_THRESHOLD else None
+
+            # Insert new rule
+            cursor.execute('INSERT INTO learned_rules (rule_text, source_call_sid, created_at, signature, cluster_id) '
+                           'VALUES (?, ?, ?, ?, ?)',
+                           (rule_text, call_sid, datetime.now(), json.dumps(signature), cluster_id))
+            if cluster_id is not None:
+                cursor.execute('UPDATE learned_rules SET merged_count = merged_count + 1 WHERE id = ?', (cluster_id,))
+                return "merged"
+            return "new"
+
+        outcome = self._call(insert_rule)
+        if outcome == "duplicate":
             logger.info(f"RL: Rule already exists, skipping duplicate: {rule_text[:50]}...")
-            conn.close()
             return
-            
-        # Insert new rule
-        cursor.execute('INSERT INTO learned_rules (rule_text, source_call_sid, created_at) VALUES (?, ?, ?)',
-                       (rule_text, call_sid, datetime.now()))
-        conn.commit()
-        conn.close()
-        
+
+        # Commit before invalidating, so rebuilt graphs (possibly on another connection) see the rule.
+        # A merge changes no text but raises the canonical rule's support, which can reorder the selection.
+        self.flush()
+        _bump_rules_version()
+
+        if outcome == "merged":
+            logger.info(f"RL: Near-duplicate rule merged into existing cluster: {rule_text[:50]}...")
+            return
         logger.info(f"RL: {'Fallback' if is_fallback else 'Learned'} rule saved: {rule_text[:50]}...")
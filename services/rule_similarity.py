@@ -0,0 +1,75 @@
+import random
+import re
+import zlib
+
+# Signature length: similarity estimates have a standard error of ~sqrt(J(1-J)/NUM_PERM)
+NUM_PERM = 64
+# Longest run of consecutive content words used as a shingle
+SHINGLE_SIZE = 2
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed seed so signatures stored in SQLite stay comparable across restarts
+_rng = random.Random(1337)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_NON_WORD = re.compile(r"[^a-z0-9' ]+")
+
+# Words that carry no instruction, dropped before shingling
+_STOPWORDS = frozenset("a an the their his her its to of if when is are be for in on at and or with that this".split())
+# Words that flip or pin an instruction: rules that differ in them are never merged
+_POLARITY = {"always": "always", "never": "never", "not": "not", "no": "not", "dont": "not", "doesnt": "not",
+             "cant": "not", "cannot": "not", "avoid": "avoid", "only": "only", "must": "must"}
+_NUMBER_WORDS = frozenset("zero one two three four five six seven eight nine ten once twice".split())
+# Tool (check_outage) and agent (BillingAgent) names, read from the raw text
+_NAME = re.compile(r"\b[a-z]+(?:_[a-z0-9]+)+\b|\b[A-Z][a-z]+(?:[A-Z][a-z]+)*Agent\b")
+
+def normalize_rule(text: str) -> str:
+    """Lowercase, punctuation and quotes stripped, whitespace collapsed."""
+    text = _NON_WORD.sub(" ", (text or "").lower().replace("'", ""))
+    return " ".join(text.split())
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Content words of the normalized rule, plus runs of up to `size` consecutive ones."""
+    words = [word for word in normalize_rule(text).split() if word not in _STOPWORDS]
+    grams = set(words)
+    for n in range(2, size + 1):
+        grams.update(" ".join(words[i:i + n]) for i in range(len(words) - n + 1))
+    return grams
+
+def instruction_terms(text: str) -> tuple:
+    """(polarity words, tool/agent names, numbers) of a rule."""
+    words = normalize_rule(text).split()
+    polarity = frozenset(_POLARITY[word] for word in words if word in _POLARITY)
+    numbers = frozenset(word for word in words if word in _NUMBER_WORDS or word.isdigit())
+    names = frozenset(name.lower() for name in _NAME.findall(text or ""))
+    return polarity, names, numbers
+
+def compatible(text_a: str, text_b: str) -> bool:
+    """
+    False when two rules differ in polarity (always/never/don't), in the tools or agents
+    they name, or in a number. Such rules can read alike and still say opposite things.
+    """
+    return instruction_terms(text_a) == instruction_terms(text_b)
+
+def minhash(text: str) -> list:
+    """MinHash signature of the rule's shingles."""
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles(text)]
+    if not hashes:
+        return [_MAX_HASH] * NUM_PERM
+    return [min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes) for a, b in _PERMUTATIONS]
+
+def similarity(sig_a: list, sig_b: list) -> float:
+    """Estimated Jaccard similarity of the two shingle sets."""
+    if not sig_a or len(sig_a) != len(sig_b):
+        return 0.0
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+def most_similar(signature: list, candidates) -> tuple:
+    """(best_id, best_similarity) over an iterable of (id, signature) pairs."""
+    best_id, best = None, 0.0
+    for candidate_id, candidate_sig in candidates:
+        score = similarity(signature, candidate_sig)
+        if score > best:
+            best_id, best = candidate_id, score
+    return best_id, best
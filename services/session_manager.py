@@ -0,0 +1,187 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from services.history_compactor import HistoryCompactor, HistoryState
+
+logger = logging.getLogger("SessionManager")
+
+SESSION_TTL = float(os.environ.get("SESSION_TTL", 1800))
+SESSION_MAX_COUNT = int(os.environ.get("SESSION_MAX_COUNT", 5000))
+SESSION_MAX_BYTES = int(os.environ.get("SESSION_MAX_BYTES", 256 * 1024 * 1024))
+
+class _SessionRecord:
+    __slots__ = ("session_id", "last_seen", "event_count", "bytes_held", "history")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.last_seen = time.monotonic()
+        self.event_count = 0
+        self.bytes_held = 0
+        self.history = HistoryState()
+
+class SessionManager:
+    """
+    Bounded lifecycle for voice sessions.
+
+    Owns the caller -> ADK session map, the pending-input stash and per-call turn
+    counters, and removes the matching InMemorySessionService entries when a call
+    completes, a session idles past its TTL, or the count/byte caps are exceeded
+    (least recently used first).
+    """
+
+    def __init__(self, session_service, app_name: str = "voice-agent",
+                 ttl_seconds: float = SESSION_TTL, max_sessions: int = SESSION_MAX_COUNT,
+                 max_bytes: int = SESSION_MAX_BYTES, compactor: HistoryCompactor = None):
+        self.session_service = session_service
+        self.app_name = app_name
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.compactor = compactor or HistoryCompactor()
+
+        # user_id -> _SessionRecord, least recently used first
+        self._sessions = OrderedDict()
+        # user_id -> (text, turn), stashed between /gather_speech and /process_speech
+        self.pending_inputs = {}
+        # call_sid -> user_id / turn counter
+        self._call_users = {}
+        self._call_turns = {}
+        self._bytes_held = 0
+        self.evictions = 0
+
+    # --- Sessions ---
+
+    async def get_or_create(self, user_id: str) -> str:
+        """Returns the caller's session id, creating the ADK session if needed."""
+        record = self._sessions.get(user_id)
+        if record is not None:
+            record.last_seen = time.monotonic()
+            self._sessions.move_to_end(user_id)
+            logger.info(f"Resuming session: {record.session_id}")
+            await self.sweep()
+            return record.session_id
+
+        logger.info("Creating new session...")
+        session = await self.session_service.create_session(
+            app_name=self.app_name,
+            user_id=user_id
+        )
+        self._sessions[user_id] = _SessionRecord(session.id)
+        logger.info(f"Created new session: {session.id}")
+        # The new session is most recently used, so the sweep never evicts it
+        await self.sweep()
+        return session.id
+
+    def get_session_id(self, user_id: str):
+        record = self._sessions.get(user_id)
+        return record.session_id if record else None
+
+    def stored_session(self, user_id: str):
+        """
+        Returns the live ADK Session object for the caller (not a copy), or None.
+        InMemorySessionService keeps sessions in a nested dict; get_session() deep-copies.
+        """
+        record = self._sessions.get(user_id)
+        if record is None:
+            return None
+        sessions = getattr(self.session_service, "sessions", {})
+        return sessions.get(self.app_name, {}).get(user_id, {}).get(record.session_id)
+
+    def compact(self, user_id: str) -> bool:
+        """Keeps the caller's history under the compactor's token budget (before each turn)."""
+        record = self._sessions.get(user_id)
+        session = self.stored_session(user_id)
+        if record is None or session is None:
+            return False
+        if not self.compactor.compact(session, record.history):
+            return False
+        # Byte gauge: recount the compacted history on the next account()
+        self._bytes_held -= record.bytes_held
+        record.bytes_held = 0
+        record.event_count = 0
+        return True
+
+    def history_tokens(self, user_id: str) -> int:
+        record = self._sessions.get(user_id)
+        return record.history.total if record else 0
+
+    def account(self, user_id: str):
+        """Adds the size of events appended since the last call to the byte gauge."""
+        record = self._sessions.get(user_id)
+        if record is None:
+            return
+        session = self.stored_session(user_id)
+        if session is None:
+            return
+        events = session.events
+        if len(events) < record.event_count:
+            # History was compacted; recount from scratch
+            self._bytes_held -= record.bytes_held
+            record.bytes_held = 0
+            record.event_count = 0
+        added = sum(len(event.model_dump_json(exclude_none=True)) for event in events[record.event_count:])
+        record.event_count = len(events)
+        record.bytes_held += added
+        self._bytes_held += added
+
+    async def evict(self, user_id: str):
+        """Drops the caller's session and stashed input."""
+        record = self._sessions.pop(user_id, None)
+        self.pending_inputs.pop(user_id, None)
+        if record is None:
+            return
+        self._bytes_held -= record.bytes_held
+        self.evictions += 1
+        try:
+            await self.session_service.delete_session(
+                app_name=self.app_name, user_id=user_id, session_id=record.session_id
+            )
+            # Don't leave an empty per-user dict behind in the in-memory service
+            sessions = getattr(self.session_service, "sessions", {}).get(self.app_name, {})
+            if user_id in sessions and not sessions[user_id]:
+                del sessions[user_id]
+        except Exception as e:
+            logger.warning(f"Failed to delete session {record.session_id}: {e}")
+
+    async def sweep(self):
+        """Evicts idle sessions past the TTL, then LRU entries over the count/byte caps."""
+        now = time.monotonic()
+        while self._sessions:
+            user_id, record = next(iter(self._sessions.items()))
+            expired = now - record.last_seen > self.ttl_seconds
+            over_cap = len(self._sessions) > self.max_sessions or self._bytes_held > self.max_bytes
+            if not (expired or over_cap):
+                break
+            logger.info(f"Evicting session {record.session_id} ({'expired' if expired else 'over cap'})")
+            await self.evict(user_id)
+
+    # --- Calls ---
+
+    def bind_call(self, call_sid: str, user_id: str):
+        if call_sid:
+            self._call_users[call_sid] = user_id
+
+    def next_turn(self, call_sid: str) -> int:
+        turn = self._call_turns.get(call_sid, 0) + 1
+        self._call_turns[call_sid] = turn
+        return turn
+
+    async def end_call(self, call_sid: str):
+        """Cleans up everything held for a finished call."""
+        self._call_turns.pop(call_sid, None)
+        user_id = self._call_users.pop(call_sid, None)
+        if user_id is not None:
+            await self.evict(user_id)
+
+    # --- Gauges ---
+
+    def stats(self) -> dict:
+        return {
+            "live_sessions": len(self._sessions),
+            "live_calls": len(self._call_users),
+            "pending_inputs": len(self.pending_inputs),
+            "bytes_held": self._bytes_held,
+            "evictions": self.evictions,
+        }
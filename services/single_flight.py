@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("SingleFlight")
+
+class SingleFlight:
+    """
+    Coalesces concurrent or duplicate executions for the same key into one.
+    Completed results are kept for result_ttl seconds so late retries (e.g. Twilio
+    re-posting a webhook) are answered from the first execution instead of re-running it.
+    Failed executions are forgotten so a retry can run again.
+    """
+
+    def __init__(self, result_ttl: float = 120, max_entries: int = 4096):
+        self.result_ttl = result_ttl
+        self.max_entries = max_entries
+        # key -> (future, finished_at or None)
+        self._flights = OrderedDict()
+        self.executions = 0
+        self.coalesced = 0
+
+    def _purge(self):
+        now = time.monotonic()
+        expired = [key for key, (_, finished_at) in self._flights.items()
+                   if finished_at is not None and now - finished_at > self.result_ttl]
+        for key in expired:
+            del self._flights[key]
+        # Bound memory: drop the oldest completed flights first
+        while len(self._flights) > self.max_entries:
+            for key, (_, finished_at) in self._flights.items():
+                if finished_at is not None:
+                    del self._flights[key]
+                    break
+            else:
+                break
+
+    def submit(self, key, fn, *args, **kwargs):
+        """
+        Starts fn(*args, **kwargs) as a task unless key is already in flight (or just finished).
+        Returns (future, coalesced).
+        """
+        self._purge()
+
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            logger.info(f"Coalesced duplicate execution for {key}")
+            return flight[0], True
+
+        task = asyncio.ensure_future(fn(*args, **kwargs))
+        self._flights[key] = (task, None)
+        self.executions += 1
+
+        def _on_done(fut):
+            if self._flights.get(key, (None,))[0] is not fut:
+                return
+            if fut.cancelled() or fut.exception() is not None:
+                del self._flights[key]
+            else:
+                self._flights[key] = (fut, time.monotonic())
+
+        task.add_done_callback(_on_done)
+        return task, False
+
+    async def do(self, key, fn, *args, **kwargs):
+        """Runs fn once per key and returns its result to every caller."""
+        future, _ = self.submit(key, fn, *args, **kwargs)
+        # Shield so one caller disconnecting does not cancel the shared execution
+        return await asyncio.shield(future)
+
+    def is_active(self, key) -> bool:
+        """True if key is in flight or finished within the TTL."""
+        self._purge()
+        return key in self._flights
+
+    def stats(self) -> dict:
+        in_flight = sum(1 for _, finished_at in self._flights.values() if finished_at is None)
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": in_flight,
+        }
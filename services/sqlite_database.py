@@ -0,0 +1,219 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from services.database import (
+    Database, TICKET_ID_PREFIX, PAYMENT_IDEMPOTENCY_TTL,
+    _memo_get_user, _memo_set_user, _memo_drop, _MISSING, _pick,
+)
+
+SQLITE_DB_PATH = os.environ.get("SQLITE_DB_PATH", "voice_agent.db")
+
+# Columns of the users table; every other attribute lives in the JSON profile
+_USER_COLUMNS = ("region", "balance")
+
+class SQLiteDatabase(Database):
+    """
+    Embedded storage backend (DB_BACKEND=sqlite) for single-node deployments.
+
+    Same operations and semantics as RedisDatabase without the network hop:
+    one WAL-mode connection per thread (readers never block the writer), and every
+    write runs in a BEGIN IMMEDIATE transaction, which gives the atomicity the
+    Redis backend gets from its Lua scripts.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, db_path: str = SQLITE_DB_PATH):
+        super().__init__()
+        self.db_path = db_path
+        self._local = threading.local()
+        self._create_schema()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode: transactions are opened explicitly by _transaction()
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _create_schema(self):
+        with self._transaction() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS users (
+                user_id TEXT PRIMARY KEY, region TEXT, balance REAL NOT NULL DEFAULT 0,
+                profile TEXT NOT NULL DEFAULT '{}')''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_users_region ON users (region, user_id)')
+            conn.execute('CREATE TABLE IF NOT EXISTS network_status (region TEXT PRIMARY KEY, status TEXT NOT NULL)')
+            conn.execute('''CREATE TABLE IF NOT EXISTS tickets (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT, ticket_id TEXT UNIQUE, user_id TEXT NOT NULL,
+                reason TEXT, status TEXT NOT NULL DEFAULT 'OPEN', created_at REAL, resolved_at REAL)''')
+            # At most one open ticket per caller, found by index
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tickets_open_user ON tickets (user_id) WHERE status = 'OPEN'")
+            conn.execute('''CREATE TABLE IF NOT EXISTS ledger (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, type TEXT NOT NULL,
+                transaction_id TEXT, amount REAL, balance REAL, idempotency_key TEXT, created_at REAL)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_ledger_user ON ledger (user_id, id)')
+            conn.execute('''CREATE TABLE IF NOT EXISTS payment_keys (
+                key TEXT PRIMARY KEY, transaction_id TEXT NOT NULL, balance REAL NOT NULL, expires_at REAL NOT NULL)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_payment_keys_expiry ON payment_keys (expires_at)')
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- Users ---
+
+    def get_user(self, user_id: str, fields: list = None):
+        key = f"user:{user_id}"
+        cached = _memo_get_user(key, fields)
+        if cached is not _MISSING:
+            return cached
+
+        row = self._conn().execute(
+            'SELECT region, balance, profile FROM users WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        user = None
+        if row is not None:
+            user = json.loads(row["profile"])
+            if row["region"] is not None:
+                user["region"] = row["region"]
+            user["balance"] = float(row["balance"])
+        # A local row read is cheap: always read it whole, memoize it whole
+        _memo_set_user(key, user)
+        return _pick(user, fields)
+
+    def upsert_user(self, user_id: str, user: dict):
+        _memo_drop(f"user:{user_id}")
+        profile = {field: value for field, value in user.items() if field not in _USER_COLUMNS}
+        with self._transaction() as conn:
+            conn.execute(
+                '''INSERT INTO users (user_id, region, balance, profile) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (user_id) DO UPDATE SET
+                   region = excluded.region, balance = excluded.balance, profile = excluded.profile''',
+                (user_id, user.get("region"), float(user.get("balance", 0) or 0), json.dumps(profile)),
+            )
+        return True
+
+    def users_in_region(self, region: str, page_size: int = 1000):
+        """Iterates a region's user ids in keyset-paginated pages of page_size."""
+        last = ""
+        while True:
+            rows = self._conn().execute(
+                'SELECT user_id FROM users WHERE region = ? AND user_id > ? ORDER BY user_id LIMIT ?',
+                (region, last, page_size),
+            ).fetchall()
+            for row in rows:
+                yield row["user_id"]
+            if len(rows) < page_size:
+                return
+            last = rows[-1]["user_id"]
+
+    def region_user_count(self, region: str) -> int:
+        return self._conn().execute('SELECT COUNT(*) FROM users WHERE region = ?', (region,)).fetchone()[0]
+
+    # --- Payments ---
+
+    def apply_payment(self, user_id: str, amount: float, transaction_id: str, idempotency_key: str = None):
+        _memo_drop(f"user:{user_id}")
+        now = time.time()
+        with self._transaction() as conn:
+            if idempotency_key:
+                prior = conn.execute(
+                    'SELECT transaction_id, balance FROM payment_keys WHERE key = ? AND expires_at > ?',
+                    (idempotency_key, now),
+                ).fetchone()
+                if prior is not None:
+                    return {"transaction_id": prior["transaction_id"], "remaining_balance": prior["balance"], "replayed": True}
+
+            row = conn.execute('SELECT balance FROM users WHERE user_id = ?', (user_id,)).fetchone()
+            if row is None:
+                return None
+            balance = max(0.0, float(row["balance"]) - amount)
+            conn.execute('UPDATE users SET balance = ? WHERE user_id = ?', (balance, user_id))
+            conn.execute(
+                '''INSERT INTO ledger (user_id, type, transaction_id, amount, balance, idempotency_key, created_at)
+                   VALUES (?, 'payment', ?, ?, ?, ?, ?)''',
+                (user_id, transaction_id, amount, balance, idempotency_key or "", now),
+            )
+            if idempotency_key:
+                conn.execute('DELETE FROM payment_keys WHERE expires_at <= ?', (now,))
+                conn.execute(
+                    'INSERT OR REPLACE INTO payment_keys (key, transaction_id, balance, expires_at) VALUES (?, ?, ?, ?)',
+                    (idempotency_key, transaction_id, balance, now + PAYMENT_IDEMPOTENCY_TTL),
+                )
+        return {"transaction_id": transaction_id, "remaining_balance": balance, "replayed": False}
+
+    def get_ledger(self, user_id: str, count: int = 20) -> list:
+        rows = self._conn().execute(
+            '''SELECT id, type, transaction_id, amount, balance, idempotency_key, created_at
+               FROM ledger WHERE user_id = ? ORDER BY id DESC LIMIT ?''',
+            (user_id, count),
+        ).fetchall()
+        return [dict(row, entry_id=row["id"]) for row in rows]
+
+    # --- Network status ---
+
+    def set_network_status(self, region: str, status: str):
+        with self._transaction() as conn:
+            row = conn.execute('SELECT status FROM network_status WHERE region = ?', (region,)).fetchone()
+            conn.execute('INSERT OR REPLACE INTO network_status (region, status) VALUES (?, ?)', (region, status))
+        self._status_changed(region, row["status"] if row else None, status)
+
+    def get_network_status(self, region: str):
+        row = self._conn().execute('SELECT status FROM network_status WHERE region = ?', (region,)).fetchone()
+        return row["status"] if row else "Unknown"
+
+    # --- Tickets ---
+
+    def create_tickets(self, tickets: list) -> list:
+        """Bulk ticket creation in one transaction. A caller with an open ticket gets that id back."""
+        ids = []
+        now = time.time()
+        with self._transaction() as conn:
+            for user_id, reason in tickets:
+                row = conn.execute(
+                    "SELECT ticket_id FROM tickets WHERE user_id = ? AND status = 'OPEN'", (user_id,)
+                ).fetchone()
+                if row is not None:
+                    ids.append(row["ticket_id"])
+                    continue
+                seq = conn.execute(
+                    'INSERT INTO tickets (user_id, reason, created_at) VALUES (?, ?, ?)', (user_id, reason, now)
+                ).lastrowid
+                ticket_id = f"{TICKET_ID_PREFIX}{seq:06d}"
+                conn.execute('UPDATE tickets SET ticket_id = ? WHERE seq = ?', (ticket_id, seq))
+                ids.append(ticket_id)
+        return ids
+
+    def get_open_ticket(self, user_id: str):
+        row = self._conn().execute(
+            "SELECT ticket_id FROM tickets WHERE user_id = ? AND status = 'OPEN'", (user_id,)
+        ).fetchone()
+        return row["ticket_id"] if row else None
+
+    def resolve_ticket(self, ticket_id: str, status: str = "RESOLVED"):
+        """Closes a ticket (the Redis backend does this through EscalationQueue.resolve)."""
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE tickets SET status = ?, resolved_at = ? WHERE ticket_id = ?', (status, time.time(), ticket_id)
+            )
@@ -0,0 +1,26 @@
+import os
+import tempfile
+
+import pytest
+
+# Modules that create the shared RLService at import time (agents.agent_factory) must not
+# write the developer's call_metrics.db: point it at a throwaway file before they load.
+os.environ["RL_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="voice-tests-"), "call_metrics.db")
+
+from services.rl_service import RLService
+
+@pytest.fixture
+def rl(tmp_path):
+    service = RLService(db_path=str(tmp_path / "metrics.db"))
+    yield service
+    service.close()
+
+@pytest.fixture
+def scored_calls(rl):
+    """scored_calls(prefix, score, n): records n finished calls scored `score`, then flushes."""
+    def add(prefix: str, score: int, n: int):
+        for i in range(n):
+            rl.start_call(f"{prefix}{i}")
+            rl._add_score(f"{prefix}{i}", score, "TEST")
+        rl.flush()
+    return add
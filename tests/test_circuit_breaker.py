@@ -0,0 +1,54 @@
+import time
+
+from utils.circuit_breaker import CircuitBreaker
+
+def test_opens_after_threshold_and_probes_with_backoff():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05, max_reset_timeout=0.1)
+
+    breaker.record_failure(ConnectionError("refused"))
+    assert breaker.allow()
+    breaker.record_failure(ConnectionError("refused"))
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # One probe at a time
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # Failed probe: open again, for twice as long
+    breaker.record_failure(ConnectionError("refused"))
+    assert not breaker.allow()
+    assert breaker.retry_in() > 0.05
+
+    time.sleep(0.11)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["opens"] == 1
+
+def test_only_redis_outcomes_reach_the_breaker():
+    import pytest
+    import redis
+    from unittest.mock import MagicMock
+    from services.database import RedisDatabase
+
+    rdb = RedisDatabase(client=MagicMock())
+    rdb.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.01)
+    rdb.breaker.record_failure()
+    rdb.breaker.record_failure()
+    time.sleep(0.02)
+
+    # A bug in the caller during the half-open probe is neither a success nor a failure
+    with pytest.raises(KeyError):
+        rdb._call(MagicMock(side_effect=KeyError("region")))
+    assert rdb.breaker.state == CircuitBreaker.HALF_OPEN
+    # ... and does not hold on to the probe slot
+    assert rdb.breaker.allow()
+    rdb.breaker.abandon()
+
+    # A server error reply proves the connection works
+    with pytest.raises(redis.ResponseError):
+        rdb._call(MagicMock(side_effect=redis.ResponseError("WRONGTYPE")))
+    assert rdb.breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,55 @@
+import pytest
+import redis
+from unittest.mock import MagicMock
+
+from services.escalation_queue import EscalationQueue
+from services.database import ESCALATION_STREAM, OPEN_TICKETS_KEY, TICKETS_KEY, TICKET_ENTRIES_KEY
+
+@pytest.fixture
+def queue():
+    client = MagicMock()
+    return EscalationQueue(client, group="tier2", claim_idle_ms=1000)
+
+def test_read_and_resolve(queue):
+    queue.client.xreadgroup.return_value = [
+        [ESCALATION_STREAM, [("1-0", {"ticket_id": "TICKET-000001", "user_id": "u1", "reason": "angry"})]]
+    ]
+
+    escalation = queue.read("desk-1")[0]
+    assert escalation == {"entry_id": "1-0", "ticket_id": "TICKET-000001", "user_id": "u1", "reason": "angry"}
+    queue.client.xreadgroup.assert_called_once_with("tier2", "desk-1", {ESCALATION_STREAM: ">"}, count=1, block=None)
+
+    queue.resolve(escalation)
+    kwargs = queue._resolve.call_args.kwargs
+    assert kwargs["keys"] == [ESCALATION_STREAM, OPEN_TICKETS_KEY, TICKETS_KEY, TICKET_ENTRIES_KEY]
+    assert kwargs["args"][:5] == ["tier2", "1-0", "TICKET-000001", "u1", "RESOLVED"]
+
+def test_next_prefers_stalled_escalations(queue):
+    # One pending entry was trimmed from the stream (fields None) and is skipped
+    queue.client.xautoclaim.return_value = [
+        "5-0", [("2-0", None), ("3-0", {"ticket_id": "TICKET-000003", "user_id": "u3", "reason": "x"})], ["2-0"]
+    ]
+
+    escalation = queue.next("desk-2")
+    assert escalation["ticket_id"] == "TICKET-000003"
+    queue.client.xreadgroup.assert_not_called()
+    assert queue._reclaim_cursor == "5-0"
+    # The trimmed entry's ticket is closed and its caller's open-ticket slot freed
+    kwargs = queue._drop_trimmed.call_args.kwargs
+    assert kwargs["keys"] == [ESCALATION_STREAM, OPEN_TICKETS_KEY, TICKETS_KEY, TICKET_ENTRIES_KEY]
+    assert kwargs["args"][0] == "tier2" and kwargs["args"][3:] == ["2-0"]
+
+    # Nothing stalled: falls through to new entries
+    queue.client.xautoclaim.return_value = ["0-0", [], []]
+    queue.client.xreadgroup.return_value = []
+    assert queue.next("desk-2") is None
+    queue.client.xreadgroup.assert_called_once()
+    assert queue._drop_trimmed.call_count == 1
+
+def test_ensure_group_is_idempotent(queue):
+    queue.client.xgroup_create.side_effect = redis.ResponseError("BUSYGROUP Consumer Group name already exists")
+    queue.ensure_group()
+
+    queue.client.xgroup_create.side_effect = redis.ResponseError("WRONGTYPE")
+    with pytest.raises(redis.ResponseError):
+        queue.ensure_group()
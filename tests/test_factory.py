@@ -1,13 +1,14 @@
 import pytest
 from agents.agent_factory import create_agent_graph
+from prompts.system_prompts import ROOT_SYSTEM_PROMPT, BILLING_PROMPT
 
 def test_agent_creation():
-    user_id = "+918275267982"
-    root_agent = create_agent_graph(user_id)
+    root_agent = create_agent_graph()
     
     assert root_agent.name == "RootDispatcher"
-    # Check if User ID is injected into instructions
-    assert f"CURRENT USER ID: {user_id}" in root_agent.instruction
+    # Instructions carry no per-user data, so every caller shares the prompt prefix
+    assert "CURRENT USER ID" not in root_agent.instruction
+    assert root_agent.instruction.startswith(ROOT_SYSTEM_PROMPT)
     
     # Check sub-agents
     sub_agents = {agent.name: agent for agent in root_agent.sub_agents}
@@ -15,5 +16,90 @@ def test_agent_creation():
     assert "TechSupportAgent" in sub_agents
     assert "EscalationAgent" in sub_agents
     
-    # Check Sub-Agent Prompt Injection
-    assert f"CURRENT USER ID: {user_id}" in sub_agents["BillingAgent"].instruction
+    # Sub-agent prompts are the static ones
+    assert sub_agents["BillingAgent"].instruction == BILLING_PROMPT
+
+def test_graph_cache_shares_one_runner():
+    from agents.agent_factory import AgentGraphCache
+    from google.adk.sessions.in_memory_session_service import InMemorySessionService
+
+    cache = AgentGraphCache(ttl_seconds=60)
+    sessions = InMemorySessionService()
+
+    runner = cache.get_runner(sessions)
+    assert cache.get_runner(sessions) is runner
+    assert cache.hits == 1 and cache.misses == 1
+
+    # The event-loop fast path: the current runner, or None instead of a rebuild
+    assert cache.current_runner(sessions) is runner
+    assert cache.hits == 2
+
+    cache.ttl_seconds = 0
+    assert cache.current_runner(sessions) is None
+    assert cache.get_runner(sessions) is not runner
+
+def test_graph_cache_invalidated_by_new_rule(tmp_path):
+    from agents import agent_factory
+    from agents.agent_factory import AgentGraphCache
+    from services.rl_service import RLService
+
+    cache = AgentGraphCache()
+    graph = cache.get_graph()
+    assert cache.get_graph() is graph
+
+    rl = RLService(db_path=str(tmp_path / "metrics.db"))
+    rl._save_rule("ALWAYS be brief.", "call_1")
+
+    with_rules = cache.get_graph()
+    assert with_rules is not graph
+    assert agent_factory.rl_service.rules_version == rl.rules_version
+
+def test_server_shares_the_factory_rl_service():
+    import server
+    from agents import agent_factory
+
+    # One writer thread per call_metrics.db
+    assert server.rl_service is agent_factory.rl_service
+
+def test_tools_are_coroutines():
+    import inspect
+    root_agent = create_agent_graph()
+    billing = {agent.name: agent for agent in root_agent.sub_agents}["BillingAgent"]
+
+    names = [tool.__name__ for tool in billing.tools]
+    assert names == ["check_balance", "process_payment"]
+    assert all(inspect.iscoroutinefunction(tool) for tool in billing.tools)
+    # user_id is bound from context, not declared to the model
+    assert list(inspect.signature(billing.tools[1]).parameters) == ["amount", "tool_context"]
+
+def test_tools_read_caller_from_context():
+    import asyncio
+    from unittest.mock import AsyncMock, patch
+    from utils.context import set_user_context
+
+    root_agent = create_agent_graph()
+    billing = {agent.name: agent for agent in root_agent.sub_agents}["BillingAgent"]
+
+    async def turn(user_id):
+        set_user_context(user_id)
+        return await billing.tools[0]()
+
+    with patch("tools.billing_tools.adb", new_callable=AsyncMock) as mock_db:
+        mock_db.get_user.return_value = {"balance": 10.0}
+        asyncio.run(turn("+15550009"))
+    mock_db.get_user.assert_called_once_with("+15550009", fields=["name", "balance"])
+
+def test_tools_fall_back_to_the_adk_session_user():
+    import asyncio
+    from types import SimpleNamespace
+    from unittest.mock import AsyncMock, patch
+
+    root_agent = create_agent_graph()
+    billing = {agent.name: agent for agent in root_agent.sub_agents}["BillingAgent"]
+    # No caller in context (e.g. adk web): the tool context's public user_id is used
+    tool_context = SimpleNamespace(user_id="web-user", invocation_id="e-1")
+
+    with patch("tools.billing_tools.adb", new_callable=AsyncMock) as mock_db:
+        mock_db.get_user.return_value = {"balance": 10.0}
+        asyncio.run(billing.tools[0](tool_context=tool_context))
+    mock_db.get_user.assert_called_once_with("web-user", fields=["name", "balance"])
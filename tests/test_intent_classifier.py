@@ -0,0 +1,56 @@
+import sqlite3
+import time
+from services.intent_classifier import IntentClassifier, load_transcript_examples, has_farewell
+
+def test_seed_model_intents_and_latency():
+    model = IntentClassifier.from_seed()
+    assert model.predict("alright that's all, thanks a lot")[0] == "goodbye"
+    assert model.predict("how much money do I have to pay")[0] == "billing"
+    assert model.predict("my wifi is dead")[0] == "tech"
+    assert model.predict("I want to talk to someone real")[0] == "escalate"
+    assert model.predict("please don't hang up")[0] == "other"
+
+    start = time.perf_counter()
+    for _ in range(100):
+        model.predict("can you tell me why my internet is so slow today")
+    assert (time.perf_counter() - start) / 100 < 0.001
+
+def test_mid_call_thanks_is_not_goodbye():
+    model = IntentClassifier.from_seed()
+    for phrase in ["thanks", "thank you", "okay thank you", "no thanks", "Thank you so much!"]:
+        intent, confidence = model.predict(phrase)
+        assert not (intent == "goodbye" and confidence >= 0.9), (phrase, confidence)
+        assert not has_farewell(phrase)
+
+    # Complaints about dropped calls are not closings
+    for phrase in ["the call keeps hanging up", "why did you end the call last time", "it hangs up on me"]:
+        assert not has_farewell(phrase), phrase
+
+    assert has_farewell("ok thanks, bye")
+    assert has_farewell("no that's it, thank you")
+
+def test_train_from_transcripts_and_roundtrip(tmp_path):
+    db_path = str(tmp_path / "metrics.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE transcripts (id INTEGER PRIMARY KEY, call_sid TEXT, role TEXT, content TEXT, timestamp REAL)")
+    conn.executemany("INSERT INTO transcripts (call_sid, role, content, timestamp) VALUES (?, ?, ?, ?)", [
+        ("CA1", "user", "what do I have left on my account", 1),
+        ("CA1", "assistant", "Your balance is 1245 rupees.", 2),
+        ("CA1", "user", "and is there an outage", 3),
+        ("CA1", "assistant", "No known outages in your area.", 4),
+        ("CA1", "user", "hmm okay", 5),
+    ])
+    conn.commit()
+    conn.close()
+
+    examples = load_transcript_examples(db_path)
+    assert examples == [
+        ("what do I have left on my account", "billing"),
+        ("and is there an outage", "tech"),
+    ]
+
+    model = IntentClassifier().train(examples * 5)
+    path = str(tmp_path / "intent_model.json")
+    model.save(path)
+    loaded = IntentClassifier.load(path)
+    assert loaded.predict("what do I have left on my account")[0] == "billing"
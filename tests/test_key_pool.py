@@ -0,0 +1,91 @@
+import asyncio
+from unittest.mock import patch
+from services.key_pool import ApiKeyPool
+
+class QuotaError(Exception):
+    code = 429
+
+def test_requests_spread_and_exhausted_key_cools_down():
+    async def scenario():
+        pool = ApiKeyPool(["key-aaaa", "key-bbbb"], client_factory=lambda key: key,
+                          rpm=600, burst=2, cooldown_seconds=60, max_wait=0.05)
+
+        first = await pool.acquire()
+        second = await pool.acquire()
+        assert {first.key, second.key} == {"key-aaaa", "key-bbbb"}
+        pool.release(first, error=QuotaError("429 RESOURCE_EXHAUSTED"))
+        pool.release(second)
+
+        # Only the healthy key is handed out while the other cools down
+        for _ in range(2):
+            lease = await pool.acquire()
+            assert lease is second
+            pool.release(lease)
+
+        stats = {s["key"]: s for s in pool.stats()}
+        assert stats["...aaaa"]["exhausted"] == 1
+        assert stats["...aaaa"]["cooldown_remaining"] > 0
+        assert stats["...bbbb"]["requests"] == 3
+
+    asyncio.run(scenario())
+
+def test_pooled_gemini_retries_on_another_key():
+    from agents import pooled_gemini
+
+    class FakeClient:
+        def __init__(self, key):
+            self.key = key
+
+        async def generate_content_async(self, llm_request, stream=False):
+            if self.key == "key-aaaa":
+                raise QuotaError("429 RESOURCE_EXHAUSTED")
+            yield f"reply from {self.key}"
+
+    pool = ApiKeyPool(["key-aaaa", "key-bbbb"], client_factory=FakeClient, rpm=600, burst=1)
+    # Make the exhausted key the first choice
+    pool.leases[1].bucket._tokens = 0.5
+
+    async def scenario():
+        model = pooled_gemini.PooledGemini(model="gemini-2.0-flash")
+        return [r async for r in model.generate_content_async(llm_request=None)]
+
+    with patch.object(pooled_gemini, "key_pool", pool):
+        assert asyncio.run(scenario()) == ["reply from key-bbbb"]
+    assert pool.leases[0].exhausted == 1
+
+def test_lease_is_released_when_upstream_is_exhausted():
+    from agents import pooled_gemini
+
+    class FakeClient:
+        def __init__(self, key):
+            self.key = key
+
+        async def generate_content_async(self, llm_request, stream=False):
+            yield "final reply"
+
+    pool = ApiKeyPool(["key-aaaa"], client_factory=FakeClient)
+
+    async def scenario():
+        model = pooled_gemini.PooledGemini(model="gemini-2.0-flash")
+        responses = model.generate_content_async(llm_request=None)
+        assert await anext(responses) == "final reply"
+        # The caller still holds the generator, but the key is already free
+        assert pool.leases[0].in_flight == 0
+        await responses.aclose()
+
+    with patch.object(pooled_gemini, "key_pool", pool):
+        asyncio.run(scenario())
+    assert pool.leases[0].in_flight == 0
+
+def test_single_key_is_not_rate_limited_by_default(monkeypatch):
+    from services import key_pool
+
+    monkeypatch.delenv("GOOGLE_API_KEYS", raising=False)
+    monkeypatch.setenv("GOOGLE_API_KEY", "key-solo")
+    monkeypatch.setattr(key_pool, "KEY_RPM", None)
+    pool = ApiKeyPool.from_env(client_factory=lambda key: key)
+    assert pool.leases[0].bucket is None
+
+    monkeypatch.setenv("GOOGLE_API_KEYS", "key-aaaa,key-bbbb")
+    pool = ApiKeyPool.from_env(client_factory=lambda key: key)
+    assert all(lease.bucket.rate == key_pool.POOLED_KEY_RPM / 60.0 for lease in pool.leases)
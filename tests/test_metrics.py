@@ -0,0 +1,89 @@
+import asyncio
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock, patch
+
+from services.metrics import MetricsRegistry, span, timed_stream, trace_turn, STAGE_SECONDS
+
+def test_histogram_renders_prometheus_text():
+    registry = MetricsRegistry()
+    latency = registry.histogram("test_seconds", "Test latency.", ("stage",), buckets=(0.1, 1))
+    latency.observe(0.05, stage="llm")
+    latency.observe(0.5, stage="llm")
+    registry.counter("test_total", "Test counter.").inc(3)
+
+    text = registry.render()
+    assert "# TYPE test_seconds histogram" in text
+    assert 'test_seconds_bucket{stage="llm",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{stage="llm",le="+Inf"} 2' in text
+    assert 'test_seconds_count{stage="llm"} 2' in text
+    assert "test_total 3" in text
+
+def test_counter_read_at_scrape_time():
+    registry = MetricsRegistry()
+    seen = [2]
+    registry.counter("test_coalesced_total", "Running total.", callback=lambda: seen[0])
+    seen[0] = 5
+
+    text = registry.render()
+    assert "# TYPE test_coalesced_total counter" in text
+    assert "test_coalesced_total 5" in text
+
+def test_trace_collects_spans_from_offloaded_tools():
+    from services.executor import offload
+
+    def check_balance(user_id):
+        return {"balance": 1}
+
+    tool = offload(check_balance)
+
+    async def turn():
+        with trace_turn("CA_trace", 1, "sync") as trace:
+            with span("session"):
+                pass
+            await tool("user_1")
+        return trace
+
+    trace = asyncio.run(turn())
+    assert [stage for stage, _, _ in trace.spans] == ["session", "tool.check_balance"]
+    assert STAGE_SECONDS.count(stage="tool.check_balance") >= 1
+
+def test_timed_stream_excludes_consumer_time():
+    async def upstream():
+        await asyncio.sleep(0.01)
+        yield "partial"
+        await asyncio.sleep(0.01)
+        yield "final"
+
+    async def turn():
+        with trace_turn("CA_stream", 1, "stream") as trace:
+            async for _ in timed_stream("llm", upstream()):
+                # Downstream work (TTS, Twilio) between responses
+                await asyncio.sleep(0.1)
+        return trace
+
+    trace = asyncio.run(turn())
+    [(stage, seconds, error)] = trace.spans
+    assert stage == "llm" and not error
+    assert 0.02 <= seconds < 0.1
+
+def test_metrics_endpoint_exposes_turn_stages():
+    import server
+
+    async def fake_agent(user_id, user_text, call_sid, base_url):
+        with span("llm"):
+            pass
+
+    client = TestClient(server.app)
+    data = {"SpeechResult": "Check my balance", "CallSid": "CA_metrics", "From": "+15550003"}
+    client.post("/gather_speech", data=data)
+    with patch.object(server, "handle_async_agent", fake_agent), \
+         patch.object(server, "twilio_client", MagicMock()):
+        client.post("/process_speech", data=data)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'voice_turn_stage_seconds_count{stage="llm"}' in response.text
+    assert 'voice_turn_seconds_count{path="stream"}' in response.text
+    assert 'voice_http_request_seconds_count{route="/process_speech",status="200"}' in response.text
+    assert "voice_sessions_live" in response.text
@@ -0,0 +1,64 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+from google.adk.runners import Runner
+from google.adk.sessions.in_memory_session_service import InMemorySessionService
+from google.genai import types
+
+from agents import agent_factory
+from agents.mock_llm import MockLlm
+
+def run_turn(text, streaming=False):
+    async def _run():
+        with patch.object(agent_factory, "build_model", lambda: MockLlm(seed=1)):
+            root = agent_factory.create_agent_graph()
+        sessions = InMemorySessionService()
+        session = await sessions.create_session(app_name="test", user_id="user123")
+        runner = Runner(agent=root, app_name="test", session_service=sessions)
+
+        from google.adk.agents.run_config import RunConfig, StreamingMode
+        config = RunConfig(streaming_mode=StreamingMode.SSE if streaming else StreamingMode.NONE)
+        message = types.Content(role="user", parts=[types.Part(text=text)])
+        return [event async for event in runner.run_async(
+            user_id="user123", session_id=session.id, new_message=message, run_config=config
+        )]
+    return asyncio.run(_run())
+
+def calls(events):
+    return [(e.author, call.name, call.args) for e in events for call in e.get_function_calls()]
+
+def test_mock_llm_routes_and_calls_tools():
+    with patch("tools.billing_tools.adb", new_callable=AsyncMock) as mock_db:
+        mock_db.get_user.return_value = {"balance": 500.0, "name": "Test"}
+        events = run_turn("What is my balance?")
+
+    assert calls(events) == [
+        ("RootDispatcher", "transfer_to_agent", {"agent_name": "BillingAgent"}),
+        ("BillingAgent", "check_balance", {}),
+    ]
+    # The caller comes from the session, not from the model's arguments
+    mock_db.get_user.assert_called_with("user123", fields=["name", "balance"])
+    reply = events[-1].content.parts[0].text
+    assert "500.0" in reply
+    assert events[-1].usage_metadata.candidates_token_count > 0
+
+def test_mock_llm_streams_partials_and_escalates():
+    with patch("tools.escalation_tools.adb", new_callable=AsyncMock):
+        events = run_turn("I want to talk to a human", streaming=True)
+
+    assert [name for _, name, _ in calls(events)] == ["transfer_to_agent", "escalate_to_human"]
+    partial = "".join(e.content.parts[0].text for e in events if e.partial)
+    assert partial and partial == events[-1].content.parts[0].text
+
+def test_mock_llm_latency_is_seeded():
+    a = MockLlm(latency="lognormal:800:300", seed=7)
+    b = MockLlm(latency="lognormal:800:300", seed=7)
+    samples = [a._sample_latency() for _ in range(5)]
+    assert samples == [b._sample_latency() for _ in range(5)]
+    assert MockLlm(latency="fixed:250")._sample_latency() == 0.25
+
+def test_mock_llm_chars_per_token_is_configurable():
+    with patch.dict("os.environ", {"MOCK_LLM_CHARS_PER_TOKEN": "2.5"}):
+        llm = MockLlm.from_env()
+    assert llm.chars_per_token == 2.5
+    assert llm._estimate_tokens("x" * 10) == 4
+    assert MockLlm()._estimate_tokens("x" * 10) == 2
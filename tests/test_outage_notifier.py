@@ -0,0 +1,105 @@
+import threading
+from unittest.mock import MagicMock
+
+from services.outage_notifier import OutageNotifier, OUTAGE_STATUS, twilio_sender
+
+def _database(users):
+    database = MagicMock()
+    database.users_in_region.side_effect = lambda region, page_size: iter(users)
+    database.region_user_count.return_value = len(users)
+    return database
+
+def test_fanout_on_resolution_with_bounded_concurrency():
+    users = [f"+1555{i:06d}" for i in range(200)] + ["local_tester"]
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+    sent_to = []
+
+    def send(user_id, message):
+        nonlocal in_flight, peak
+        if not user_id.startswith("+"):
+            return False
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        sent_to.append(user_id)
+        with lock:
+            in_flight -= 1
+        return True
+
+    notifier = OutageNotifier(_database(users), send, concurrency=4, rate=10000)
+    # Only an outage -> resolved change fans out
+    notifier.on_status_change("India-South", "Operational", "Degraded")
+    assert notifier.stats()["active"] == []
+
+    notifier.on_status_change("India-South", OUTAGE_STATUS, "Operational")
+    notifier.wait(timeout=10)
+
+    assert sorted(sent_to) == sorted(users[:-1])
+    assert notifier.stats() == {"active": [], "sent": 200, "skipped": 1, "failed": 0}
+    assert peak <= 4
+
+def test_fanout_stops_when_outage_returns():
+    started = threading.Event()
+    release = threading.Event()
+
+    def send(user_id, message):
+        started.set()
+        release.wait(5)
+        return True
+
+    notifier = OutageNotifier(_database([f"+1{i}" for i in range(1000)]), send, concurrency=1, rate=10000)
+    notifier.start_fanout("India-South")
+    assert started.wait(5)
+    notifier.on_status_change("India-South", "Operational", OUTAGE_STATUS)
+    release.set()
+    notifier.wait(timeout=10)
+    assert notifier.sent < 1000
+
+def test_twilio_sender_channels():
+    client = MagicMock()
+    twilio_sender(client, "+15550000", "sms")("+15551111", "resolved")
+    client.messages.create.assert_called_once_with(to="+15551111", from_="+15550000", body="resolved")
+
+    twilio_sender(client, "+15550000", "call")("+15551111", "resolved")
+    assert "<Say>resolved</Say>" in client.calls.create.call_args.kwargs["twiml"]
+
+def test_status_change_over_pubsub_fans_out_once():
+    from services.network_cache import RegionStatusCache, NETWORK_UPDATES_CHANNEL
+
+    database = _database(["+15550001", "+15550002"])
+    # Two workers, one store of claims (Redis)
+    claimed = set()
+
+    def claim(name, ttl):
+        if name in claimed:
+            return False
+        claimed.add(name)
+        return True
+
+    database.claim.side_effect = claim
+    sent_to = []
+    workers = []
+    for _ in range(2):
+        cache = RegionStatusCache()
+        notifier = OutageNotifier(database, lambda user_id, message: sent_to.append(user_id), rate=10000)
+        cache.add_listener(notifier.on_status_change)
+        workers.append((cache, notifier))
+
+    # set_network_status published old -> new; every worker's listener receives it
+    for cache, _ in workers:
+        cache._handle_message({"type": "message", "channel": NETWORK_UPDATES_CHANNEL,
+                               "data": f"India-South\tOperational\t{OUTAGE_STATUS}"})
+        assert cache.peek("India-South") == "Operational"
+    for _, notifier in workers:
+        notifier.wait(timeout=10)
+    assert sorted(sent_to) == ["+15550001", "+15550002"]
+
+    # A publisher that omits the previous status: the cache's own copy stands in
+    cache, notifier = workers[0]
+    listener = MagicMock()
+    cache.add_listener(listener)
+    cache._handle_message({"type": "message", "channel": NETWORK_UPDATES_CHANNEL, "data": f"India-South\t{OUTAGE_STATUS}"})
+    listener.assert_called_once_with("India-South", "Operational", OUTAGE_STATUS)
+    cache.remove_listener(listener)
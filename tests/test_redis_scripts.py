@@ -0,0 +1,155 @@
+import json
+import os
+
+import pytest
+import redis
+from unittest.mock import MagicMock
+
+from services.database import RedisDatabase, OPEN_TICKETS_KEY, ESCALATION_STREAM, ledger_key, region_users_key
+from services.network_cache import NETWORK_UPDATES_CHANNEL
+
+# The Lua scripts need a server that runs Lua: a real Redis at REDIS_TEST_URL (a scratch
+# database, flushed before and after every test, e.g. redis://localhost:6379/15), else
+# fakeredis with its Lua extra (pip install "fakeredis[lua]"). Skipped when neither is there.
+REDIS_TEST_URL = os.environ.get("REDIS_TEST_URL")
+
+def _test_client():
+    if REDIS_TEST_URL:
+        client = redis.Redis.from_url(REDIS_TEST_URL, decode_responses=True, socket_connect_timeout=1)
+        try:
+            client.ping()
+        except redis.RedisError as e:
+            pytest.skip(f"Redis not reachable at {REDIS_TEST_URL}: {e}")
+        return client
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+@pytest.fixture
+def rdb():
+    client = _test_client()
+    client.flushdb()
+    yield RedisDatabase(client=client)
+    client.flushdb()
+    client.close()
+
+def test_payment_is_idempotent(rdb):
+    rdb.upsert_user("u1", {"balance": 100.0, "region": "R"})
+
+    first = rdb.apply_payment("u1", 30.0, "TXN-1", "u1:CA1:30.00")
+    retry = rdb.apply_payment("u1", 30.0, "TXN-2", "u1:CA1:30.00")
+
+    assert first == {"transaction_id": "TXN-1", "remaining_balance": 70.0, "replayed": False}
+    assert retry == {"transaction_id": "TXN-1", "remaining_balance": 70.0, "replayed": True}
+    assert rdb.get_user("u1")["balance"] == 70.0
+    assert rdb.client.xlen(ledger_key("u1")) == 1
+    assert rdb.apply_payment("ghost", 1.0, "TXN-3") is None
+
+def test_payment_floors_balance_at_zero(rdb):
+    rdb.upsert_user("u1", {"balance": 20.0})
+
+    assert rdb.apply_payment("u1", 50.0, "TXN-1")["remaining_balance"] == 0.0
+    assert rdb.get_user("u1")["balance"] == 0.0
+
+def test_upsert_moves_user_between_region_sets(rdb):
+    rdb.upsert_user("u1", {"region": "India-West", "balance": 1.0})
+    rdb.upsert_user("u1", {"region": "India-South", "balance": 1.0})
+
+    assert not rdb.client.sismember(region_users_key("India-West"), "u1")
+    assert rdb.client.sismember(region_users_key("India-South"), "u1")
+
+    # Dropping the region removes the user from every set
+    rdb.upsert_user("u1", {"balance": 1.0})
+    assert rdb.region_user_count("India-South") == 0
+
+def test_open_ticket_is_reused(rdb):
+    first, second = rdb.create_tickets([("u1", "no internet"), ("u1", "still down")])
+    again = rdb.create_ticket("u1", "angry")
+
+    assert first == second == again
+    assert rdb.get_open_ticket("u1") == first
+    assert rdb.client.xlen(ESCALATION_STREAM) == 1
+    assert rdb.create_ticket("u2", "billing") != first
+    assert rdb.client.hlen(OPEN_TICKETS_KEY) == 2
+
+def test_json_records_migrate_to_hashes(rdb):
+    rdb.client.set("user:u1", json.dumps({"region": "R", "balance": 5, "vip": True, "plan": {"tier": "gold"}}))
+    rdb.client.set("user:u2", "not json")
+
+    assert rdb.migrate_users() == {"converted": 1, "already_hash": 0, "unreadable": 1}
+    assert rdb.client.type("user:u1") == "hash"
+    assert rdb.get_user("u1") == {"region": "R", "balance": 5.0, "vip": True, "plan": '{"tier":"gold"}'}
+    assert rdb.client.sismember(region_users_key("R"), "u1")
+    # Python writes booleans the same way the script does
+    rdb.upsert_user("u3", {"vip": False})
+    assert rdb.client.hget("user:u3", "vip") == "false"
+    assert rdb.migrate_users()["already_hash"] == 2
+
+def test_json_record_migrates_on_first_read(rdb):
+    rdb.client.set("user:u1", json.dumps({"region": "R", "balance": 5}))
+
+    assert rdb.get_user("u1", fields=["balance"]) == {"balance": 5.0}
+    assert rdb.client.type("user:u1") == "hash"
+
+def test_booleans_use_one_encoding_and_decode_both():
+    from services.database import _encode_user, _decode_user
+
+    assert _encode_user({"vip": True, "paperless": False}) == ["vip", "true", "paperless", "false"]
+    assert _decode_user({"vip": "True", "paperless": "false", "name": "Asha"}) == {
+        "vip": True, "paperless": False, "name": "Asha"
+    }
+
+def test_resolving_trims_only_resolved_escalations(rdb):
+    from services.escalation_queue import EscalationQueue
+
+    queue = EscalationQueue(rdb.client, maxlen=2)
+    queue.ensure_group()
+    tickets = rdb.create_tickets([(f"u{i}", "no internet") for i in range(6)])
+
+    first, second = queue.read("desk-1", count=2)
+    queue.resolve(first)
+    queue.resolve(second)
+    # Over maxlen, but the four entries no desk has been given yet stay
+    assert rdb.client.xlen(ESCALATION_STREAM) == 5
+    assert rdb.get_open_ticket("u5") == tickets[5]
+
+    # An escalation a desk still holds stays too, even behind newer resolved ones
+    held = queue.read("desk-2")[0]
+    for escalation in queue.read("desk-3", count=3):
+        queue.resolve(escalation)
+    remaining = [fields["ticket_id"] for _, fields in rdb.client.xrange(ESCALATION_STREAM)]
+    assert remaining[0] == held["ticket_id"]
+
+    # Trimming never passes the entry being resolved (newer ones may not be delivered yet),
+    # so history shrinks back to maxlen as later escalations are resolved
+    queue.resolve(held)
+    rdb.create_ticket("u6", "slow")
+    queue.resolve(queue.read("desk-2")[0])
+    assert rdb.client.xlen(ESCALATION_STREAM) == 2
+    assert rdb.client.hlen(OPEN_TICKETS_KEY) == 0
+
+def test_status_change_is_published_with_the_previous_status(rdb):
+    pubsub = rdb.client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(NETWORK_UPDATES_CHANNEL)
+    listener = MagicMock()
+    rdb.add_status_listener(listener)
+
+    rdb.set_network_status("India-South", "Outage Detected")
+    rdb.set_network_status("India-South", "Operational")
+
+    published = []
+    for _ in range(5):
+        # None for the (ignored) subscribe confirmation
+        message = pubsub.get_message(timeout=1)
+        if message:
+            published.append(message["data"])
+        if len(published) == 2:
+            break
+    assert published == ["India-South\tOutage Detected\t", "India-South\tOperational\tOutage Detected"]
+    assert listener.call_args.args == ("India-South", "Outage Detected", "Operational")
+    assert rdb.get_network_status("India-South") == "Operational"
+    pubsub.close()
+
+    # One worker wins the fan-out for a resolution
+    assert rdb.claim("outage-fanout:India-South", 60)
+    assert not rdb.claim("outage-fanout:India-South", 60)
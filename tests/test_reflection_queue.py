@@ -0,0 +1,72 @@
+import sqlite3
+import time
+import pytest
+from services.rl_service import RLService
+from services.reflection_queue import ReflectionWorker
+
+def failed_call(rl, call_sid, text):
+    rl.start_call(call_sid)
+    rl.log_chat(call_sid, "user", text)
+    rl.update_status(call_sid, "THINKING")
+    rl.process_hangup(call_sid, "completed")
+    rl.enqueue_reflection(call_sid)
+
+def job_status(rl):
+    rl.flush()
+    conn = sqlite3.connect(rl.db_path)
+    rows = dict(conn.execute("SELECT call_sid, status FROM reflection_jobs").fetchall())
+    conn.close()
+    return rows
+
+def test_failed_calls_are_judged_in_one_batch(rl):
+    prompts = []
+
+    def judge(prompt):
+        prompts.append(prompt)
+        return "CALL 1: ALWAYS answer billing first.\nCALL 2: NEVER stay silent.\nCALL 3: IF asked, escalate."
+
+    for i in range(3):
+        failed_call(rl, f"CA_fail_{i}", f"problem number {i}")
+    rl.start_call("CA_ok")
+    rl.process_hangup("CA_ok", "completed")
+    rl.enqueue_reflection("CA_ok")
+
+    worker = ReflectionWorker(rl, judge=judge, batch_size=5, rpm=6000)
+    assert worker.run_once() == 1
+
+    assert len(prompts) == 1
+    assert all(f"problem number {i}" in prompts[0] for i in range(3))
+    assert worker.rules_learned == 3
+    assert job_status(rl) == {"CA_fail_0": "DONE", "CA_fail_1": "DONE", "CA_fail_2": "DONE", "CA_ok": "SKIPPED"}
+    assert "NEVER stay silent." in rl.get_active_rules()
+
+def test_quota_error_backs_off_and_pauses(rl):
+    def judge(prompt):
+        raise RuntimeError("429 RESOURCE_EXHAUSTED")
+
+    failed_call(rl, "CA_quota", "hello?")
+    worker = ReflectionWorker(rl, judge=judge, rpm=6000, backoff=60)
+    worker.run_once()
+
+    assert job_status(rl) == {"CA_quota": "PENDING"}
+    assert worker.stats()["paused_s"] > 0
+    # Not due yet, and the queue is paused
+    assert worker.run_once() == 0
+    assert "15 seconds" in rl.get_active_rules()
+
+def test_running_jobs_survive_restart(tmp_path):
+    db_path = str(tmp_path / "metrics.db")
+    rl = RLService(db_path=db_path)
+    failed_call(rl, "CA_crash", "are you there")
+    assert rl.claim_reflection_jobs(5) == ["CA_crash"]
+    rl.close()  # process dies mid-reflection
+
+    restarted = RLService(db_path=db_path)
+    worker = ReflectionWorker(restarted, judge=lambda prompt: "NEVER go quiet.", rpm=6000)
+    worker.start()
+    deadline = time.monotonic() + 5
+    while job_status(restarted)["CA_crash"] != "DONE" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    worker.stop()
+    assert job_status(restarted)["CA_crash"] == "DONE"
+    restarted.close()
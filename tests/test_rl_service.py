@@ -0,0 +1,167 @@
+import sqlite3
+import pytest
+from services.rl_service import RLService
+
+def test_writes_are_visible_to_reads(rl):
+    rl.start_call("CA1")
+    rl.log_chat("CA1", "user", "Check my balance")
+    rl.log_chat("CA1", "assistant", "It is 1245.")
+
+    assert rl.get_transcript("CA1") == "USER: Check my balance\nASSISTANT: It is 1245.\n"
+
+def test_thinking_hangup_penalty(rl):
+    rl.start_call("CA2")
+    rl.update_status("CA2", "THINKING")
+    rl.process_hangup("CA2", "completed")
+    rl.flush()
+
+    conn = sqlite3.connect(rl.db_path)
+    score = conn.execute("SELECT total_score FROM calls WHERE call_sid = 'CA2'").fetchone()[0]
+    events = conn.execute("SELECT value FROM call_events WHERE call_sid = 'CA2'").fetchall()
+    conn.close()
+
+    assert score == -50
+    assert events == [("-50 (PENALTY_LATENCY_HANGUP)",)]
+
+def test_close_flushes_pending_writes(tmp_path):
+    db_path = str(tmp_path / "metrics.db")
+    rl = RLService(db_path=db_path)
+    for i in range(500):
+        rl.log_event("CA3", "TICK", str(i))
+    rl.close()
+
+    conn = sqlite3.connect(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM call_events WHERE call_sid = 'CA3'").fetchone()[0]
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    conn.close()
+
+    assert count == 500
+    assert journal_mode == "wal"
+
+def test_daily_rollups_track_calls_scores_and_thinking(rl):
+    rl.start_call("CA4")
+    rl.start_call("CA4")  # duplicate /voice: counted once
+    rl.log_event("CA4", "THINKING_START")
+    rl.log_event("CA4", "THINKING_END")
+    rl.update_status("CA4", "THINKING")
+    rl.process_hangup("CA4", "completed")
+
+    [today] = rl.get_daily_stats()
+    assert today["calls"] == 1
+    assert today["completed"] == 1
+    assert today["thinking_hangups"] == 1
+    assert today["score_total"] == -50
+    assert today["thinking_count"] == 1
+
+    rl.flush()
+    conn = sqlite3.connect(rl.db_path)
+    buckets = conn.execute("SELECT le_ms, count FROM daily_thinking_buckets").fetchall()
+    conn.close()
+    assert buckets == [(500, 1)]
+
+def test_migration_indexes_and_backfills_existing_db(tmp_path):
+    # A database created before versioned migrations (user_version 0, no indexes/rollups)
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    RLService._create_schema(conn)
+    conn.execute("INSERT INTO calls (call_sid, status, start_time, agent_path, total_score) "
+                 "VALUES ('CA5', 'COMPLETED', '2024-05-01 10:00:00', '[]', 60)")
+    conn.execute("INSERT INTO call_events (call_sid, timestamp, event_type, value) VALUES "
+                 "('CA5', 1714557600, 'SCORE_CHANGE', '10 (TURN_SUCCESS)'), "
+                 "('CA5', 1714557700, 'SCORE_CHANGE', '50 (CALL_COMPLETION_BONUS)')")
+    conn.commit()
+    conn.close()
+
+    rl = RLService(db_path=db_path)
+    stats = rl.get_daily_stats()
+    rl.close()
+
+    conn = sqlite3.connect(db_path)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT role, content FROM transcripts "
+                        "WHERE call_sid = 'CA5' ORDER BY timestamp").fetchall()
+    conn.close()
+
+    assert version == len(RLService.MIGRATIONS)
+    assert "idx_transcripts_call_ts" in plan[0][-1]
+    assert sum(row["calls"] for row in stats) == 1
+    assert sum(row["score_total"] for row in stats) == 60
+    assert sum(row["completed"] for row in stats) == 1
+
+def test_near_duplicate_rules_are_merged(rl):
+    rl._save_rule("IF user mentions bill, ALWAYS route to BillingAgent.", "CA6")
+    version = rl.rules_version
+    rl._save_rule("If the user mentions their bill, always route to the BillingAgent.", "CA7")
+    rl._save_rule("NEVER read ticket IDs as a single number.", "CA8")
+
+    ranked = rl.rank_rules()
+    assert [r["rule_text"] for r in ranked] == [
+        "IF user mentions bill, ALWAYS route to BillingAgent.",
+        "NEVER read ticket IDs as a single number.",
+    ]
+    assert ranked[0]["merged_count"] == 2
+    # The merge raised the canonical rule's support, which can reorder the selection: graphs are rebuilt
+    assert rl.rules_version == version + 2
+
+@pytest.mark.parametrize("first, second", [
+    ("ALWAYS route angry callers to EscalationAgent.", "NEVER route angry callers to EscalationAgent."),
+    ("IF the user reports no internet, ALWAYS call check_outage first.",
+     "IF the user reports no internet, ALWAYS call check_balance first."),
+    ("ALWAYS answer in two sentences.", "ALWAYS answer in three sentences."),
+    ("IF the caller is angry, route to EscalationAgent.", "IF the caller is angry, route to BillingAgent."),
+    ("ALWAYS confirm the payment amount.", "DON'T confirm the payment amount."),
+])
+def test_contradicting_rules_are_not_merged(rl, first, second):
+    rl._save_rule(first, "CA_x")
+    rl._save_rule(second, "CA_y")
+    assert sorted(r["rule_text"] for r in rl.rank_rules()) == sorted([first, second])
+
+def test_rules_ranked_by_score_delta_under_budget(rl, scored_calls, monkeypatch):
+    import services.rl_service as rl_module
+
+    scored_calls("before_", -50, 5)
+    rl._save_rule("NEVER put the caller on hold for more than ten seconds.", "CA_a")
+    scored_calls("mid_", 50, 5)
+    rl._save_rule("ALWAYS repeat the ticket number twice.", "CA_b")
+    scored_calls("after_", -50, 5)
+
+    ranked = rl.rank_rules()
+    assert ranked[0]["rule_text"].startswith("NEVER put the caller on hold")
+    assert ranked[0]["effect"] > 0 > ranked[1]["effect"]
+
+    # Budget only fits the best rule
+    monkeypatch.setattr(rl_module, "RULES_TOKEN_BUDGET", 16)
+    rl._rules_cache = None
+    guidelines = rl.get_active_rules()
+    assert "on hold" in guidelines
+    assert "ticket number" not in guidelines
+
+def test_rerank_that_changes_the_selection_bumps_version(rl, scored_calls, monkeypatch):
+    import services.rl_service as rl_module
+
+    # Budget only fits one rule; with no evidence yet the newest wins
+    monkeypatch.setattr(rl_module, "RULES_TOKEN_BUDGET", 16)
+    scored_calls("before_", -50, 5)
+    rl._save_rule("NEVER put the caller on hold for more than ten seconds.", "CA_a")
+    scored_calls("mid_", -50, 5)
+    rl._save_rule("ALWAYS repeat the ticket number twice.", "CA_b")
+    assert "ticket number" in rl.get_active_rules()
+    version = rl.rules_version
+
+    # Not due yet: nothing runs
+    rl.rerank_if_due()
+    rl.flush()
+    assert rl.rules_version == version
+
+    # Scores drop after the second rule: the background rerank swaps the injected rule
+    scored_calls("after_", -100, 5)
+    monkeypatch.setattr(rl_module, "RULES_RERANK_INTERVAL", 0)
+    rl.rerank_if_due()
+    rl.flush()
+    assert rl.rules_version == version + 1
+    assert "on hold" in rl.get_active_rules()
+
+    # Re-ranking to the same selection leaves the version alone
+    rl.rerank_if_due()
+    rl.flush()
+    assert rl.rules_version == version + 1
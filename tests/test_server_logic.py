@@ -53,3 +53,86 @@ def test_gather_speech_no_input():
     # If it's None, it might fail or proceed.
     # Let's skip this one or check server implementation.
     pass
+
+def test_get_agent_response_streams_async_events():
+    # The runner's async API is consumed; text parts are concatenated in order
+    import asyncio
+    import server
+    from google.genai.types import Content, Part
+
+    class FakeEvent:
+        def __init__(self, text):
+            self.content = Content(role="model", parts=[Part(text=text)])
+
+    async def fake_run_async(**kwargs):
+        for chunk in ["Your balance ", "is 1245 rupees."]:
+            await asyncio.sleep(0)
+            yield FakeEvent(chunk)
+
+    fake_runner = MagicMock()
+    fake_runner.run_async = fake_run_async
+
+    with patch.object(server.graph_cache, "current_runner", return_value=None), \
+         patch.object(server.graph_cache, "get_runner", return_value=fake_runner):
+        reply = asyncio.run(server.get_agent_response("stream_user", "Check my balance"))
+
+    assert reply == "Your balance is 1245 rupees."
+    fake_runner.run.assert_not_called()
+
+def test_streamed_reply_speaks_first_sentence_early():
+    # First sentence goes out via a call update, the rest is pulled from /continue_reply
+    import asyncio
+    import server
+
+    async def fake_stream(user_id, user_text, streaming=False):
+        for chunk in ["Your balance is 1245 ru", "pees. It is due next week. ", "Anything else?"]:
+            yield chunk
+
+    fake_twilio = MagicMock()
+    with patch.object(server, "stream_agent_response", fake_stream), \
+         patch.object(server, "twilio_client", fake_twilio):
+        asyncio.run(server.stream_reply_to_call("+15550001", "balance", "CA_stream", "http://test/"))
+
+    pushed = fake_twilio.calls.return_value.update.call_args.kwargs["twiml"]
+    assert "Your balance is 1245 rupees." in pushed
+    assert "It is due next week." not in pushed
+    assert "<Redirect>http://test/continue_reply</Redirect>" in pushed
+
+    response = client.post("/continue_reply", data={"CallSid": "CA_stream"})
+    assert "It is due next week." in response.text
+    assert "Anything else?" in response.text
+    assert "<Gather" in response.text
+    assert "CA_stream" not in server.REPLY_STREAMS
+
+def test_duplicate_process_speech_runs_agent_once():
+    # A retried /process_speech for the same turn must not start a second agent run
+    import server
+
+    calls = []
+
+    async def fake_agent(user_id, user_text, call_sid, base_url):
+        calls.append(call_sid)
+
+    data = {"SpeechResult": "Check my balance", "CallSid": "CA_dup", "From": "+15550002"}
+    client.post("/gather_speech", data=data)
+
+    before = server.agent_flight.coalesced
+    with patch.object(server, "handle_async_agent", fake_agent), \
+         patch.object(server, "twilio_client", MagicMock()):
+        first = client.post("/process_speech", data=data)
+        retry = client.post("/process_speech", data=data)
+
+    assert first.status_code == retry.status_code == 200
+    assert "please hold" in retry.text.lower()
+    assert calls == ["CA_dup"]
+    assert server.agent_flight.coalesced == before + 1
+    assert server.agent_flight.stats()["in_flight"] == 0
+
+def test_goodbye_phrasing_outside_regex_hangs_up():
+    # The local classifier catches goodbyes the keyword rules miss
+    from server import is_goodbye
+    assert is_goodbye("okay great, that's everything, thank you")
+    assert not is_goodbye("please don't hang up yet")
+    for phrase in ["thanks", "thank you", "okay thank you", "no thanks", "the call keeps hanging up",
+                   "my router keeps dropping, it ends the call"]:
+        assert not is_goodbye(phrase), phrase
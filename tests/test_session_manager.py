@@ -0,0 +1,85 @@
+import asyncio
+from google.adk.sessions.in_memory_session_service import InMemorySessionService
+from services.session_manager import SessionManager
+
+def test_end_call_releases_session():
+    async def scenario():
+        service = InMemorySessionService()
+        manager = SessionManager(service)
+
+        manager.bind_call("CA1", "+15550001")
+        session_id = await manager.get_or_create("+15550001")
+        manager.pending_inputs["+15550001"] = ("hello", manager.next_turn("CA1"))
+        assert manager.stats()["live_sessions"] == 1
+
+        await manager.end_call("CA1")
+
+        assert manager.stats() == {
+            "live_sessions": 0, "live_calls": 0, "pending_inputs": 0, "bytes_held": 0, "evictions": 1
+        }
+        assert "+15550001" not in service.sessions.get("voice-agent", {})
+        assert await service.get_session(app_name="voice-agent", user_id="+15550001", session_id=session_id) is None
+
+    asyncio.run(scenario())
+
+def test_lru_and_ttl_eviction():
+    async def scenario():
+        manager = SessionManager(InMemorySessionService(), max_sessions=2, ttl_seconds=60)
+        await manager.get_or_create("a")
+        await manager.get_or_create("b")
+        await manager.get_or_create("a")  # a is now most recently used
+        await manager.get_or_create("c")
+        assert manager.get_session_id("b") is None
+        assert manager.get_session_id("a") and manager.get_session_id("c")
+
+        manager.ttl_seconds = 0
+        await manager.sweep()
+        assert manager.stats()["live_sessions"] == 0
+
+    asyncio.run(scenario())
+
+def test_history_compaction_keeps_tool_pairs_and_summarizes():
+    from unittest.mock import patch
+    from google.adk.events.event import Event
+    from google.genai.types import Content, FunctionCall, FunctionResponse, Part
+    from services import history_compactor
+    from services.history_compactor import HistoryCompactor, is_summary_event
+
+    def turn(i):
+        call_id = f"call-{i}"
+        return [
+            Event(author="user", invocation_id=f"inv-{i}",
+                  content=Content(role="user", parts=[Part(text=f"Question number {i} " + "x" * 200)])),
+            Event(author="BillingAgent", invocation_id=f"inv-{i}", content=Content(role="model", parts=[
+                Part(function_call=FunctionCall(id=call_id, name="check_balance", args={"user_id": "u1"}))])),
+            Event(author="BillingAgent", invocation_id=f"inv-{i}", content=Content(role="user", parts=[
+                Part(function_response=FunctionResponse(id=call_id, name="check_balance", response={"balance": i}))])),
+            Event(author="BillingAgent", invocation_id=f"inv-{i}",
+                  content=Content(role="model", parts=[Part(text=f"Your balance is {i}.")])),
+        ]
+
+    async def scenario():
+        manager = SessionManager(InMemorySessionService(),
+                                 compactor=HistoryCompactor(budget=400, target_ratio=0.6, summary_tokens=120))
+        await manager.get_or_create("u1")
+        session = manager.stored_session("u1")
+        for i in range(10):
+            session.events.extend(turn(i))
+
+        assert manager.compact("u1")
+        events = session.events
+        assert is_summary_event(events[0])
+        assert "Caller: Question number" in events[0].content.parts[0].text
+        assert events[1].author == "user"  # history resumes at a turn boundary
+        calls = {p.function_call.id for e in events for p in e.content.parts if p.function_call}
+        responses = {p.function_response.id for e in events for p in e.content.parts if p.function_response}
+        assert calls == responses
+        assert manager.history_tokens("u1") <= 400
+
+        # Under budget: new events are counted once, old ones come from the cache
+        session.events.extend(turn(10)[:1])
+        with patch.object(history_compactor, "estimate_event_tokens", wraps=history_compactor.estimate_event_tokens) as measure:
+            assert not manager.compact("u1")
+        assert measure.call_count == 1
+
+    asyncio.run(scenario())
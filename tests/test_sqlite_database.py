@@ -0,0 +1,117 @@
+import contextvars
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from services.sqlite_database import SQLiteDatabase
+from utils.context import begin_turn
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    database = SQLiteDatabase(db_path=str(tmp_path / "voice_agent.db"))
+    yield database
+    database.close()
+
+def test_users_and_field_reads(sqlite_db):
+    sqlite_db.upsert_user("+1555", {"name": "Onkar", "balance": 1245.0, "region": "India-West", "router_id": "R1"})
+
+    assert sqlite_db.get_user("+1555") == {"name": "Onkar", "balance": 1245.0, "region": "India-West", "router_id": "R1"}
+    assert sqlite_db.get_user("+1555", fields=["region"]) == {"region": "India-West"}
+    assert sqlite_db.get_user("ghost") is None
+
+    # Moving regions updates the index
+    sqlite_db.upsert_user("+1555", {"name": "Onkar", "balance": 1245.0, "region": "India-South"})
+    assert sqlite_db.region_user_count("India-West") == 0
+    assert list(sqlite_db.users_in_region("India-South")) == ["+1555"]
+
+def test_users_in_region_pages(sqlite_db):
+    for i in range(25):
+        sqlite_db.upsert_user(f"u{i:02d}", {"region": "R"})
+    assert list(sqlite_db.users_in_region("R", page_size=10)) == [f"u{i:02d}" for i in range(25)]
+
+def test_payments_are_idempotent_and_ledgered(sqlite_db):
+    sqlite_db.upsert_user("u1", {"balance": 1000.0})
+
+    first = sqlite_db.apply_payment("u1", 300, "TXN-A", "u1:CA1:2:300.00")
+    retry = sqlite_db.apply_payment("u1", 300, "TXN-B", "u1:CA1:2:300.00")
+    assert first == {"transaction_id": "TXN-A", "remaining_balance": 700.0, "replayed": False}
+    assert retry == {"transaction_id": "TXN-A", "remaining_balance": 700.0, "replayed": True}
+
+    # Floored at zero, and every real charge is in the ledger
+    assert sqlite_db.apply_payment("u1", 5000, "TXN-C")["remaining_balance"] == 0.0
+    assert [entry["transaction_id"] for entry in sqlite_db.get_ledger("u1")] == ["TXN-C", "TXN-A"]
+    assert sqlite_db.apply_payment("ghost", 1, "TXN-D") is None
+
+def test_concurrent_payments_do_not_lose_updates(sqlite_db):
+    sqlite_db.upsert_user("u1", {"balance": 1000.0})
+
+    def pay(i):
+        for j in range(10):
+            sqlite_db.apply_payment("u1", 1, f"TXN-{i}-{j}")
+
+    threads = [threading.Thread(target=pay, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sqlite_db.get_user("u1")["balance"] == 920.0
+    assert len(sqlite_db.get_ledger("u1", count=100)) == 80
+
+def test_tickets_and_status_listener(sqlite_db):
+    ids = sqlite_db.create_tickets([("u1", "angry"), ("u2", "no signal"), ("u1", "still angry")])
+    assert ids[0] == ids[2] and ids[0] != ids[1]
+    assert ids[0].startswith("TICKET-")
+    assert sqlite_db.get_open_ticket("u2") == ids[1]
+
+    sqlite_db.resolve_ticket(ids[0])
+    assert sqlite_db.create_ticket("u1", "again") not in ids
+
+    listener = MagicMock()
+    sqlite_db.add_status_listener(listener)
+    sqlite_db.set_network_status("India-South", "Outage Detected")
+    sqlite_db.set_network_status("India-South", "Operational")
+    sqlite_db.set_network_status("India-South", "Operational")
+    assert sqlite_db.get_network_status("India-South") == "Operational"
+    assert sqlite_db.get_network_status("Mars") == "Unknown"
+    assert listener.call_count == 2
+
+def test_claim_is_granted_once_until_it_expires(sqlite_db):
+    assert sqlite_db.claim("outage-fanout:India-South", 60)
+    assert not sqlite_db.claim("outage-fanout:India-South", 60)
+    assert sqlite_db.claim("outage-fanout:India-West", 0)
+    assert sqlite_db.claim("outage-fanout:India-West", 60)
+
+def test_user_reads_memoized_per_turn(sqlite_db):
+    sqlite_db.upsert_user("u1", {"balance": 10.0, "region": "R"})
+
+    def one_turn():
+        begin_turn()
+        sqlite_db.get_user("u1", fields=["region"])
+        sqlite_db.upsert_user("u1", {"balance": 10.0, "region": "S"})
+        # The write dropped the memo, so the new region is seen
+        return sqlite_db.get_user("u1", fields=["region"])
+
+    assert contextvars.copy_context().run(one_turn) == {"region": "S"}
+
+def test_backends_implement_the_whole_interface():
+    from services.database import Database, RedisDatabase
+
+    class Partial(Database):
+        def get_user(self, user_id, fields=None):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+    # Both real backends are concrete
+    assert not SQLiteDatabase.__abstractmethods__
+    assert not RedisDatabase.__abstractmethods__
+
+def test_migrate_users_reports_unreachable_redis():
+    import redis
+    from services.database import RedisDatabase, DatabaseUnavailable
+
+    rdb = RedisDatabase(client=MagicMock())
+    rdb.client.scan_iter.side_effect = redis.ConnectionError("Connection refused")
+    with pytest.raises(DatabaseUnavailable):
+        rdb.migrate_users()
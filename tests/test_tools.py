@@ -1,5 +1,6 @@
+import asyncio
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from tools.billing_tools import check_balance, process_payment
 from tools.network_tools import check_outage, run_diagnostics
 from tools.escalation_tools import escalate_to_human
@@ -7,9 +8,9 @@ from tools.escalation_tools import escalate_to_human
 # Mock Database
 @pytest.fixture
 def mock_db():
-    with patch('tools.billing_tools.db') as mock_billing, \
-         patch('tools.network_tools.db') as mock_network, \
-         patch('tools.escalation_tools.db') as mock_escalation:
+    with patch('tools.billing_tools.adb', new_callable=AsyncMock) as mock_billing, \
+         patch('tools.network_tools.adb', new_callable=AsyncMock) as mock_network, \
+         patch('tools.escalation_tools.adb', new_callable=AsyncMock) as mock_escalation:
         yield {
             "billing": mock_billing,
             "network": mock_network,
@@ -18,26 +19,321 @@ def mock_db():
 
 def test_check_balance_success(mock_db):
     mock_db["billing"].get_user.return_value = {"balance": 500.0}
-    result = check_balance("user123")
+    result = asyncio.run(check_balance("user123"))
     assert result["status"] == "success"
     assert result["balance_amount"] == 500.0
 
 def test_check_balance_no_user():
-    result = check_balance("")
+    result = asyncio.run(check_balance(""))
     assert result["status"] == "error"
 
+def test_process_payment_idempotent_within_turn(mock_db):
+    import contextvars
+    from utils.context import set_turn_id
+
+    mock_db["billing"].apply_payment.return_value = {
+        "transaction_id": "TXN-1", "remaining_balance": 745.0, "replayed": False
+    }
+    result = asyncio.run(process_payment("user123", 500))
+    assert result["status"] == "success"
+    assert result["remaining_balance"] == 745.0
+    assert result["transaction_id"] == "TXN-1"
+    # Outside a turn there is nothing to de-duplicate against
+    assert mock_db["billing"].apply_payment.call_args.args[3] is None
+
+    def in_turn():
+        set_turn_id("CA123:4")
+        asyncio.run(process_payment("user123", 500))
+
+    contextvars.copy_context().run(in_turn)
+    assert mock_db["billing"].apply_payment.call_args.args[3] == "user123:CA123:4:500.00"
+
+def test_apply_payment_script_call():
+    from services.database import RedisDatabase, PAYMENT_IDEMPOTENCY_TTL
+
+    rdb = RedisDatabase(client=MagicMock())
+    rdb._apply_payment = MagicMock(return_value=["TXN-1", "745", 1])
+
+    assert rdb.apply_payment("user123", 500.0, "TXN-2", "k1") == {
+        "transaction_id": "TXN-1", "remaining_balance": 745.0, "replayed": True
+    }
+    rdb._apply_payment.assert_called_once_with(
+        keys=["user:user123", "ledger:user123", "payment:k1"], args=[500.0, "TXN-2", PAYMENT_IDEMPOTENCY_TTL]
+    )
+
+    rdb._apply_payment.return_value = None
+    assert rdb.apply_payment("ghost", 1.0, "TXN-3") is None
+
 def test_check_outage_found(mock_db):
     mock_db["network"].get_user.return_value = {"region": "India-West"}
     mock_db["network"].get_network_status.return_value = "Outage Detected"
     
-    result = check_outage("user123")
+    result = asyncio.run(check_outage("user123"))
     assert result["status"] == "outage_confirmed"
     assert "known outage" in result["message"]
 
 def test_escalation_ticket(mock_db):
-    mock_db["escalation"].create_ticket.return_value = True
+    mock_db["escalation"].create_ticket.return_value = "TICKET-000042"
     
-    result = escalate_to_human("user123", "I am angry")
+    result = asyncio.run(escalate_to_human("user123", "I am angry"))
     assert result["action"] == "transfer_call"
-    assert "TICKET-" in result["ticket_id"]
+    assert result["ticket_id"] == "TICKET-000042"
     assert result["user_id"] == "user123"
+    mock_db["escalation"].create_ticket.assert_called_once_with("user123", "I am angry")
+
+def test_escalation_ticket_db_error(mock_db):
+    mock_db["escalation"].create_ticket.return_value = None
+    assert asyncio.run(escalate_to_human("user123", "I am angry"))["status"] == "error"
+
+def test_bulk_tickets_one_script_call_per_batch():
+    from services import database
+    from services.database import RedisDatabase
+
+    rdb = RedisDatabase(client=MagicMock())
+    rdb._create_tickets = MagicMock(side_effect=lambda keys, args: [f"TICKET-{i}" for i in range(len(args[2:]) // 2)])
+
+    with patch.object(database, "TICKET_BATCH_SIZE", 2):
+        ids = rdb.create_tickets([("u1", "a"), ("u2", "b"), ("u3", "c")])
+
+    assert len(ids) == 3
+    assert rdb._create_tickets.call_count == 2
+    first = rdb._create_tickets.call_args_list[0].kwargs
+    assert first["keys"] == database.TICKET_KEYS
+    assert first["args"][0] == database.TICKET_ID_PREFIX
+    assert first["args"][2:] == ["u1", "a", "u2", "b"]
+
+def test_upsert_passes_region_sets_as_keys():
+    import redis
+    from services.database import RedisDatabase
+
+    rdb = RedisDatabase(client=MagicMock())
+    rdb._upsert_user = MagicMock(side_effect=[redis.ResponseError("REGION_CHANGED"), 1])
+    # The record moved to India-South between the first read and the script
+    rdb.client.hget.side_effect = ["India-West", "India-South"]
+
+    rdb.upsert_user("u1", {"region": "India-North", "balance": 5.0})
+
+    kwargs = rdb._upsert_user.call_args.kwargs
+    assert kwargs["keys"] == ["user:u1", "region:India-North:users", "region:India-South:users"]
+    assert kwargs["args"] == ["u1", "India-North", "India-South", "region", "India-North", "balance", "5.0"]
+    assert rdb._upsert_user.call_count == 2
+
+def test_user_lookup_memoized_per_turn():
+    # Several tools in one turn share a single fetch of user:{id}
+    import contextvars
+    from services.database import RedisDatabase
+    from utils.context import begin_turn
+
+    database = RedisDatabase(client=MagicMock())
+    database.client.hgetall.return_value = {"region": "India-West", "balance": "10.0"}
+
+    def one_turn():
+        begin_turn()
+        assert database.get_user("user123") == {"region": "India-West", "balance": 10.0}
+        database.get_user("user123")
+        # A field read is served from the whole record fetched earlier in the turn
+        assert database.get_user("user123", fields=["region"]) == {"region": "India-West"}
+
+    contextvars.copy_context().run(one_turn)
+    assert database.client.hgetall.call_count == 1
+
+    # A new turn fetches again
+    contextvars.copy_context().run(one_turn)
+    assert database.client.hgetall.call_count == 2
+
+    # Outside a turn nothing is memoized
+    database.get_user("user123")
+    assert database.client.hgetall.call_count == 3
+
+def test_field_reads_in_a_turn_fetch_the_user_once():
+    # Tools asking for different fields in one turn share one HGETALL
+    import contextvars
+    from services.database import RedisDatabase
+    from utils.context import begin_turn
+
+    database = RedisDatabase(client=MagicMock())
+    database.client.hgetall.return_value = {"region": "India-West", "balance": "10.0", "router_id": "R1"}
+
+    def one_turn():
+        begin_turn()
+        assert database.get_user("user123", fields=["balance"]) == {"balance": 10.0}
+        assert database.get_user("user123", fields=["region", "router_id"]) == {"region": "India-West", "router_id": "R1"}
+        assert database.get_user("user123") == {"region": "India-West", "balance": 10.0, "router_id": "R1"}
+
+    contextvars.copy_context().run(one_turn)
+    assert database.client.hgetall.call_count == 1
+    database.client.pipeline.assert_not_called()
+
+def test_async_repository_shares_memo_and_breaker():
+    import contextvars
+    import redis
+    from services.database import RedisDatabase, AsyncRedisDatabase, DatabaseUnavailable
+    from utils.context import begin_turn
+
+    database = RedisDatabase(client=MagicMock())
+    client = MagicMock()
+    client.hgetall = AsyncMock(return_value={"region": "India-West", "balance": "10.0"})
+    adb = AsyncRedisDatabase(database, client=client)
+    assert adb.breaker is database.breaker
+
+    async def one_turn():
+        begin_turn()
+        assert await adb.get_user("user123", fields=["balance"]) == {"balance": 10.0}
+        assert await adb.get_user("user123", fields=["region"]) == {"region": "India-West"}
+
+    contextvars.copy_context().run(asyncio.run, one_turn())
+    assert client.hgetall.await_count == 1
+
+    # Redis goes away: the last-known record is served, and the failure counts on the shared breaker
+    client.hgetall.side_effect = redis.ConnectionError("Connection refused")
+    assert asyncio.run(adb.get_user("user123")) == {"region": "India-West", "balance": 10.0}
+    assert database.breaker.stats()["consecutive_failures"] == 1
+    with pytest.raises(DatabaseUnavailable):
+        asyncio.run(adb.get_user("ghost"))
+
+def test_async_apply_payment_script_call():
+    from services.database import RedisDatabase, AsyncRedisDatabase, PAYMENT_IDEMPOTENCY_TTL
+
+    client = MagicMock()
+    script = AsyncMock(return_value=["TXN-1", "745", 0])
+    client.register_script.return_value = script
+    adb = AsyncRedisDatabase(RedisDatabase(client=MagicMock()), client=client)
+
+    assert asyncio.run(adb.apply_payment("user123", 500.0, "TXN-1", "k1")) == {
+        "transaction_id": "TXN-1", "remaining_balance": 745.0, "replayed": False
+    }
+    script.assert_awaited_once_with(
+        keys=["user:user123", "ledger:user123", "payment:k1"], args=[500.0, "TXN-1", PAYMENT_IDEMPOTENCY_TTL]
+    )
+
+def test_sqlite_backend_is_offloaded(tmp_path):
+    from services.database import OffloadedDatabase, create_async_database
+    from services.sqlite_database import SQLiteDatabase
+
+    database = SQLiteDatabase(str(tmp_path / "voice.db"))
+    database.upsert_user("u1", {"balance": 10.0, "region": "R"})
+    adb = create_async_database(database)
+    assert isinstance(adb, OffloadedDatabase)
+    assert asyncio.run(adb.get_user("u1", fields=["balance"])) == {"balance": 10.0}
+
+def test_get_user_fields_reads_only_those():
+    import redis
+    from services.database import RedisDatabase
+
+    database = RedisDatabase(client=MagicMock())
+    database._migrate_user = MagicMock()
+    database.client.hget.side_effect = redis.ResponseError("WRONGTYPE Operation against a key")
+    database.client.get.return_value = '{"region": "India-West", "balance": 3.0}'
+    pipe = database.client.pipeline.return_value.__enter__.return_value
+
+    pipe.execute.return_value = [1, ["7.5", None]]
+    assert database.get_user("user123", fields=["balance", "router_id"]) == {"balance": 7.5}
+    pipe.hmget.assert_called_with("user:user123", ["balance", "router_id"])
+    database.client.hgetall.assert_not_called()
+
+    pipe.execute.return_value = [0, [None, None]]
+    assert database.get_user("ghost", fields=["balance", "router_id"]) is None
+
+    # A record still stored as JSON is converted on first touch, then read as a hash
+    pipe.execute.side_effect = [redis.ResponseError("WRONGTYPE Operation against a key"), [1, ["India-West"]]]
+    assert database.get_user("legacy", fields=["region"]) == {"region": "India-West"}
+    database._migrate_user.assert_called_once_with(
+        keys=["user:legacy", "region:India-West:users"], args=["legacy", "India-West"]
+    )
+
+def test_migrate_users_passes_region_sets_as_keys():
+    import redis
+    from services.database import RedisDatabase
+
+    database = RedisDatabase(client=MagicMock())
+    database._migrate_user = MagicMock()
+    database.client.scan_iter.return_value = ["user:a", "user:b"]
+    pipe = database.client.pipeline.return_value.__enter__.return_value
+    pipe.execute.side_effect = [
+        [redis.ResponseError("WRONGTYPE Operation against a key"), "India-South"],  # HGET region
+        ['{"region": "India-West"}'],  # GET of the JSON record
+        [1, 0],  # script results
+    ]
+
+    assert database.migrate_users() == {"converted": 1, "already_hash": 1, "unreadable": 0}
+    calls = [c.kwargs for c in database._migrate_user.call_args_list]
+    assert calls[0]["keys"] == ["user:a", "region:India-West:users"] and calls[0]["args"] == ["a", "India-West"]
+    assert calls[1]["keys"] == ["user:b", "region:India-South:users"] and calls[1]["args"] == ["b", "India-South"]
+
+def test_region_status_cache_serves_repeat_lookups():
+    from services.network_cache import RegionStatusCache, NETWORK_UPDATES_CHANNEL
+
+    cache = RegionStatusCache(ttl=60, fallback_ttl=60)
+    loader = MagicMock(return_value="Outage Detected")
+
+    for _ in range(100):
+        assert cache.get("India-West", loader) == "Outage Detected"
+    assert loader.call_count == 1
+
+    # A published update is applied without another read
+    cache._handle_message({"type": "message", "channel": NETWORK_UPDATES_CHANNEL, "data": "India-West\tOperational"})
+    assert cache.get("India-West", loader) == "Operational"
+
+    # A keyspace event for an external write invalidates the region
+    cache._handle_message({"type": "pmessage", "channel": "__keyspace@0__:network:India-West", "data": "set"})
+    assert cache.get("India-West", loader) == "Outage Detected"
+    assert loader.call_count == 2
+
+    # Without a listener, entries expire after the fallback TTL
+    cache.fallback_ttl = 0
+    cache.get("India-West", loader)
+    assert loader.call_count == 3
+
+def test_set_network_status_notifies_on_change():
+    from services.database import RedisDatabase
+
+    rdb = RedisDatabase(client=MagicMock())
+    listener = MagicMock()
+    rdb.add_status_listener(listener)
+
+    rdb._set_network_status = MagicMock(return_value="Outage Detected")
+    rdb.set_network_status("India-Test", "Operational")
+    listener.assert_called_once_with("India-Test", "Outage Detected", "Operational")
+
+    # Unchanged status: no notification
+    rdb._set_network_status.return_value = "Operational"
+    rdb.set_network_status("India-Test", "Operational")
+    assert listener.call_count == 1
+
+def test_redis_outage_fails_fast_and_serves_last_known():
+    import redis
+    from services.database import RedisDatabase, DatabaseUnavailable
+
+    client = MagicMock()
+    rdb = RedisDatabase(client=client)
+    client.hgetall.return_value = {"region": "India-West", "balance": "10.0"}
+    assert rdb.get_user("user123")["balance"] == 10.0
+
+    client.hgetall.side_effect = redis.ConnectionError("Connection refused")
+    # Reads fall back to the last-known record
+    for _ in range(rdb.breaker.failure_threshold):
+        assert rdb.get_user("user123") == {"region": "India-West", "balance": 10.0}
+    assert rdb.health()["state"] == "open"
+
+    # Circuit open: no more socket attempts, unknown users and writes fail fast
+    calls = client.hgetall.call_count
+    with pytest.raises(DatabaseUnavailable):
+        rdb.get_user("someone_else")
+    with pytest.raises(DatabaseUnavailable):
+        rdb.apply_payment("user123", 5, "TXN-1")
+    assert client.hgetall.call_count == calls
+
+    # Redis is back: the next probe closes the circuit
+    rdb.breaker._opened_at = 0
+    client.hgetall.side_effect = None
+    client.hgetall.return_value = {"region": "India-West", "balance": "7.0"}
+    assert rdb.get_user("user123")["balance"] == 7.0
+    assert rdb.health()["state"] == "closed"
+
+def test_tools_report_unavailable_database(mock_db):
+    from services.database import DatabaseUnavailable
+
+    mock_db["billing"].get_user.side_effect = DatabaseUnavailable("down")
+    mock_db["billing"].apply_payment.side_effect = DatabaseUnavailable("down")
+    assert "temporarily unavailable" in asyncio.run(check_balance("user123"))["message"]
+    assert "temporarily unavailable" in asyncio.run(process_payment("user123", 10))["message"]
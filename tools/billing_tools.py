@@ -1,15 +1,22 @@
 from datetime import date, timedelta
-from services.database import db
+from services.database import adb, DatabaseUnavailable
+from utils.context import get_turn_id
 from uuid import uuid4
 
+# Returned when the account store cannot be reached (and no recent copy is cached)
+UNAVAILABLE = {"status": "error", "message": "The account system is temporarily unavailable. Please try again shortly."}
+
 def generate_txn_id():
     return f"TXN-{uuid4().hex[:8].upper()}"
 
-def check_balance(user_id: str) -> dict:
+async def check_balance(user_id: str) -> dict:
     if not user_id:
         return {"status": "error", "message": "No user ID provided"}
         
-    user = db.get_user(user_id)
+    try:
+        user = await adb.get_user(user_id, fields=["name", "balance"])
+    except DatabaseUnavailable:
+        return dict(UNAVAILABLE)
 
     if not user:
         return {"status": "error", "message": "User not found in database"}
@@ -22,20 +29,28 @@ def check_balance(user_id: str) -> dict:
         "due_date": (date.today() + timedelta(days=7)).isoformat()
     }
 
-def process_payment(user_id: str, amount: float) -> dict:
+async def process_payment(user_id: str, amount: float) -> dict:
     if not user_id:
         return {"status": "error", "message": "No user ID provided"}
 
     if amount <= 0:
         return {"status": "error", "message": "Invalid amount"}
 
-    new_balance = db.update_balance(user_id, amount)
-    if new_balance is None:
+    # The same amount within the same turn is the same payment (Twilio or LLM retry)
+    turn_id = get_turn_id()
+    idempotency_key = f"{user_id}:{turn_id}:{amount:.2f}" if turn_id else None
+
+    try:
+        payment = await adb.apply_payment(user_id, amount, generate_txn_id(), idempotency_key)
+    except DatabaseUnavailable:
+        # Never charge against a stale balance: the caller retries later
+        return dict(UNAVAILABLE)
+    if payment is None:
         return {"status": "error", "message": "User not found"}
 
     return {
         "status": "success",
         "amount_paid": amount,
-        "remaining_balance": new_balance,
-        "transaction_id": generate_txn_id()
+        "remaining_balance": payment["remaining_balance"],
+        "transaction_id": payment["transaction_id"]
     }
@@ -1,18 +1,19 @@
-from datetime import datetime
-from services.database import db
+from services.database import adb, DatabaseUnavailable
 
-def escalate_to_human(user_id: str, reason: str) -> dict:
+async def escalate_to_human(user_id: str, reason: str) -> dict:
     """
     Escalates the call to a human agent by creating a support ticket.
     """
     if not user_id:
         return {"status": "error", "message": "No user ID provided"}
 
-    ticket_id = f"TICKET-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-
-    success = db.create_ticket(user_id, reason, ticket_id)
+    # The id is allocated server-side, atomically with the ticket itself
+    try:
+        ticket_id = await adb.create_ticket(user_id, reason)
+    except DatabaseUnavailable:
+        ticket_id = None
     
-    if not success:
+    if not ticket_id:
          return {"status": "error", "message": "Database error while creating ticket"}
 
     return {
@@ -1,17 +1,24 @@
+import logging
 import random
-from services.database import db
+from services.database import adb, DatabaseUnavailable
+from tools.billing_tools import UNAVAILABLE
 
-def check_outage(user_id: str) -> dict:
-    print(f"DEBUG: check_outage called with user_id={user_id}")
+logger = logging.getLogger("NetworkTools")
+
+async def check_outage(user_id: str) -> dict:
+    logger.debug(f"check_outage called with user_id={user_id}")
     if not user_id:
         return {"status": "error", "message": "No user ID provided"}
         
-    user = db.get_user(user_id)
+    try:
+        user = await adb.get_user(user_id, fields=["region"])
+    except DatabaseUnavailable:
+        return dict(UNAVAILABLE)
     if not user:
         return {"status": "error", "message": "User not found"}
 
     region = user.get("region", "Unknown")
-    status = db.get_network_status(region)
+    status = await adb.get_network_status(region)
 
     if status == "Outage Detected":
         return {
@@ -27,11 +34,14 @@ def check_outage(user_id: str) -> dict:
         "message": "No known outages in your area."
     }
 
-def run_diagnostics(user_id: str) -> dict:
+async def run_diagnostics(user_id: str) -> dict:
     if not user_id:
         return {"status": "error", "message": "No user ID provided"}
         
-    user = db.get_user(user_id)
+    try:
+        user = await adb.get_user(user_id, fields=["router_id"])
+    except DatabaseUnavailable:
+        return dict(UNAVAILABLE)
     if not user:
         return {"status": "error", "message": "User not found"}
 
@@ -0,0 +1,38 @@
+import argparse
+import time
+
+from services.intent_classifier import (
+    INTENT_MODEL_PATH, SEED_EXAMPLES, IntentClassifier, load_transcript_examples
+)
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local intent classifier from call transcripts.")
+    parser.add_argument("--db", default="call_metrics.db", help="SQLite DB with the transcripts table")
+    parser.add_argument("--out", default=INTENT_MODEL_PATH, help="Where to write the model JSON")
+    parser.add_argument("--epochs", type=int, default=30)
+    args = parser.parse_args()
+
+    seed = [(text, intent) for intent, texts in SEED_EXAMPLES.items() for text in texts]
+    try:
+        transcript = load_transcript_examples(args.db)
+    except Exception as e:
+        print(f"Could not read transcripts from {args.db}: {e}")
+        transcript = []
+
+    print(f"Training on {len(seed)} seed + {len(transcript)} transcript examples...")
+    model = IntentClassifier().train(seed + transcript, epochs=args.epochs)
+
+    # Training accuracy and per-prediction latency as a quick sanity check
+    examples = seed + transcript
+    correct = sum(1 for text, label in examples if model.predict(text)[0] == label)
+    start = time.perf_counter()
+    for text, _ in examples:
+        model.predict(text)
+    per_call_ms = (time.perf_counter() - start) * 1000 / max(1, len(examples))
+
+    print(f"Train accuracy: {correct / max(1, len(examples)):.1%}, predict: {per_call_ms:.3f} ms/utterance")
+    model.save(args.out)
+    print(f"Model saved to {args.out}")
+
+if __name__ == "__main__":
+    main()
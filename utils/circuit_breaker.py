@@ -0,0 +1,86 @@
+import threading
+import time
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures; while open every
+    call is refused at once. After `reset_timeout` one probe is let through
+    (half-open): success closes the circuit, failure re-opens it with the timeout
+    doubled, up to `max_reset_timeout`. Safe to share between threads.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 1.0, max_reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self._reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opens = 0
+        self.last_error = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self._reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """True if a call may go ahead now. While half-open only one probe is admitted at a time."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if time.monotonic() - self._opened_at < self._reset_timeout or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+            self._reset_timeout = self.base_reset_timeout
+
+    def abandon(self):
+        """An admitted call ended without telling us anything about the backend: frees the probe slot only."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self, error: Exception = None):
+        with self._lock:
+            self.last_error = str(error) if error is not None else None
+            self._failures += 1
+            if self._probing:
+                # Failed probe: stay open and wait longer before the next one
+                self._probing = False
+                self._reset_timeout = min(self._reset_timeout * 2, self.max_reset_timeout)
+                self._opened_at = time.monotonic()
+            elif self._state == self.CLOSED and self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.opens += 1
+
+    def retry_in(self) -> float:
+        """Seconds until the next probe is allowed (0 when closed or due)."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return 0.0
+            return max(0.0, self._reset_timeout - (time.monotonic() - self._opened_at))
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opens": self.opens,
+            "retry_in_s": round(self.retry_in(), 1),
+            "last_error": self.last_error,
+        }
@@ -1,14 +1,94 @@
 from contextvars import ContextVar
-import threading
+import functools
+import inspect
+import logging
+
+logger = logging.getLogger("Context")
 
 # ContextVar to store the current user_id (thread-safe and async-safe)
 _current_user_id: ContextVar[str] = ContextVar("current_user_id", default=None)
 
+# Per-turn memo of data already fetched during the current agent turn
+_turn_cache: ContextVar[dict] = ContextVar("turn_cache", default=None)
+
+# Stable id of the conversational turn (e.g. "<CallSid>:<turn>"), the same across retries
+_turn_id: ContextVar[str] = ContextVar("turn_id", default=None)
+
 def set_user_context(user_id: str):
     """Sets the user_id for the current context."""
-    print(f"DEBUG: Setting context for {user_id} in Thread {threading.get_ident()}")
+    logger.debug(f"Setting user context for {user_id}")
     _current_user_id.set(user_id)
 
 def get_user_context() -> str:
     """Retrieves the user_id from the current context."""
     return _current_user_id.get()
+
+def begin_turn() -> dict:
+    """
+    Starts a fresh per-turn memo for the current context and returns it.
+    Tools offloaded to worker threads inherit it through the copied context.
+    """
+    cache = {}
+    _turn_cache.set(cache)
+    return cache
+
+def get_turn_cache() -> dict:
+    """Returns the current turn's memo, or None outside an agent turn."""
+    return _turn_cache.get()
+
+def set_turn_id(turn_id: str):
+    """Identifies the current turn; retries of the same turn must set the same id."""
+    _turn_id.set(turn_id)
+
+def get_turn_id() -> str:
+    return _turn_id.get()
+
+def _caller_id(tool_context) -> str:
+    """The context's caller, else the user of the ADK session running the tool (e.g. adk web)."""
+    user_id = get_user_context()
+    if not user_id and tool_context is not None:
+        # ToolContext.user_id is public in the google-adk pinned in requirements.txt;
+        # older releases only carry it on the (private) invocation context
+        user_id = getattr(tool_context, "user_id", None) or tool_context._invocation_context.user_id
+    return user_id or ""
+
+def _bind_invocation(tool_context):
+    if _turn_id.get() is None and tool_context is not None:
+        return _turn_id.set(tool_context.invocation_id)
+    return None
+
+def bind_user_context(fn):
+    """
+    Wraps a tool taking `user_id` so the caller comes from the current context
+    (set_user_context) instead of being a parameter the LLM has to fill in.
+    The published signature drops user_id, so the function declaration, and with
+    it the whole agent graph, is identical for every caller. ADK fills in
+    tool_context, which is not part of the declaration. Without a turn id set by
+    the server, the ADK invocation id stands in for it during the call.
+    """
+    signature = inspect.signature(fn)
+    params = [param for name, param in signature.parameters.items() if name != "user_id"]
+    params.append(inspect.Parameter("tool_context", inspect.Parameter.KEYWORD_ONLY, default=None))
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, tool_context=None, **kwargs):
+            token = _bind_invocation(tool_context)
+            try:
+                return await fn(*args, user_id=_caller_id(tool_context), **kwargs)
+            finally:
+                if token is not None:
+                    _turn_id.reset(token)
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, tool_context=None, **kwargs):
+            token = _bind_invocation(tool_context)
+            try:
+                return fn(*args, user_id=_caller_id(tool_context), **kwargs)
+            finally:
+                if token is not None:
+                    _turn_id.reset(token)
+
+    wrapper.__signature__ = signature.replace(parameters=params)
+    wrapper.__annotations__ = {k: v for k, v in getattr(fn, "__annotations__", {}).items() if k != "user_id"}
+    return wrapper
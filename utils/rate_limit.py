@@ -0,0 +1,51 @@
+import asyncio
+import threading
+import time
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, holding at most `capacity`.
+    Safe to share between threads; take() waits asynchronously.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+    def try_take(self, n: float = 1) -> bool:
+        """Takes n tokens if available right now."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= n:
+                self._tokens -= n
+                return True
+            return False
+
+    def time_until_available(self, n: float = 1) -> float:
+        """Seconds until n tokens will be available (0 if they already are)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            missing = n - self._tokens
+            if missing <= 0:
+                return 0.0
+            return missing / self.rate if self.rate > 0 else float("inf")
+
+    async def take(self, n: float = 1):
+        """Waits until n tokens are available and takes them."""
+        while not self.try_take(n):
+            await asyncio.sleep(self.time_until_available(n))
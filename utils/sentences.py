@@ -0,0 +1,41 @@
+import re
+
+# A sentence ends at . ! ? (optionally followed by quotes/brackets) and whitespace.
+# Decimals like "1245.50" never match because no whitespace follows the dot.
+_BOUNDARY = re.compile(r'[.!?]+["\')\]]*\s+')
+
+# Abbreviations that end with a dot but do not end a sentence
+_ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "rs.", "no.", "approx.", "e.g.", "i.e.", "vs."}
+
+class SentenceChunker:
+    """
+    Accumulates streamed text and releases it one complete sentence at a time.
+    Fragments shorter than min_chars are held back and merged into the next sentence.
+    """
+
+    def __init__(self, min_chars: int = 12):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> list:
+        """Adds text and returns any sentences that are now complete."""
+        self._buffer += text
+        sentences = []
+        start = 0
+
+        for match in _BOUNDARY.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            last_word = candidate.rsplit(None, 1)[-1].lower() if candidate else ""
+            if last_word in _ABBREVIATIONS or len(candidate) < self.min_chars:
+                continue
+            sentences.append(candidate)
+            start = match.end()
+
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> str:
+        """Returns whatever text is left once the stream has ended."""
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return rest